@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# 测试不读写磁盘缓存与知识库，也不访问混元
+for name in ("UNI_LOGO_DET_CACHE_PATH", "UNI_LOGO_LLM_CACHE_PATH", "UNI_LOGO_SCHOOL_KB_PATH"):
+    os.environ[name] = ""
+os.environ["UNI_LOGO_LLM_PROVIDER"] = "local"
+
+# uni_logo 中的模块按文件名直接导入（与命令行、图形界面的运行方式一致）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uni_logo"))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""批量图片：续跑时重试失败的图片，子进程缩小图片后检测框仍是原图坐标。"""
+
+import json
+
+import cv2
+import numpy as np
+
+from batch_images import load_done, load_image, run_batch
+from inference_backend import InferenceBackend, make_detections
+
+NAMES = {0: "pku"}
+
+
+class StubBackend(InferenceBackend):
+    """在输入图片左上四分之一处报一个 pku，并记录收到的图片尺寸。"""
+
+    def __init__(self):
+        super().__init__("stub", imgsz=64)
+        self.names = NAMES
+        self.shapes = []
+
+    def predict(self, images):
+        self.shapes.extend(image.shape[:2] for image in images)
+        return [make_detections([[0, 0, image.shape[1] / 2, image.shape[0] / 2]], [0.9], [0], NAMES)
+                for image in images]
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_load_image_downscales_in_worker(tmp_path):
+    path = str(tmp_path / "a.png")
+    cv2.imwrite(path, np.zeros((100, 400, 3), dtype=np.uint8))
+    item = load_image(path, max_side=64)
+    assert item.image.shape[:2] == (16, 64)
+    assert (item.width, item.height, item.scale) == (400, 100, 0.16)
+    assert load_image(path).image.shape[:2] == (100, 400)
+
+
+def test_boxes_are_in_original_coordinates(tmp_path):
+    cv2.imwrite(str(tmp_path / "a.png"), np.zeros((128, 256, 3), dtype=np.uint8))
+    output = str(tmp_path / "out.jsonl")
+    model = StubBackend()
+    run_batch([str(tmp_path)], output, model, batch_size=2, workers=1, progress=lambda message: None)
+
+    assert model.shapes == [(32, 64)]
+    (record,) = read_records(output)
+    assert (record["width"], record["height"]) == (256, 128)
+    assert record["detections"][0]["box"] == [0, 0, 128, 64]
+
+
+def test_resume_retries_failed_images(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    cv2.imwrite(str(images / "good.png"), np.zeros((32, 32, 3), dtype=np.uint8))
+    (images / "bad.png").write_bytes(b"not an image")
+    output = str(tmp_path / "out.jsonl")
+
+    first = run_batch([str(images)], output, StubBackend(), workers=1, progress=lambda message: None)
+    assert (first["images"], first["errors"]) == (2, 1)
+    assert load_done(output) == {str(images / "good.png")}
+
+    cv2.imwrite(str(images / "bad.png"), np.zeros((32, 32, 3), dtype=np.uint8))
+    second = run_batch([str(images)], output, StubBackend(), workers=1, progress=lambda message: None)
+    assert (second["images"], second["errors"], second["skipped"]) == (1, 0, 1)
+    assert load_done(output) == {str(images / "good.png"), str(images / "bad.png")}
+    assert "error" not in read_records(output)[-1]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""批量视频：工作进程崩溃后重建进程池继续处理，必然崩溃的视频记为失败。"""
+
+import os
+
+import batch_video
+
+
+def fake_process_video(path, *args):
+    """代替 process_video 在工作进程中运行：文件名含 crash 的视频直接让进程退出。"""
+    if "crash" in os.path.basename(path):
+        os._exit(1)
+    return {"source": str(path), "frames_read": 10, "frames_inferred": 2, "video_fps": 10.0,
+            "elapsed_seconds": 0.1, "schools": {"pku": 0.0}}
+
+
+def test_broken_pool_is_recreated(tmp_path, monkeypatch):
+    for name in ("a.mp4", "b.mp4", "crash.mp4", "c.mp4"):
+        (tmp_path / name).write_bytes(b"")
+    monkeypatch.setattr(batch_video, "process_video", fake_process_video)
+    messages = []
+
+    result = batch_video.run_batch_videos([str(tmp_path)], workers=2, threads=1, progress=messages.append)
+
+    by_name = {os.path.basename(s["source"]): s for s in result["videos"]}
+    assert sorted(by_name) == ["a.mp4", "b.mp4", "c.mp4", "crash.mp4"]
+    assert "工作进程异常退出" in by_name["crash.mp4"]["error"]
+    assert all("error" not in by_name[name] for name in ("a.mp4", "b.mp4", "c.mp4"))
+    assert result["aggregate"]["failed"] == 1
+    assert any("重新创建进程池" in message for message in messages)
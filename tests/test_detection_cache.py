@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""检测缓存的精确 / 近似命中、近似候选的确认、命名空间与磁盘条目上限。"""
+
+import cv2
+import numpy as np
+import pytest
+import supervision as sv
+
+import settings
+from detection_cache import DetectionCache, content_hash, default_namespace, dhash, fingerprint
+
+
+def badge(text, color=(40, 40, 160), size=(320, 240)):
+    width, height = size
+    image = np.full((height, width, 3), 235, dtype=np.uint8)
+    cv2.circle(image, (width // 2, height // 2), min(width, height) // 3, color, -1)
+    cv2.putText(image, text, (width // 2 - 45, height // 2 + 12), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
+    return image
+
+
+def detections(class_name="pku"):
+    return sv.Detections(
+        xyxy=np.array([[10, 20, 110, 120]], dtype=np.float32),
+        confidence=np.array([0.9], dtype=np.float32),
+        class_id=np.array([0]),
+        data={"class_name": np.array([class_name])},
+    )
+
+
+def cache(tmp_path, **kwargs):
+    kwargs.setdefault("use_phash", True)
+    return DetectionCache(namespace="test", path=str(tmp_path / "cache.sqlite3"), max_size=16, **kwargs)
+
+
+def store_image(cache, image, class_name="pku"):
+    data = cv2.imencode(".png", image)[1].tobytes()
+    sha256 = content_hash(data)
+    value, entry = cache.lookup_similar(image)
+    assert entry is None
+    cache.store(sha256, detections(class_name), image.shape[1], image.shape[0], value)
+    return data
+
+
+def test_dhash_distance():
+    image = badge("PKU")
+    noisy = np.clip(image.astype(np.int16) + np.random.default_rng(0).integers(-3, 4, image.shape), 0, 255)
+    distance = bin(dhash(image) ^ dhash(noisy.astype(np.uint8))).count("1")
+    assert dhash(image) == dhash(image.copy())
+    assert distance <= 2
+    # 不同学校的校徽布局相同，dHash 几乎没有区别，只能当作候选
+    assert bin(dhash(image) ^ dhash(badge("THU"))).count("1") <= 2
+
+
+def test_exact_hit_survives_restart(tmp_path):
+    data = store_image(cache(tmp_path), badge("PKU"))
+
+    reopened = cache(tmp_path)
+    _, entry = reopened.lookup(data)
+    assert entry is not None
+    assert entry.class_name == ["pku"]
+    assert entry.to_detections().data["class_name"].tolist() == ["pku"]
+    assert reopened.stats()["exact_hits"] == 1
+
+
+def test_phash_hit_for_reencoded_copy(tmp_path):
+    image = badge("PKU")
+    store_image(cache(tmp_path), image)
+    reencoded = cv2.imdecode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1], cv2.IMREAD_COLOR)
+
+    reopened = cache(tmp_path)
+    _, entry = reopened.lookup(cv2.imencode(".jpg", reencoded)[1].tobytes())
+    assert entry is None
+    _, entry = reopened.lookup_similar(reencoded)
+    assert entry is not None
+    assert entry.class_name == ["pku"]
+    assert reopened.stats()["phash_hits"] == 1
+
+
+@pytest.mark.parametrize("other", [
+    badge("THU"),  # 另一所学校的校徽
+    badge("PKU", color=(160, 40, 40)),  # 同样的图形，颜色不同
+    badge("PKU", size=(640, 480)),  # 尺寸不同
+])
+def test_phash_candidate_must_be_confirmed(tmp_path, other):
+    # 距离放宽到 64，所有图片都是候选，只靠尺寸与缩略图确认
+    c = cache(tmp_path, phash_distance=64)
+    store_image(c, badge("PKU"))
+    _, entry = c.lookup_similar(other)
+    assert entry is None
+    assert c.stats()["phash_misses"] == 2
+
+
+def test_phash_off_by_default(tmp_path):
+    assert not settings.DET_CACHE_PHASH
+    c = DetectionCache(namespace="test", path="", max_size=16)
+    assert c.lookup_similar(badge("PKU")) == (None, None)
+
+
+def test_namespace_includes_thresholds(monkeypatch):
+    before = default_namespace()
+    monkeypatch.setattr(settings, "MODEL_CONF", 0.5)
+    assert default_namespace() != before
+    changed_conf = default_namespace()
+    monkeypatch.setattr(settings, "MODEL_IOU", 0.3)
+    assert default_namespace() != changed_conf
+    assert "tile" not in default_namespace("off")
+    assert default_namespace("auto") != default_namespace("off")
+
+
+def test_row_cap_evicts_oldest(tmp_path, monkeypatch):
+    monkeypatch.setattr(DetectionCache, "PRUNE_EVERY", 1)
+    c = cache(tmp_path, max_rows=3, max_annotated_bytes=4)
+    digests = []
+    for i in range(5):
+        digests.append(content_hash(bytes([i])))
+        c.store(digests[-1], detections(), 320, 240, annotated=b"x" * (i + 2))
+
+    reopened = cache(tmp_path, max_rows=3)
+    assert [reopened.lookup(sha256=d)[1] is not None for d in digests] == [False, False, True, True, True]
+    # 超过大小上限的标注图片不写入
+    assert reopened.lookup(sha256=digests[2])[1].annotated == b"xxxx"
+    assert reopened.lookup(sha256=digests[3])[1].annotated is None
+
+
+def test_fingerprint_records_size():
+    value = fingerprint(badge("PKU"))
+    assert (value.width, value.height) == (320, 240)
+    assert len(value.thumbnail) == 32 * 32 * 3
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""导出模型的前后处理、NMS 与 compare_backends 的一致性检查。"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("supervision")
+
+import settings
+from inference_backend import (ExportedBackend, InferenceBackend, box_iou, compare_backends, load_backend,
+                               make_detections, nms)
+
+NAMES = {0: "pku", 1: "thu"}
+
+
+class RawBackend(ExportedBackend):
+    """_run 直接返回预先构造的原始输出（网络输入坐标系下的 cx, cy, w, h + 各类别得分）。"""
+
+    name = "raw"
+
+    def __init__(self, candidates, **kwargs):
+        super().__init__("raw", imgsz=640, conf=0.25, iou=0.7, **kwargs)
+        self.names = dict(NAMES)
+        self.candidates = candidates
+        self.batches = []
+
+    def _run(self, batch):
+        self.batches.append(batch.shape)
+        output = np.zeros((4 + len(NAMES), len(self.candidates)), dtype=np.float32)
+        for k, (cx, cy, w, h, class_id, score) in enumerate(self.candidates):
+            output[:4, k] = (cx, cy, w, h)
+            output[4 + class_id, k] = score
+        return np.stack([output] * len(batch))
+
+
+class FixedBackend(InferenceBackend):
+    """每张图片都返回同一组检测结果。"""
+
+    name = "fixed"
+
+    def __init__(self, xyxy, confidence, class_id):
+        super().__init__("fixed")
+        self.names = dict(NAMES)
+        self.result = make_detections(xyxy, confidence, class_id, self.names)
+
+    def predict(self, images):
+        return [self.result for _ in images]
+
+
+def test_nms_keeps_highest_score_per_cluster():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60], [0, 0, 10, 9]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.8, 0.3], dtype=np.float32)
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    # 阈值足够高时全部保留，顺序按置信度从高到低
+    assert nms(boxes, scores, 0.99).tolist() == [1, 2, 0, 3]
+
+
+def test_box_iou():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(box_iou(a, b)[0], [1.0, 1 / 3, 0.0], atol=1e-5)
+
+
+def test_letterbox_pads_to_input_size():
+    backend = RawBackend([])
+    padded, ratio, (left, top) = backend.letterbox(np.zeros((320, 320, 3), dtype=np.uint8))
+    assert padded.shape == (640, 640, 3)
+    assert ratio == 2.0 and (left, top) == (0, 0)
+
+    padded, ratio, (left, top) = backend.letterbox(np.zeros((480, 640, 3), dtype=np.uint8))
+    assert padded.shape == (640, 640, 3)
+    assert ratio == 1.0 and (left, top) == (0, 80)
+    assert padded[0, 0].tolist() == [114, 114, 114]
+
+    batch, metas = backend.preprocess([np.full((480, 640, 3), 255, dtype=np.uint8)])
+    assert batch.shape == (1, 3, 640, 640) and batch.dtype == np.float32
+    assert batch.max() == 1.0
+    assert metas == [(1.0, (0, 80), (480, 640))]
+
+
+def test_postprocess_thresholds_nms_and_rescales():
+    # 原图 480x640，letterbox 后上下各填充 80 像素，比例为 1
+    backend = RawBackend([
+        (100, 180, 40, 40, 0, 0.9),   # pku，原图 (80, 80, 120, 120)
+        (102, 182, 40, 40, 0, 0.6),   # 与上一个重叠，同类别被 NMS 去掉
+        (102, 182, 40, 40, 1, 0.5),   # 同位置不同类别，按类别 NMS 时保留
+        (300, 300, 20, 20, 1, 0.1),   # 低于置信度阈值
+        (630, 540, 40, 40, 1, 0.8),   # 超出原图部分被裁剪
+    ])
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    detections = backend.detect(image)
+
+    assert len(detections) == 3
+    np.testing.assert_allclose(detections.confidence, [0.9, 0.8, 0.5], atol=1e-6)
+    assert detections.class_id.tolist() == [0, 1, 1]
+    assert detections.data["class_name"].tolist() == ["pku", "thu", "thu"]
+    np.testing.assert_allclose(detections.xyxy[0], [80, 80, 120, 120], atol=1e-4)
+    np.testing.assert_allclose(detections.xyxy[1], [610, 440, 640, 480], atol=1e-4)
+
+
+def test_fixed_batch_runs_images_one_by_one():
+    backend = RawBackend([(320, 320, 64, 64, 1, 0.7)])
+    backend.fixed_batch = 1
+    images = [np.zeros((640, 640, 3), dtype=np.uint8)] * 3
+    results = backend.predict(images)
+    assert backend.batches == [(1, 3, 640, 640)] * 3
+    assert [len(r) for r in results] == [1, 1, 1]
+    assert backend.predict([]) == []
+
+
+def test_compare_backends_matches_and_reports_mismatch():
+    images = [np.zeros((64, 64, 3), dtype=np.uint8)] * 3
+    reference = FixedBackend([[0, 0, 10, 10], [20, 20, 40, 40]], [0.9, 0.6], [0, 1])
+    close = FixedBackend([[20, 20, 40, 40.5], [0, 0, 10, 10]], [0.62, 0.88], [1, 0])
+    report = compare_backends(reference, close, images)
+    assert report["match"]
+    assert all(row["ok"] and row["matched"] == 2 for row in report["images"])
+    assert report["images"][0]["max_conf_diff"] == pytest.approx(0.02, abs=1e-4)
+    assert set(report["latency_ms"]) == {"reference", "candidate"}
+
+    wrong_class = FixedBackend([[0, 0, 10, 10], [20, 20, 40, 40]], [0.9, 0.6], [0, 0])
+    report = compare_backends(reference, wrong_class, images)
+    assert not report["match"]
+    assert report["images"][0]["matched"] == 1
+
+    low_conf = FixedBackend([[0, 0, 10, 10], [20, 20, 40, 40]], [0.7, 0.6], [0, 1])
+    assert not compare_backends(reference, low_conf, images, conf_tolerance=0.05)["match"]
+    assert compare_backends(reference, low_conf, images, conf_tolerance=0.25)["match"]
+
+
+def test_onnx_matches_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("ultralytics")
+    if not os.path.exists(settings.MODEL_WEIGHTS):
+        pytest.skip(f"找不到模型权重：{settings.MODEL_WEIGHTS}")
+    import cv2
+    from inference_backend import export_model
+
+    weights = shutil.copy(settings.MODEL_WEIGHTS, tmp_path / "best.pt")
+    onnx_path = export_model(str(weights), "onnx")
+
+    images = []
+    dataset = os.path.join("datasets", "images", "val")
+    if os.path.isdir(dataset):
+        images = [cv2.imread(os.path.join(dataset, name)) for name in sorted(os.listdir(dataset))[:20]]
+    images = [image for image in images if image is not None]
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+
+    report = compare_backends(load_backend(str(weights), "torch"), load_backend(onnx_path), images)
+    assert report["match"], [row for row in report["images"] if not row["ok"]]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""推理工作线程：凑批推理，以及模型加载失败时请求立即失败、之后可以恢复。"""
+
+import pytest
+
+import inference_worker
+from inference_backend import InferenceBackend, make_detections
+from inference_worker import BatchInferenceWorker
+
+NAMES = {0: "pku"}
+
+
+class StubBackend(InferenceBackend):
+    def __init__(self):
+        super().__init__("stub")
+        self.names = NAMES
+
+    def predict(self, images):
+        return [make_detections([[0, 0, 10, 10]], [0.9], [0], NAMES) for _ in images]
+
+
+@pytest.fixture
+def worker():
+    worker = BatchInferenceWorker(max_batch_size=4, max_wait_ms=5)
+    yield worker
+    worker.stop()
+
+
+def test_predicts_submitted_images(worker, monkeypatch):
+    monkeypatch.setattr(inference_worker, "get_model", lambda weights=None: StubBackend())
+    futures = [worker.submit(object()) for _ in range(6)]
+    assert [len(f.result(timeout=5)) for f in futures] == [1] * 6
+    assert worker.stats()["images"] == 6
+
+
+def test_load_failure_fails_requests_then_recovers(worker, monkeypatch):
+    def broken(weights=None):
+        raise FileNotFoundError("best.pt")
+
+    monkeypatch.setattr(inference_worker, "get_model", broken)
+    futures = [worker.submit(object()) for _ in range(3)]
+    for future in futures:
+        with pytest.raises(FileNotFoundError):
+            future.result(timeout=5)
+    assert worker.stats()["load_errors"] >= 1
+
+    # 下一次提交重新启动线程并重试加载
+    monkeypatch.setattr(inference_worker, "get_model", lambda weights=None: StubBackend())
+    assert len(worker.submit(object()).result(timeout=5)) == 1
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""熔断器状态切换、ResilientProvider 的重试 / 退避 / 时间预算，以及 LocalProvider 本身。"""
+
+import itertools
+import time
+
+import pytest
+
+import hunyuan_api
+import llm_provider
+from fake_hunyuan import fake_answer
+from llm_provider import (CircuitBreaker, CircuitOpenError, ConfigurationError, LLMError, LocalProvider,
+                          ResilientProvider)
+
+_models = itertools.count()
+
+
+def local(**kwargs):
+    # 回答缓存键包含模型名，每个测试用不同的模型名，互不命中缓存
+    kwargs.setdefault("latency", 0)
+    return LocalProvider(model=f"test-{next(_models)}", **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避时长而不真正等待；抖动固定为 1。"""
+    recorded = []
+    monkeypatch.setattr(llm_provider.random, "uniform", lambda a, b: 1.0)
+    monkeypatch.setattr(llm_provider.time, "sleep", lambda seconds: seconds and recorded.append(seconds))
+    return recorded
+
+
+@pytest.fixture
+def use_provider():
+    previous = []
+
+    def install(provider):
+        previous.append(llm_provider.set_provider(provider))
+        return provider
+
+    yield install
+    if previous:
+        llm_provider.set_provider(previous[0])
+
+
+def test_local_provider_answers_in_chunks():
+    provider = local(latency=0.2, first_token_latency=0.1, chunks=4)
+    prompt = hunyuan_api.build_prompt("pku", "cli")
+
+    start = time.perf_counter()
+    assert provider.complete(prompt) == fake_answer(prompt)
+    assert time.perf_counter() - start >= 0.2
+
+    start = time.perf_counter()
+    chunks = provider.stream(prompt)
+    first = next(chunks)
+    assert 0.1 <= time.perf_counter() - start < 0.2
+    rest = list(chunks)
+    assert len(rest) == 3 and first + "".join(rest) == fake_answer(prompt)
+    assert provider.calls == 2
+
+
+def test_local_provider_injected_failures():
+    provider = local(failures=2)
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            provider.complete("“北京大学”")
+    assert "北京大学" in provider.complete("“北京大学”")
+    assert provider.calls == 3
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # 半开状态只放行一次试探
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_disabled_with_zero_threshold():
+    breaker = CircuitBreaker(failure_threshold=0, reset_timeout=60)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_retries_with_exponential_backoff(sleeps):
+    inner = local(failures=2)
+    provider = ResilientProvider(inner, retries=2, backoff=0.1, breaker=CircuitBreaker(10, 60))
+    assert "北京大学" in provider.complete("“北京大学”")
+    assert inner.calls == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_gives_up_after_retries(sleeps):
+    inner = local(failures=5)
+    provider = ResilientProvider(inner, retries=2, backoff=0.1, breaker=CircuitBreaker(10, 60))
+    with pytest.raises(LLMError):
+        provider.complete("“北京大学”")
+    assert inner.calls == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_non_retryable_error_is_not_retried(sleeps):
+    class Misconfigured(LocalProvider):
+        def complete(self, prompt):
+            self.calls += 1
+            raise ConfigurationError("未配置密钥")
+
+        def is_retryable(self, error):
+            return not isinstance(error, ConfigurationError)
+
+    inner = Misconfigured(latency=0)
+    provider = ResilientProvider(inner, retries=3, backoff=0.1, breaker=CircuitBreaker(10, 60))
+    with pytest.raises(ConfigurationError):
+        provider.complete("“北京大学”")
+    assert inner.calls == 1 and sleeps == []
+
+
+def test_open_breaker_rejects_without_calling_upstream(sleeps):
+    inner = local(failures=10)
+    provider = ResilientProvider(inner, retries=0, backoff=0, breaker=CircuitBreaker(2, 60))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            provider.complete("“北京大学”")
+    with pytest.raises(CircuitOpenError):
+        provider.complete("“北京大学”")
+    assert inner.calls == 2
+
+
+def test_half_open_probe_closes_breaker():
+    inner = local(failures=2)
+    provider = ResilientProvider(inner, retries=0, backoff=0, breaker=CircuitBreaker(2, 0.05))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            provider.complete("“北京大学”")
+    with pytest.raises(CircuitOpenError):
+        provider.complete("“北京大学”")
+    time.sleep(0.06)
+    assert "北京大学" in provider.complete("“北京大学”")
+    assert provider.breaker.state == "closed"
+
+
+def test_stream_retries_only_before_first_delta(sleeps):
+    inner = local(failures=1, chunks=4)
+    provider = ResilientProvider(inner, retries=2, backoff=0.1, breaker=CircuitBreaker(10, 60))
+    assert "".join(provider.stream("“北京大学”")) == fake_answer("“北京大学”")
+    assert inner.calls == 2 and sleeps == [0.1]
+
+    class BreaksMidway(LocalProvider):
+        def stream(self, prompt):
+            self.calls += 1
+            yield "学校名："
+            raise LLMError("连接中断")
+
+    inner = BreaksMidway(latency=0)
+    provider = ResilientProvider(inner, retries=2, backoff=0.1, breaker=CircuitBreaker(10, 60))
+    chunks = []
+    with pytest.raises(LLMError):
+        for chunk in provider.stream("“北京大学”"):
+            chunks.append(chunk)
+    # 已经产出内容后不重试，避免客户端收到重复片段
+    assert chunks == ["学校名："] and inner.calls == 1
+
+
+def test_budget_returns_local_profile(use_provider):
+    inner = local(latency=1.0)
+    use_provider(ResilientProvider(inner, retries=0, backoff=0, breaker=CircuitBreaker(10, 60)))
+
+    start = time.perf_counter()
+    answer = hunyuan_api.ask_hunyuan("pku", "cli", budget=0.1)
+    assert time.perf_counter() - start < 0.5
+    assert isinstance(answer, hunyuan_api.FallbackAnswer)
+    assert "北京大学" in answer
+
+    # 超出预算的请求在后台继续，完成后写入缓存，下次直接命中
+    time.sleep(1.2)
+    answer = hunyuan_api.ask_hunyuan("pku", "cli", budget=0.1)
+    assert not isinstance(answer, hunyuan_api.FallbackAnswer)
+    assert inner.calls == 1
+
+
+def test_upstream_failure_returns_local_profile(use_provider, sleeps):
+    inner = local(failures=10)
+    use_provider(ResilientProvider(inner, retries=1, backoff=0.01, breaker=CircuitBreaker(10, 60)))
+    answers = hunyuan_api.ask_hunyuan_many(["pku", "thu", "pku"], "cli", budget=5)
+    assert list(answers) == ["pku", "thu"]
+    assert all(isinstance(a, hunyuan_api.FallbackAnswer) for a in answers.values())
+    assert "模拟上游失败" in answers["pku"]
+    assert inner.calls == 4
+
+
+def test_missing_credentials_raise_configuration_error(monkeypatch):
+    credential = pytest.importorskip("tencentcloud.common.credential")
+
+    class NoProfile:
+        def get_credential(self):
+            raise ValueError("no profile")
+
+    monkeypatch.setattr(llm_provider.settings, "HUNYUAN_SECRET_ID", "")
+    monkeypatch.setattr(llm_provider.settings, "HUNYUAN_SECRET_KEY", "")
+    monkeypatch.setattr(credential, "ProfileCredential", NoProfile)
+
+    provider = llm_provider.HunyuanProvider()
+    with pytest.raises(ConfigurationError, match="TENCENTCLOUD_SECRET_ID"):
+        provider.complete("“北京大学”")
+    assert not provider.is_retryable(ConfigurationError("x"))
+    answer = hunyuan_api._fallback("pku", ConfigurationError("未配置腾讯云密钥"))
+    assert "未配置腾讯云密钥" in answer
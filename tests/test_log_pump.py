@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""LogQueue 的限速与待显示行数上限；界面状态行不受限速。"""
+
+from log_pump import LogQueue, QueueWriter
+
+
+def test_rate_limit_suppresses_output_but_not_status_lines():
+    log_queue = LogQueue(max_pending=100, rate=5)
+    for i in range(20):
+        log_queue.put_line(f"line {i}")
+    log_queue.put_line("[完成] 图片检测。", important=True)
+
+    lines = log_queue.drain()
+    assert lines[:5] == [f"line {i}" for i in range(5)]
+    assert lines[5] == "[完成] 图片检测。"
+    assert lines[-1] == "……（输出过快，已省略 15 行）"
+    assert log_queue.total_suppressed == 15
+
+
+def test_max_pending_keeps_newest_lines():
+    log_queue = LogQueue(max_pending=3, rate=0)
+    for i in range(5):
+        log_queue.put_line(str(i))
+    assert log_queue.drain()[:3] == ["2", "3", "4"]
+
+
+def test_writer_splits_lines_and_keeps_last_partial():
+    log_queue = LogQueue(max_pending=100, rate=1)
+    writer = QueueWriter(log_queue)
+    writer.write("first\nprogress 10%\rprogress 100%")
+    writer.flush_partial()
+    assert log_queue.drain()[:2] == ["first", "progress 100%"]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""画面变化门控：变化阈值、最长检测间隔、reset，以及导出到指标的帧数与 stats() 一致。"""
+
+import numpy as np
+import pytest
+
+from scene_gate import SCENE_GATE_FRAMES, SceneChangeGate
+
+
+def frame(value, height=72, width=128):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def frame_counts():
+    return {dict(labels)["result"]: value for _, labels, value in SCENE_GATE_FRAMES.samples()}
+
+
+def test_first_frame_is_always_inferred():
+    gate = SceneChangeGate(threshold=0.5, max_interval=100)
+    assert gate.should_infer(frame(0), 0)
+    assert gate.last_score == 1.0
+
+
+@pytest.mark.parametrize("step, expected", [(2, False), (5, False), (6, True), (20, True)])
+def test_threshold(step, expected):
+    # 亮度整体变化 step/255；阈值 5.5/255
+    gate = SceneChangeGate(threshold=5.5 / 255, max_interval=100)
+    gate.should_infer(frame(100), 0)
+    assert gate.should_infer(frame(100 + step), 1) is expected
+    assert gate.last_score == pytest.approx(step / 255)
+
+
+def test_small_changes_are_measured_against_last_inferred_frame():
+    # 参考画面只在检测时更新，缓慢累积的变化最终也会触发检测
+    gate = SceneChangeGate(threshold=5.5 / 255, max_interval=100)
+    gate.should_infer(frame(100), 0)
+    results = [gate.should_infer(frame(100 + 2 * i), i) for i in range(1, 5)]
+    assert results == [False, False, True, False]
+
+
+def test_max_interval_forces_inference():
+    gate = SceneChangeGate(threshold=0.5, max_interval=10)
+    decisions = [gate.should_infer(frame(0), i) for i in range(25)]
+    assert [i for i, inferred in enumerate(decisions) if inferred] == [0, 10, 20]
+
+
+def test_reset_forces_next_inference():
+    gate = SceneChangeGate(threshold=0.5, max_interval=100)
+    gate.should_infer(frame(0), 0)
+    assert not gate.should_infer(frame(0), 1)
+    gate.reset()
+    assert gate.should_infer(frame(0), 2)
+
+
+def test_stats_match_exported_counter():
+    before = frame_counts()
+    gate = SceneChangeGate(threshold=0.5, max_interval=4)
+    for i in range(10):
+        gate.should_infer(frame(0), i)
+    stats = gate.stats()
+    assert (stats["checked"], stats["inferred"], stats["skipped"]) == (10, 3, 7)
+    assert stats["skip_rate"] == pytest.approx(0.7)
+    after = frame_counts()
+    assert after["inferred"] - before.get("inferred", 0) == 3
+    assert after["skipped"] - before.get("skipped", 0) == 7
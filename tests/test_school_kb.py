@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""混元回答的解析，以及只有知识库提示词（KB_VARIANT）的回答才写入知识库。"""
+
+import pytest
+
+import hunyuan_api
+import school_kb
+from school_kb import KB_VARIANT, KnowledgeBase, parse_reply
+
+REPLY = """学校名：北京大学
+国家：中国
+QS排名：14
+软科排名：无
+官网链接：https://www.pku.edu.cn
+
+北京大学创办于 1898 年。"""
+
+
+def test_parse_reply_fields():
+    record = parse_reply("PKU", REPLY, model="test")
+    assert (record.label, record.name, record.country) == ("pku", "北京大学", "中国")
+    assert (record.qs_rank, record.arwu_rank) == ("14", "")
+    assert record.website == "https://www.pku.edu.cn"
+    assert record.details == "北京大学创办于 1898 年。"
+    assert record.model == "test"
+
+
+def test_parse_reply_markdown_and_long_field_names():
+    reply = ("- **学校名（中文）**：清华大学\n"
+             "**所属国家**: 中国\n"
+             "QS世界大学排名：暂无\n"
+             "官网：清华大学官网（https://www.tsinghua.edu.cn）\n"
+             "学校名：重复的字段留在 details 中")
+    record = parse_reply("thu", reply)
+    assert (record.name, record.country, record.qs_rank) == ("清华大学", "中国", "")
+    assert record.website == "https://www.tsinghua.edu.cn"
+    assert record.details == "学校名：重复的字段留在 details 中"
+
+
+def test_parse_reply_without_fields_uses_known_name():
+    record = parse_reply("pku", "抱歉，我无法回答。")
+    assert record.name != "pku"
+    assert record.details == "抱歉，我无法回答。"
+    assert record.text().startswith(f"学校名：{record.name}")
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    kb = KnowledgeBase(path=str(tmp_path / "kb.json"))
+    monkeypatch.setattr(school_kb, "_kb", kb)
+    monkeypatch.setattr(hunyuan_api, "ask_hunyuan_many",
+                        lambda labels, variant, budget=None: {label: REPLY for label in labels})
+    return kb
+
+
+@pytest.mark.parametrize("variant, stored", [(KB_VARIANT, True), ("cli", False)])
+def test_lookup_many_only_stores_kb_variant(kb, variant, stored):
+    answers = school_kb.lookup_many(["pku", "pku"], variant=variant)
+    assert list(answers) == ["pku"]
+    assert answers["pku"].name == "北京大学"
+    assert (kb.get("pku") is not None) == stored
+    assert (KnowledgeBase(kb.path).get("pku") is not None) == stored
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""切块坐标、切块数上限与分批推理，以及切块结果的合并。"""
+
+import numpy as np
+import pytest
+
+from inference_backend import InferenceBackend, make_detections
+from tiling import SlicedBackend, merge_detections, tile_offsets, tile_scale
+
+NAMES = {0: "pku", 1: "thu"}
+
+
+class RecordingBackend(InferenceBackend):
+    """每张输入都在左上角 (8, 8, 40, 40) 报一个 pku，并记录每次调用的批大小与输入尺寸。"""
+
+    def __init__(self, imgsz=640):
+        super().__init__("stub", imgsz=imgsz)
+        self.names = NAMES
+        self.batches = []
+        self.shapes = []
+
+    def predict(self, images):
+        self.batches.append(len(images))
+        self.shapes.extend(image.shape[:2] for image in images)
+        return [make_detections([[8, 8, 40, 40]], [0.5], [0], NAMES) for _ in images]
+
+
+def boxes(*rows):
+    xyxy = [row[:4] for row in rows]
+    return make_detections(xyxy, [row[4] for row in rows], [row[5] for row in rows], NAMES)
+
+
+def test_merge_keeps_best_box_and_drops_half_boxes():
+    merged = merge_detections(boxes(
+        (100, 100, 200, 200, 0.9, 0),
+        (100, 100, 150, 200, 0.95, 0),  # 切块边缘截断的半个校徽，置信度更高
+        (110, 105, 205, 198, 0.6, 0),
+    ), 0.6, NAMES)
+    assert len(merged) == 1
+    assert merged.xyxy.tolist() == [[100, 100, 150, 200]]
+    assert merged.confidence.tolist() == pytest.approx([0.95])
+
+
+def test_merge_keeps_other_classes_and_separate_boxes():
+    merged = merge_detections(boxes(
+        (100, 100, 200, 200, 0.9, 0),
+        (100, 100, 200, 200, 0.8, 1),
+        (300, 300, 400, 400, 0.7, 0),
+        (180, 180, 280, 280, 0.6, 0),  # 与第一个框只有少量重叠
+    ), 0.6, NAMES)
+    assert sorted(merged.confidence.tolist()) == pytest.approx([0.6, 0.7, 0.8, 0.9])
+    assert merged.data["class_name"].tolist() == ["pku", "thu", "pku", "pku"]
+
+
+def test_merge_empty():
+    empty = make_detections(np.zeros((0, 4)), [], [], NAMES)
+    assert len(merge_detections(empty, 0.6, NAMES)) == 0
+
+
+def test_tile_offsets_cover_image():
+    offsets = tile_offsets(1280, 720, 640, 0.2)
+    assert len(offsets) == 6
+    assert max(x + w for x, y, w, h in offsets) == 1280
+    assert max(y + h for x, y, w, h in offsets) == 720
+    assert tile_offsets(500, 400, 640, 0.2) == [(0, 0, 500, 400)]
+
+
+def test_tile_scale_caps_tile_count():
+    assert tile_scale(1280, 720, 640, 0.2, 12) == 1.0
+    scale = tile_scale(4000, 3000, 640, 0.2, 12)
+    assert scale < 1
+    assert len(tile_offsets(int(4000 * scale), int(3000 * scale), 640, 0.2)) <= 12
+
+
+def test_sliced_backend_caps_tiles_and_chunks_batches():
+    base = RecordingBackend()
+    model = SlicedBackend(base, mode="on", max_tiles=12, batch=4)
+    image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+    result = model.predict([image, image])[0]
+
+    assert model.stats()["downscaled_images"] == 2
+    assert model.tiles <= 24
+    assert sum(base.batches) == model.tiles + 2
+    assert max(base.batches) == 4
+    assert all(max(shape) <= 640 for shape in base.shapes if shape != (3000, 4000))
+    # 整图的框保持原坐标，缩小后切块里的框按比例映射回原图
+    assert result.xyxy.min() >= 0
+    assert [8, 8, 40, 40] in result.xyxy.tolist()
+    scale = tile_scale(4000, 3000, 640, 0.2, 12)
+    assert result.xyxy[:, 2].max() == pytest.approx((int(4000 * scale) - 640 + 40) / scale, rel=1e-4)
+
+
+def test_auto_mode_skips_small_images():
+    base = RecordingBackend()
+    model = SlicedBackend(base, mode="auto", auto_ratio=2.0)
+    model.predict([np.zeros((700, 1200, 3), dtype=np.uint8)])
+    assert base.batches == [1]
+    assert model.stats()["tiled_images"] == 0
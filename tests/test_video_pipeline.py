@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""VideoEngine 的无窗口运行与出错时的退出。"""
+
+import threading
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("supervision")
+
+from inference_backend import make_detections
+from video_pipeline import VideoEngine
+
+NAMES = {0: "pku", 1: "thu"}
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(60):
+        writer.write(np.full((48, 64, 3), i * 4, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class StubModel:
+    names = NAMES
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def detect(self, frame):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("推理失败")
+        return make_detections([[1, 1, 20, 20]], [0.9], [1], NAMES)
+
+
+def run_with_timeout(engine, timeout=10):
+    """在线程中运行 engine.run()，超时视为挂起。"""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["summary"] = engine.run()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "VideoEngine.run() 没有退出"
+    return outcome
+
+
+def test_headless_run_summary(video):
+    engine = VideoEngine(video, model=StubModel(), stride=5, display=False, track=False, queue_size=2)
+    summary = run_with_timeout(engine)["summary"]
+    assert summary["frames_read"] == 60
+    assert summary["frames_inferred"] == 12
+    assert summary["schools"] == {"thu": 0.0}
+
+
+@pytest.mark.parametrize("fail_after", [0, 3])
+def test_failing_model_raises_instead_of_hanging(video, fail_after):
+    # 队列很小，推理线程退出后解码线程若不停止就会一直阻塞在 put 上
+    engine = VideoEngine(video, model=StubModel(fail_after), stride=1, display=False, track=False, queue_size=2)
+    outcome = run_with_timeout(engine)
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert engine.frames_read < 60
+
+
+def test_failing_scene_gate_raises(video):
+    class BrokenGate:
+        def should_infer(self, frame, frame_index):
+            raise ValueError("门控失败")
+
+        def stats(self):
+            return {}
+
+    engine = VideoEngine(video, model=StubModel(), stride=1, display=False, track=False, queue_size=2,
+                         scene_gate=BrokenGate())
+    assert isinstance(run_with_timeout(engine).get("error"), ValueError)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+后台混元查询：采集与检测循环只提交请求、轮询结果，不再等待大模型返回。
+同一校徽在冷却时间内不会重复查询；结果可叠加显示在画面上。
+"""
+
+import os
+import threading
+import time
+
+import settings
+
+# 自动查找的中文字体（Windows / macOS / Linux 常见位置）
+_FONT_CANDIDATES = [
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+]
+
+
+class BackgroundLookup:
+    def __init__(self, cooldown=None, variant="cli"):
+        self.cooldown = settings.CAMERA_LABEL_COOLDOWN if cooldown is None else cooldown
+        self.variant = variant
+
+        self._pending = {}  # 标签 -> Future
+        self._requested_at = {}  # 标签 -> 最近一次提交时间
+        self.results = {}  # 标签 -> 最近一次 SchoolRecord 或异常
+        self._lock = threading.Lock()
+
+    def request(self, school_label):
+        """提交查询；查询中或仍在冷却期内返回 False。"""
+        import hunyuan_api
+        import school_kb
+
+        now = time.monotonic()
+        with self._lock:
+            if school_label in self._pending:
+                return False
+            last = self._requested_at.get(school_label)
+            if last is not None and now - last < self.cooldown:
+                return False
+            self._requested_at[school_label] = now
+            # 知识库已收录的学校立即返回；未收录的后台查询不阻塞画面，不设时间预算，等待完整回答
+            self._pending[school_label] = hunyuan_api.get_executor().submit(
+                school_kb.lookup, school_label, self.variant, 0)
+        return True
+
+    def poll(self):
+        """返回自上次轮询以来完成的查询 [(标签, 回答或异常)]，不阻塞。"""
+        finished = []
+        with self._lock:
+            for school_label, future in list(self._pending.items()):
+                if not future.done():
+                    continue
+                del self._pending[school_label]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                self.results[school_label] = result
+                finished.append((school_label, result))
+        return finished
+
+    @property
+    def busy(self):
+        return bool(self._pending)
+
+
+def _find_font():
+    if settings.OVERLAY_FONT and os.path.exists(settings.OVERLAY_FONT):
+        return settings.OVERLAY_FONT
+    for path in _FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+_font_cache = {}
+
+
+def draw_info_panel(frame, lines, font_size=18, origin=(10, 10)):
+    """
+    在画面左上角绘制半透明信息面板。找到中文字体时用 PIL 绘制，否则退回 cv2.putText（仅 ASCII）。
+    """
+    import cv2
+
+    if not lines:
+        return frame
+
+    line_height = font_size + 6
+    width = max(320, int(frame.shape[1] * 0.45))
+    height = line_height * len(lines) + 12
+    x, y = origin
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (x, y), (x + width, y + height), (0, 0, 0), -1)
+    frame = cv2.addWeighted(overlay, 0.55, frame, 0.45, 0)
+
+    font_path = _find_font()
+    if font_path is None:
+        for i, line in enumerate(lines):
+            text = line.encode("ascii", errors="ignore").decode() or "..."
+            cv2.putText(frame, text, (x + 8, y + 6 + line_height * (i + 1) - 6),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_size / 32, (255, 255, 255), 1, cv2.LINE_AA)
+        return frame
+
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = _font_cache.get((font_path, font_size))
+    if font is None:
+        font = _font_cache[(font_path, font_size)] = ImageFont.truetype(font_path, font_size)
+    image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((x + 8, y + 6 + line_height * i), line, font=font, fill=(255, 255, 255))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def summary_lines(school_label, result, max_lines=6):
+    """从混元回答中取前几行非空内容作为画面摘要。"""
+    if isinstance(result, Exception):
+        return [f"{school_label}：识别失败"]
+    lines = [line.strip() for line in str(result).splitlines() if line.strip()]
+    return lines[:max_lines] or [school_label]
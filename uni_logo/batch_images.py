@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+批量图片检测：目录 / 通配符 / 文件列表 -> 多进程解码 -> 批量推理 -> 流式写出 JSONL。
+输出文件中已成功处理的图片会被跳过，中断后重新执行同一命令即可续跑，上次失败的图片会重试。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional
+
+import metrics
+import settings
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+
+@dataclass
+class LoadedImage:
+    path: str
+    sha256: Optional[str] = None
+    image: Any = None  # 可能已在子进程中缩小，见 load_image
+    error: Optional[str] = None
+    detections: Any = None  # 原图坐标
+    width: int = 0  # 原图尺寸
+    height: int = 0
+    scale: float = 1.0  # image 相对原图的缩放比例
+
+
+def expand_sources(sources, recursive=True, extensions=IMAGE_EXTENSIONS):
+    """把目录、通配符、@文件列表和普通文件展开为去重后的路径列表（目录与通配符只保留 extensions 中的文件）。"""
+    paths = []
+    for source in sources:
+        if source.startswith("@"):
+            with open(source[1:], encoding="utf-8") as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif os.path.isdir(source):
+            pattern = os.path.join(source, "**", "*") if recursive else os.path.join(source, "*")
+            paths.extend(sorted(p for p in glob.glob(pattern, recursive=recursive)
+                                if p.lower().endswith(extensions)))
+        elif glob.has_magic(source):
+            paths.extend(sorted(p for p in glob.glob(source, recursive=True)
+                                if p.lower().endswith(extensions)))
+        else:
+            paths.append(source)
+    return list(dict.fromkeys(os.path.normpath(p) for p in paths))
+
+
+def load_done(output):
+    """
+    读取已有 JSONL 中成功处理过的路径；失败的记录不算完成，续跑时会重试（同一路径以最后一条记录为准）。
+    最后一行可能因中断而不完整，直接忽略。
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                path = record["path"]
+            except (ValueError, KeyError):
+                continue
+            if "error" in record:
+                done.discard(path)
+            else:
+                done.add(path)
+    return done
+
+
+def truncate_partial_line(output, chunk_size=64 * 1024):
+    """去掉中断时写了一半的最后一行（load_done 已将其忽略，该图片会重新处理），使追加的记录从新行开始。"""
+    if not os.path.exists(output):
+        return
+    with open(output, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+def load_image(path, max_side=None):
+    """
+    在子进程中读取并解码图片，同时计算内容摘要供检测缓存使用。
+    给出 max_side 时按模型 letterbox 相同的方式把图片等比缩小到不超过 max_side，
+    只把缩小后的图片传回主进程，避免整张大图在进程间序列化。
+    """
+    import cv2
+    import numpy as np
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return LoadedImage(path, error="无法解码图片")
+        height, width = image.shape[:2]
+        scale = 1.0
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            size = (int(round(width * scale)), int(round(height * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+        return LoadedImage(path, hashlib.sha256(data).hexdigest(), image, width=width, height=height, scale=scale)
+    except OSError as e:
+        return LoadedImage(path, error=str(e))
+
+
+def auto_batch_size():
+    if settings.BATCH_SIZE > 0:
+        return settings.BATCH_SIZE
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return 32
+    except ImportError:
+        pass
+    return max(1, min(16, (os.cpu_count() or 2) // 2))
+
+
+def auto_workers():
+    if settings.BATCH_DECODE_WORKERS > 0:
+        return settings.BATCH_DECODE_WORKERS
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def _windowed_map(pool, fn, items, window):
+    """按顺序提交任务，但同时在途的任务不超过 window 个，避免解码结果堆积占满内存。"""
+    pending = []
+    iterator = iter(items)
+    for item in iterator:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            break
+    for item in iterator:
+        yield pending.pop(0).result()
+        pending.append(pool.submit(fn, item))
+    for future in pending:
+        yield future.result()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batch(sources, output, model, annotate_dir=None, batch_size=None, workers=None,
+              resume=True, recursive=True, cache=None, progress=print):
+    """
+    执行批量检测，返回统计信息。每个批次写完后立即 flush，保证中断时已完成的结果不丢失。
+    """
+    import cv2
+    import supervision as sv
+    from result_format import detections_to_json
+    from tiling import SlicedBackend
+
+    batch_size = batch_size or auto_batch_size()
+    workers = workers or auto_workers()
+    names = model.names
+    # 分块推理需要原始分辨率；否则模型反正会把图片缩到 imgsz，在子进程里先缩小
+    loader = load_image if isinstance(model, SlicedBackend) else partial(load_image, max_side=model.imgsz)
+
+    paths = expand_sources(sources, recursive)
+    done = load_done(output) if resume else set()
+    todo = [p for p in paths if p not in done]
+    progress(f"共 {len(paths)} 张图片，已完成 {len(paths) - len(todo)} 张，待处理 {len(todo)} 张"
+             f"（批大小 {batch_size}，解码进程 {workers}）")
+
+    if annotate_dir:
+        os.makedirs(annotate_dir, exist_ok=True)
+        box_annotator = sv.BoxAnnotator()
+        label_annotator = sv.LabelAnnotator()
+
+    stats = {"images": 0, "errors": 0, "cached": 0, "detections": 0}
+    start = time.perf_counter()
+    last_report = start
+
+    if resume:
+        truncate_partial_line(output)
+    with open(output, "a" if resume else "w", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in _batched(_windowed_map(pool, loader, todo, batch_size * 4), batch_size):
+            records = {}
+            to_infer = []
+            for item in batch:
+                if item.error is not None:
+                    records[item.path] = {"path": item.path, "error": item.error}
+                    stats["errors"] += 1
+                    continue
+                entry = None
+                if cache is not None:
+                    with metrics.stage("cache_lookup"):
+                        _, entry = cache.lookup(sha256=item.sha256)
+                if entry is not None:
+                    item.detections = entry.to_detections()
+                    stats["cached"] += 1
+                else:
+                    to_infer.append(item)
+
+            if to_infer:
+                with metrics.stage("infer"):
+                    results = model.predict([item.image for item in to_infer])
+                for item, result in zip(to_infer, results):
+                    if item.scale != 1 and len(result):
+                        result.xyxy = result.xyxy / item.scale
+                    item.detections = result
+                    if cache is not None:
+                        with metrics.stage("cache_store"):
+                            cache.store(item.sha256, item.detections, item.width, item.height)
+
+            for item in batch:
+                if item.error is not None:
+                    continue
+                records[item.path] = {
+                    "path": item.path,
+                    "sha256": item.sha256,
+                    "width": item.width,
+                    "height": item.height,
+                    "detections": detections_to_json(item.detections, names),
+                }
+                stats["detections"] += len(item.detections)
+
+                if annotate_dir and len(item.detections) > 0:
+                    with metrics.stage("annotate"):
+                        # 标注画在（可能已缩小的）传回图片上，检测框换算到该图坐标
+                        shown = item.detections
+                        if item.scale != 1:
+                            shown = sv.Detections(xyxy=shown.xyxy * item.scale, confidence=shown.confidence,
+                                                  class_id=shown.class_id, data=shown.data)
+                        annotated = box_annotator.annotate(scene=item.image.copy(), detections=shown)
+                        annotated = label_annotator.annotate(scene=annotated, detections=shown)
+                        stem = os.path.splitext(os.path.basename(item.path))[0]
+                        cv2.imwrite(os.path.join(annotate_dir, f"{stem}_{item.sha256[:8]}.jpg"), annotated)
+
+            with metrics.stage("write"):
+                for item in batch:
+                    out.write(json.dumps(records[item.path], ensure_ascii=False) + "\n")
+                out.flush()
+
+            stats["images"] += len(batch)
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                progress(f"已处理 {stats['images']}/{len(todo)}，{stats['images'] / (now - start):.1f} 张/s")
+                last_report = now
+
+    elapsed = time.perf_counter() - start
+    stats["skipped"] = len(paths) - len(todo)
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["images_per_second"] = round(stats["images"] / elapsed, 2) if elapsed else 0.0
+    return stats
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+批量视频检测：把一批视频分配给多个工作进程，每个进程以无窗口模式运行 VideoEngine。
+每个进程限制 torch / OpenCV 的线程数，避免多进程同时抢占全部核心。
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import settings
+from batch_images import expand_sources
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".m4v", ".mpg", ".mpeg", ".ts", ".webm")
+# 工作进程崩溃（如解码器段错误、内存不足被杀）时进程池整体失效，未完成的视频在新进程池中重试，
+# 每个视频最多尝试这么多次，避免一个必然崩溃的视频反复拖垮整批任务
+MAX_ATTEMPTS = 2
+
+
+def plan_workers(video_count, workers=None, threads=None):
+    """根据 CPU 核数决定工作进程数和每个进程的线程数，返回 (workers, threads)。"""
+    cpus = os.cpu_count() or 1
+    workers = workers or settings.VIDEO_BATCH_WORKERS
+    threads = threads or settings.VIDEO_WORKER_THREADS
+    if not workers:
+        # 单个进程的推理用 2 个线程就能吃到大部分收益，其余核心留给更多视频并行
+        workers = max(1, cpus // (threads or 2))
+    workers = max(1, min(workers, video_count or 1))
+    if not threads:
+        threads = max(1, cpus // workers)
+    return workers, threads
+
+
+def _init_worker(threads):
+    """工作进程初始化：在导入 torch 之前设置线程数环境变量，再显式限制一次。"""
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def track_export_path(tracks_dir, path):
+    """轨迹文件名为 "文件名-路径摘要.json"，不同目录下的同名视频不会互相覆盖。"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    return os.path.join(tracks_dir, f"{stem}-{digest}.json")
+
+
+def process_video(path, stride=10, track=True, scene_gate=True, scene_threshold=None, tracks_path=None, tile=False):
+    """在工作进程中处理单个视频，返回该视频的统计信息；失败时返回带 error 的结果。"""
+    from model_registry import get_model
+    from scene_gate import SceneChangeGate
+    from tiling import tiled
+    from video_pipeline import VideoEngine
+
+    try:
+        model = tiled(get_model(), "auto") if tile else get_model()
+        engine = VideoEngine(path, model=model, stride=stride, display=False, track=track,
+                             scene_gate=SceneChangeGate(threshold=scene_threshold) if scene_gate else None)
+        summary = engine.run()
+        if tracks_path and engine.tracker is not None:
+            summary["tracks"] = tracks_path
+            engine.tracker.export(tracks_path)
+    except Exception as e:
+        return {"source": str(path), "error": str(e)}
+    summary["worker_pid"] = os.getpid()
+    return summary
+
+
+def aggregate(summaries, wall_seconds, workers, threads):
+    """汇总各视频的统计信息，计算整体吞吐量。"""
+    ok = [s for s in summaries if "error" not in s]
+    frames_read = sum(s["frames_read"] for s in ok)
+    video_seconds = sum(s["frames_read"] / s["video_fps"] for s in ok if s["video_fps"])
+    busy_seconds = sum(s["elapsed_seconds"] for s in ok)
+    # 学校 -> 出现过该学校的视频数
+    schools = {}
+    for s in ok:
+        for school in s["schools"]:
+            schools[school] = schools.get(school, 0) + 1
+    return {
+        "videos": len(summaries),
+        "failed": len(summaries) - len(ok),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "frames_read": frames_read,
+        "frames_inferred": sum(s["frames_inferred"] for s in ok),
+        "video_seconds": round(video_seconds, 2),
+        "wall_seconds": round(wall_seconds, 3),
+        "processing_fps": round(frames_read / wall_seconds, 2) if wall_seconds else 0.0,
+        "realtime_factor": round(video_seconds / wall_seconds, 2) if wall_seconds else 0.0,
+        # 各视频处理耗时之和 / 墙钟耗时，即多进程带来的实际并行度
+        "parallelism": round(busy_seconds / wall_seconds, 2) if wall_seconds else 0.0,
+        "schools": dict(sorted(schools.items(), key=lambda kv: kv[1], reverse=True)),
+    }
+
+
+def run_batch_videos(sources, workers=None, threads=None, stride=10, track=True, scene_gate=True,
+                     scene_threshold=None, tracks_dir=None, recursive=True, tile=False, progress=print):
+    """
+    处理 sources 展开后的所有视频，返回 {"videos": [每个视频的统计], "aggregate": 汇总}。
+    """
+    videos = expand_sources(sources, recursive, extensions=VIDEO_EXTENSIONS)
+    workers, threads = plan_workers(len(videos), workers, threads)
+    progress(f"共 {len(videos)} 个视频，{workers} 个工作进程，每个进程 {threads} 个线程")
+    tracks_paths = {}
+    if tracks_dir:
+        tracks_paths = {path: track_export_path(tracks_dir, path) for path in videos}
+        owners = {}
+        for path, tracks_path in tracks_paths.items():
+            key = os.path.normcase(tracks_path)
+            if key in owners:
+                raise ValueError(f"轨迹文件名冲突：{owners[key]} 与 {path} 都会写入 {tracks_path}")
+            owners[key] = path
+        os.makedirs(tracks_dir, exist_ok=True)
+
+    summaries = []
+
+    def report(summary):
+        summaries.append(summary)
+        if "error" in summary:
+            progress(f"[{len(summaries)}/{len(videos)}] {summary['source']} 处理失败：{summary['error']}")
+        else:
+            progress(f"[{len(summaries)}/{len(videos)}] {summary['source']}：{summary['frames_read']} 帧，"
+                     f"{summary['elapsed_seconds']}s，{len(summary['schools'])} 所学校")
+
+    attempts = {}
+    remaining = list(videos)
+    start = time.perf_counter()
+    while remaining:
+        retry = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {pool.submit(process_video, path, stride, track, scene_gate, scene_threshold,
+                                   tracks_paths.get(path), tile): path
+                       for path in remaining}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    summary = future.result()
+                except BrokenProcessPool as e:
+                    attempts[path] = attempts.get(path, 0) + 1
+                    if attempts[path] < MAX_ATTEMPTS:
+                        retry.append(path)
+                        continue
+                    summary = {"source": str(path), "error": f"工作进程异常退出：{e}"}
+                except Exception as e:
+                    # process_video 自己捕获了处理异常，这里是结果无法传回等进程间错误
+                    summary = {"source": str(path), "error": f"{type(e).__name__}: {e}"}
+                report(summary)
+        if retry:
+            progress(f"工作进程异常退出，重新创建进程池，重试 {len(retry)} 个未完成的视频")
+        remaining = retry
+    wall_seconds = time.perf_counter() - start
+
+    # 按输入顺序输出，便于对照
+    order = {path: i for i, path in enumerate(videos)}
+    summaries.sort(key=lambda s: order.get(s["source"], len(order)))
+    return {"videos": summaries, "aggregate": aggregate(summaries, wall_seconds, workers, threads)}
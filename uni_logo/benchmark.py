@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：模型加载、不同 imgsz 的单图耗时、批量吞吐、视频处理帧率、Web 接口并发、混元调用与完整流水线。
+混元由 fake_hunyuan 本地替身代替，无需网络与密钥；结果写成 JSON，可与历史结果对比发现性能回退。
+基准测试期间不读写磁盘上的检测缓存与混元缓存。
+"""
+
+import contextlib
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import settings
+from inference_backend import InferenceBackend, make_detections
+
+SUITES = ("load", "latency", "batch", "video", "web", "llm", "pipeline")
+
+
+def _percentiles(values_ms):
+    values = sorted(values_ms)
+    if not values:
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None}
+    return {
+        "mean_ms": round(sum(values) / len(values), 2),
+        "p50_ms": round(values[len(values) // 2], 2),
+        "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+    }
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def load_images(images=None, count=8, size=(1280, 720), seed=0):
+    """读取 --images 指定的图片；未指定时生成随机图片（只能测耗时，检测不到校徽）。"""
+    import cv2
+    import numpy as np
+
+    if images:
+        from batch_images import expand_sources
+
+        frames = [cv2.imread(p) for p in expand_sources([images])[:count]]
+        frames = [f for f in frames if f is not None]
+        if frames:
+            return frames
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8) for _ in range(count)]
+
+
+def unique_copies(images, count, seed=0):
+    """生成 count 张互不相同的图片（在原图角落写入随机噪声），避免命中检测缓存。"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    copies = []
+    for i in range(count):
+        image = images[i % len(images)].copy()
+        image[:16, :16] = rng.integers(0, 255, (16, 16, 3), dtype=np.uint8)
+        copies.append(image)
+    return copies
+
+
+def bench_load(weights):
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry()
+    registry.get(weights)
+    return registry.timings()[weights]
+
+
+def bench_latency(weights, images, imgsz_list, runs):
+    from inference_backend import load_backend
+
+    results = {}
+    for imgsz in imgsz_list:
+        model = load_backend(weights, imgsz=imgsz)
+        for image in images[:2]:
+            model.detect(image)
+        timings = [_timed(model.detect, images[i % len(images)])[0] for i in range(runs)]
+        results[str(imgsz)] = _percentiles(timings)
+    return results
+
+
+def bench_batch(model, images, batch_sizes, runs):
+    results = {}
+    for batch_size in batch_sizes:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        model.predict(batch)
+        timings = [_timed(model.predict, batch)[0] for _ in range(runs)]
+        mean_ms = sum(timings) / len(timings)
+        results[str(batch_size)] = {
+            "batch_ms": round(mean_ms, 2),
+            "images_per_second": round(batch_size * 1000 / mean_ms, 2) if mean_ms else 0.0,
+        }
+    return results
+
+
+def make_video(images, path, frames=300, fps=25):
+    """用测试图片生成一段视频：每张图片停留若干帧，并逐帧平移，模拟镜头运动。"""
+    import cv2
+    import numpy as np
+
+    height, width = images[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    per_image = max(1, frames // len(images))
+    for i in range(frames):
+        image = cv2.resize(images[(i // per_image) % len(images)], (width, height))
+        writer.write(np.roll(image, i * 4, axis=1))
+    writer.release()
+    return path
+
+
+def bench_video(model, images, video=None, strides=(1, 10)):
+    from video_pipeline import VideoEngine
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = video or make_video(images, os.path.join(tmp, "bench.avi"))
+        for stride in strides:
+            summary = VideoEngine(source, model=model, stride=stride, display=False, track=True).run()
+            results[f"stride_{stride}"] = {
+                key: summary[key] for key in
+                ("frames_read", "frames_inferred", "elapsed_seconds", "processing_fps", "realtime_factor")
+            }
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalWebServer:
+    """在后台线程中启动 web_service，供并发压测。"""
+
+    def __init__(self):
+        import uvicorn
+        import web_service
+
+        self.port = _free_port()
+        config = uvicorn.Config(web_service.web_app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, name="bench-web", daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self._thread.start()
+        deadline = time.monotonic() + 60
+        while not self.server.started and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not self.server.started:
+            raise RuntimeError("Web 服务启动超时")
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def load_test(url, payloads, concurrency, field="files", params=None):
+    """并发 POST payloads（JPEG 字节）到 url，返回吞吐量与延迟分布。"""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def send(data):
+        start = time.perf_counter()
+        try:
+            response = session.post(url, params=params, files={field: ("bench.jpg", data, "image/jpeg")},
+                                    timeout=300)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, payloads))
+    wall = time.perf_counter() - start
+    result = {
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "errors": sum(not ok for _, ok in outcomes),
+        "requests_per_second": round(len(payloads) / wall, 2) if wall else 0.0,
+    }
+    result.update(_percentiles([ms for ms, _ in outcomes]))
+    return result
+
+
+def _jpeg(images):
+    import cv2
+
+    return [cv2.imencode(".jpg", image)[1].tobytes() for image in images]
+
+
+def bench_web(images, requests_count, concurrency):
+    cold = _jpeg(unique_copies(images, requests_count, seed=1))
+    api_cold = _jpeg(unique_copies(images, requests_count, seed=2))
+    cached = _jpeg(images[:1]) * requests_count
+    with LocalWebServer() as server:
+        return {
+            "upload": load_test(f"{server.url}/upload", cold, concurrency, field="file"),
+            "api_detect": load_test(f"{server.url}/api/detect", api_cold, concurrency,
+                                    params={"with_llm": "false", "annotate": "false"}),
+            # 同一张图片重复上传：衡量检测缓存命中后的开销
+            "api_detect_cached": load_test(f"{server.url}/api/detect", cached, concurrency,
+                                           params={"with_llm": "false", "annotate": "false"}),
+        }
+
+
+class WithSyntheticLogos(InferenceBackend):
+    """
+    包装真实模型：照常推理后，在每张图片中央再加一个校徽检测框（各类别轮换）。
+    压测图片是随机生成的，检测不到校徽，pipeline 套件借此让学校资料查询真正参与计时。
+    """
+
+    name = "synthetic"
+
+    def __init__(self, base):
+        super().__init__(base.weights, imgsz=base.imgsz, conf=base.conf, iou=base.iou)
+        self.base = base
+        self.names = base.names
+        self._class_ids = sorted(self.names)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def predict(self, images):
+        import supervision as sv
+
+        results = []
+        for image, detections in zip(images, self.base.predict(images)):
+            with self._lock:
+                class_id = self._class_ids[self._next % len(self._class_ids)]
+                self._next += 1
+            h, w = image.shape[:2]
+            logo = make_detections([[w / 4, h / 4, w * 3 / 4, h * 3 / 4]], [0.9], [class_id], self.names)
+            results.append(sv.Detections.merge([detections, logo]) if len(detections) else logo)
+        return results
+
+
+def _require_requests(server, requests_before, suite):
+    if server.requests == requests_before:
+        raise RuntimeError(f"{suite} 基准测试没有请求到本地混元替身，测得的是降级路径的耗时，结果无效")
+
+
+def bench_llm(server, labels):
+    import hunyuan_api
+    from llm_cache import get_llm_cache
+
+    cache = get_llm_cache()
+    cache.clear()
+    requests_before = server.requests
+    # 不设时间预算，测量上游的真实耗时
+    cold_ms, _ = _timed(hunyuan_api.ask_hunyuan_many, labels, "web", 0)
+    warm_ms, _ = _timed(hunyuan_api.ask_hunyuan_many, labels, "web", 0)
+
+    cache.clear()
+    start = time.perf_counter()
+    first_ms = None
+    for _ in hunyuan_api.stream_hunyuan(labels[0], "web", 0):
+        if first_ms is None:
+            first_ms = (time.perf_counter() - start) * 1000
+    stream_ms = (time.perf_counter() - start) * 1000
+    _require_requests(server, requests_before, "llm")
+    return {
+        "labels": len(labels),
+        "cold_many_ms": round(cold_ms, 2),
+        "warm_many_ms": round(warm_ms, 2),
+        "stream_first_delta_ms": round(first_ms, 2) if first_ms is not None else None,
+        "stream_total_ms": round(stream_ms, 2),
+        "server_requests": server.requests - requests_before,
+    }
+
+
+def bench_pipeline(server, images, requests_count, concurrency):
+    from llm_cache import get_llm_cache
+    from model_registry import get_model, registry
+
+    get_llm_cache().clear()
+    requests_before = server.requests
+    payloads = _jpeg(unique_copies(images, requests_count, seed=3))
+    # 每张图片都带一个校徽检测框，第一次出现的学校查询混元，之后命中学校知识库
+    with registry.override(WithSyntheticLogos(get_model())), LocalWebServer() as web:
+        result = load_test(f"{web.url}/api/detect", payloads, concurrency, params={"with_llm": "true"})
+    _require_requests(server, requests_before, "pipeline")
+    result["server_requests"] = server.requests - requests_before
+    return result
+
+
+def environment(weights):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "weights": weights,
+        "backend": settings.MODEL_BACKEND,
+        "imgsz": settings.MODEL_IMGSZ,
+        "tile_mode": settings.TILE_MODE,
+    }
+
+
+def run_benchmarks(suites=None, weights=None, images=None, video=None, imgsz_list=(320, 480, 640, 960),
+                   batch_sizes=(1, 4, 8, 16), runs=20, requests_count=64, concurrency=8, llm_latency=0.8,
+                   progress=print):
+    """依次运行 suites 中的基准测试，返回 {"environment": ..., "results": {套件: 结果}}。"""
+    from model_registry import active_weights, get_model
+
+    suites = list(suites or SUITES)
+    weights = weights or active_weights()
+    # 基准测试只用内存缓存，避免读到或写入真实的磁盘缓存
+    settings.DET_CACHE_PATH = ""
+    settings.LLM_CACHE_PATH = ""
+    # 学校知识库从空白开始且不在后台预取，pipeline 套件包含首次查询大模型再写入知识库的过程
+    settings.SCHOOL_KB_PATH = ""
+    settings.SCHOOL_KB_REFRESH_HOURS = 0
+    # 压测图片由少量底图加噪声生成，感知哈希会把它们当成同一张图，因此只保留精确匹配
+    settings.DET_CACHE_PHASH = False
+    if weights != active_weights():
+        settings.MODEL_WEIGHTS, settings.MODEL_PRECISION = weights, "fp32"
+
+    frames = load_images(images)
+    report = {"environment": environment(weights), "results": {}}
+    needs_model = {"batch", "video"} & set(suites)
+    model = get_model(weights) if needs_model else None
+
+    server = None
+    with contextlib.ExitStack() as stack:
+        if {"llm", "pipeline"} & set(suites):
+            from fake_hunyuan import FakeHunyuanServer, use_fake_hunyuan
+
+            server = FakeHunyuanServer(latency=llm_latency, first_token_latency=min(0.2, llm_latency)).start()
+            stack.callback(server.stop)
+            stack.enter_context(use_fake_hunyuan(server))
+
+        for suite in suites:
+            progress(f"运行基准测试：{suite}")
+            start = time.perf_counter()
+            if suite == "load":
+                result = bench_load(weights)
+            elif suite == "latency":
+                result = bench_latency(weights, frames, imgsz_list, runs)
+            elif suite == "batch":
+                result = bench_batch(model, frames, batch_sizes, max(3, runs // 4))
+            elif suite == "video":
+                result = bench_video(model, frames, video)
+            elif suite == "web":
+                result = bench_web(frames, requests_count, concurrency)
+            elif suite == "llm":
+                from zidian_uni import LABEL_TO_SCHOOL_NAME
+                result = bench_llm(server, list(LABEL_TO_SCHOOL_NAME)[:concurrency])
+            elif suite == "pipeline":
+                result = bench_pipeline(server, frames, requests_count, concurrency)
+            else:
+                raise ValueError(f"未知的基准测试：{suite}（可选：{', '.join(SUITES)}）")
+            result["suite_seconds"] = round(time.perf_counter() - start, 2)
+            report["results"][suite] = result
+    return report
+
+
+def flatten(results, prefix=""):
+    """把嵌套结果展开为 {"suite.a.b": 数值}。"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _direction(metric):
+    """1 表示越大越好，-1 表示越小越好，0 表示不参与对比。"""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith(("_per_second", "_fps")) or leaf in ("processing_fps", "realtime_factor"):
+        return 1
+    if leaf.endswith(("_ms", "_seconds")) and leaf != "suite_seconds":
+        return -1
+    return 0
+
+
+def compare(current, baseline, max_regression=0.1):
+    """与历史结果对比，返回变差超过 max_regression（比例）的指标列表。"""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for metric, value in now.items():
+        old = before.get(metric)
+        if metric.endswith(".errors") and old is not None and value > old:
+            # 出错的请求数只要增加就算回退
+            regressions.append({"metric": metric, "baseline": old, "current": value, "change": None})
+            continue
+        direction = _direction(metric)
+        if not direction or not old or value is None:
+            continue
+        change = (value - old) / old * direction
+        if change < -max_regression:
+            regressions.append({"metric": metric, "baseline": old, "current": value,
+                                "change": round(change, 3)})
+    return regressions
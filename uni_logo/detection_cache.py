@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+图片检测结果缓存：按图片字节的 SHA-256 精确命中，可选按感知哈希（dHash）命中近似重复图片。
+dHash 只用来找候选，候选还要尺寸一致、缩略图几乎相同才算命中。
+内存 LRU + SQLite 磁盘两级，键中包含模型权重、输入尺寸与置信度 / IoU 阈值，换模型或阈值后自动失效。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+
+import settings
+from model_registry import active_weights
+
+
+@dataclass
+class CachedDetection:
+    xyxy: list
+    confidence: list
+    class_id: list
+    width: int
+    height: int
+    annotated: Optional[bytes] = None  # 标注后的 JPEG，仅精确命中时复用
+    class_name: Optional[list] = None  # 早期写入的条目没有该字段
+    thumbnail: Optional[bytes] = None  # 近似命中时用于确认的缩略图
+
+    def matches(self, fingerprint, max_diff):
+        """近似候选的确认：尺寸完全一致，且缩略图逐像素差异都不超过 max_diff。"""
+        if self.thumbnail is None or (self.width, self.height) != (fingerprint.width, fingerprint.height):
+            return False
+        return thumbnail_diff(self.thumbnail, fingerprint.thumbnail) <= max_diff
+
+    def to_detections(self, width=None, height=None):
+        """还原为 sv.Detections；近似命中时按新图片尺寸缩放检测框。"""
+        import numpy as np
+        import supervision as sv
+
+        if not self.class_id:
+            return sv.Detections.empty()
+        xyxy = np.array(self.xyxy, dtype=np.float32).reshape(-1, 4)
+        if width and height and (width, height) != (self.width, self.height):
+            xyxy *= np.array([width / self.width, height / self.height] * 2, dtype=np.float32)
+        return sv.Detections(
+            xyxy=xyxy,
+            confidence=np.array(self.confidence, dtype=np.float32),
+            class_id=np.array(self.class_id, dtype=int),
+            data={} if self.class_name is None else {"class_name": np.array(self.class_name, dtype=str)},
+        )
+
+
+def content_hash(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(image, size=8):
+    """差值哈希：灰度缩放到 (size+1)×size，比较相邻像素，得到 64 位整数。"""
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+THUMB_SIZE = 32
+
+
+class Fingerprint(NamedTuple):
+    """近似查找用的图片指纹。"""
+    dhash: int
+    thumbnail: bytes  # THUMB_SIZE×THUMB_SIZE 的 BGR 缩略图
+    width: int
+    height: int
+
+
+def fingerprint(image):
+    import cv2
+
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    small = cv2.resize(image, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+    return Fingerprint(dhash(image), small.tobytes(), width, height)
+
+
+def thumbnail_diff(a: bytes, b: bytes):
+    """两张缩略图逐像素差异的最大值，范围 0~1；校徽之间往往只差几个字，不能用平均值。"""
+    import numpy as np
+
+    if len(a) != len(b):
+        return 1.0
+    a = np.frombuffer(a, dtype=np.uint8).astype(np.int16)
+    b = np.frombuffer(b, dtype=np.uint8).astype(np.int16)
+    return float(np.abs(a - b).max()) / 255
+
+
+def _to_signed(value):
+    # SQLite 只支持有符号 64 位整数
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class PhashIndex:
+    """
+    sha256 -> dHash 的索引。哈希值保存在按需扩容的 np.uint64 数组中，查找时对整个数组做一次异或与位计数；
+    条目超过 max_entries 时淘汰最早加入的。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._positions = OrderedDict()  # sha256 -> 数组下标，按加入顺序
+        self._keys = []
+        self._values = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, sha256, value):
+        import numpy as np
+
+        position = self._positions.get(sha256)
+        if position is not None:
+            self._values[position] = value
+            self._positions.move_to_end(sha256)
+            return
+        if self.max_entries <= 0:
+            return
+        while len(self._keys) >= self.max_entries:
+            self.discard(next(iter(self._positions)))
+        if self._values is None or len(self._keys) == len(self._values):
+            grown = np.zeros(max(64, 2 * len(self._keys)), dtype=np.uint64)
+            if self._values is not None:
+                grown[:len(self._keys)] = self._values[:len(self._keys)]
+            self._values = grown
+        self._positions[sha256] = len(self._keys)
+        self._values[len(self._keys)] = value
+        self._keys.append(sha256)
+
+    def discard(self, sha256):
+        position = self._positions.pop(sha256, None)
+        if position is None:
+            return
+        # 用最后一个条目填补空位，数组保持紧凑
+        last = len(self._keys) - 1
+        if position != last:
+            moved = self._keys[last]
+            self._keys[position] = moved
+            self._values[position] = self._values[last]
+            self._positions[moved] = position
+        self._keys.pop()
+
+    def within(self, value, max_distance, limit=4):
+        """返回汉明距离不超过 max_distance 的最多 limit 个 (sha256, 距离)，按距离从近到远。"""
+        import numpy as np
+
+        if not self._keys:
+            return []
+        hashes = self._values[:len(self._keys)]
+        distances = np.unpackbits((hashes ^ np.uint64(value)).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        candidates = np.flatnonzero(distances <= max_distance)
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")[:limit]]
+        return [(self._keys[i], int(distances[i])) for i in candidates]
+
+
+class DetectionCache:
+    # 每写入这么多条检查一次磁盘条目数
+    PRUNE_EVERY = 256
+
+    def __init__(self, namespace=None, path=None, max_size=None, use_phash=None, phash_distance=None,
+                 phash_max_entries=None, phash_max_diff=None, max_rows=None, max_annotated_bytes=None):
+        self.namespace = namespace or default_namespace()
+        self.path = settings.DET_CACHE_PATH if path is None else path
+        self.max_size = settings.DET_CACHE_SIZE if max_size is None else max_size
+        self.use_phash = settings.DET_CACHE_PHASH if use_phash is None else use_phash
+        self.phash_distance = settings.DET_CACHE_PHASH_DISTANCE if phash_distance is None else phash_distance
+        self.phash_max_diff = settings.DET_CACHE_PHASH_MAX_DIFF if phash_max_diff is None else phash_max_diff
+        self.max_rows = settings.DET_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.max_annotated_bytes = (
+            settings.DET_CACHE_MAX_ANNOTATED_BYTES if max_annotated_bytes is None else max_annotated_bytes
+        )
+        phash_max_entries = settings.DET_CACHE_PHASH_MAX_ENTRIES if phash_max_entries is None else phash_max_entries
+
+        self._memory = OrderedDict()  # sha256 -> CachedDetection
+        self._phashes = PhashIndex(phash_max_entries)  # 覆盖内存与磁盘中最近的条目
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+
+        # 精确查找与感知哈希查找分别计数；感知哈希查找只在精确未命中后进行
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.phash_hits = 0
+        self.phash_misses = 0
+
+        if self.enabled and self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL + NORMAL：每次写入只追加日志，不必每条都等待 fsync
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS detection_cache (
+                    sha256 TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    phash INTEGER,
+                    result TEXT NOT NULL,
+                    annotated BLOB,
+                    thumbnail BLOB,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, namespace)
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(detection_cache)")}
+            if "thumbnail" not in columns:
+                self._conn.execute("ALTER TABLE detection_cache ADD COLUMN thumbnail BLOB")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS detection_cache_created ON detection_cache (created_at)")
+            self._conn.commit()
+            self._prune()
+            if self.use_phash:
+                # 只载入最近的 phash_max_entries 条，旧条目仍可精确命中；没有缩略图的旧条目无法确认，不载入
+                rows = self._conn.execute(
+                    "SELECT sha256, phash FROM detection_cache "
+                    "WHERE namespace=? AND phash IS NOT NULL AND thumbnail IS NOT NULL "
+                    "ORDER BY created_at DESC LIMIT ?",
+                    (self.namespace, phash_max_entries),
+                ).fetchall()
+                for sha, value in reversed(rows):
+                    self._phashes.add(sha, value & ((1 << 64) - 1))
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def lookup(self, data: bytes = None, sha256=None):
+        """按图片字节精确查找，返回 (sha256, CachedDetection 或 None)。"""
+        sha256 = sha256 or content_hash(data)
+        if not self.enabled:
+            return sha256, None
+
+        with self._lock:
+            entry = self._get(sha256)
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                self.exact_misses += 1
+            return sha256, entry
+
+    def lookup_similar(self, image):
+        """按感知哈希查找近似重复的图片，返回 (Fingerprint, CachedDetection 或 None)。"""
+        if not (self.enabled and self.use_phash):
+            return None, None
+
+        value = fingerprint(image)
+        with self._lock:
+            for sha256, _ in self._phashes.within(value.dhash, self.phash_distance):
+                entry = self._get(sha256)
+                if entry is not None and entry.matches(value, self.phash_max_diff):
+                    self.phash_hits += 1
+                    return value, entry
+            self.phash_misses += 1
+        return value, None
+
+    def store(self, sha256, detections, width, height, fingerprint=None, annotated=None):
+        """fingerprint 为 lookup_similar 返回的指纹，有了它之后的近似重复图片才能命中该条目。"""
+        if not self.enabled:
+            return
+        if annotated is not None and len(annotated) > self.max_annotated_bytes:
+            annotated = None
+        if fingerprint is not None and not self.use_phash:
+            fingerprint = None
+
+        entry = CachedDetection(
+            xyxy=detections.xyxy.tolist(),
+            confidence=[] if detections.confidence is None else detections.confidence.tolist(),
+            class_id=[] if detections.class_id is None else [int(c) for c in detections.class_id],
+            width=int(width),
+            height=int(height),
+            annotated=annotated,
+            class_name=[str(c) for c in detections.data["class_name"]] if "class_name" in detections.data else None,
+            thumbnail=None if fingerprint is None else fingerprint.thumbnail,
+        )
+        with self._lock:
+            self._remember(sha256, entry)
+            if fingerprint is not None:
+                self._phashes.add(sha256, fingerprint.dhash)
+            if self._conn is not None:
+                result = json.dumps({
+                    "xyxy": entry.xyxy, "confidence": entry.confidence, "class_id": entry.class_id,
+                    "width": entry.width, "height": entry.height, "class_name": entry.class_name,
+                }, ensure_ascii=False)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO detection_cache "
+                    "(sha256, namespace, phash, result, annotated, thumbnail, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        sha256, self.namespace, None if fingerprint is None else _to_signed(fingerprint.dhash),
+                        result, annotated, entry.thumbnail, time.time(),
+                    ),
+                )
+                self._conn.commit()
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    self._prune()
+
+    def attach_annotated(self, sha256, annotated: bytes):
+        """为已有条目补充标注图片，供后续精确命中直接返回。"""
+        if len(annotated) > self.max_annotated_bytes:
+            return
+        with self._lock:
+            entry = self._get(sha256)
+            if entry is None:
+                return
+            entry.annotated = annotated
+            if self._conn is not None:
+                self._conn.execute(
+                    "UPDATE detection_cache SET annotated=? WHERE sha256=? AND namespace=?",
+                    (annotated, sha256, self.namespace),
+                )
+                self._conn.commit()
+
+    def _get(self, sha256):
+        entry = self._memory.get(sha256)
+        if entry is not None:
+            self._memory.move_to_end(sha256)
+            return entry
+
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT result, annotated, thumbnail FROM detection_cache WHERE sha256=? AND namespace=?",
+            (sha256, self.namespace),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = CachedDetection(**json.loads(row[0]), annotated=row[1], thumbnail=row[2])
+        self._remember(sha256, entry)
+        return entry
+
+    def _remember(self, sha256, entry):
+        self._memory[sha256] = entry
+        self._memory.move_to_end(sha256)
+        while len(self._memory) > self.max_size:
+            evicted, _ = self._memory.popitem(last=False)
+            # 没有磁盘层时，被淘汰的条目也不能再被感知哈希命中
+            if self._conn is None:
+                self._phashes.discard(evicted)
+
+    def _prune(self):
+        """磁盘条目超过 max_rows 时删除最早写入的（所有命名空间一起计数）。"""
+        if self._conn is None or self.max_rows <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM detection_cache").fetchone()
+        if count <= self.max_rows:
+            return
+        rows = self._conn.execute(
+            "SELECT rowid, sha256, namespace FROM detection_cache ORDER BY created_at LIMIT ?",
+            (count - self.max_rows,),
+        ).fetchall()
+        self._conn.executemany("DELETE FROM detection_cache WHERE rowid=?", [(row[0],) for row in rows])
+        self._conn.commit()
+        for _, sha256, namespace in rows:
+            if namespace == self.namespace and sha256 not in self._memory:
+                self._phashes.discard(sha256)
+
+    def stats(self):
+        total = self.exact_hits + self.exact_misses
+        hits = self.exact_hits + self.phash_hits
+        return {
+            "exact_hits": self.exact_hits,
+            "exact_misses": self.exact_misses,
+            "phash_hits": self.phash_hits,
+            "phash_misses": self.phash_misses,
+            # 两种查找都没有命中的图片数
+            "misses": max(total - hits, 0),
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "phash_entries": len(self._phashes),
+        }
+
+
+def default_namespace(tile_mode=None):
+    # 不同权重（含 FP32 / INT8）、阈值、是否分块推理的检测结果互不复用
+    tile_mode = (tile_mode or settings.TILE_MODE).lower()
+    tile = "" if tile_mode == "off" else f"+tile-{tile_mode}"
+    return f"{active_weights()}@{settings.MODEL_IMGSZ}/conf{settings.MODEL_CONF:g}/iou{settings.MODEL_IOU:g}{tile}"
+
+
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def get_detection_cache(tile_mode=None):
+    """进程内共享的检测缓存实例；tile_mode 与调用方包装模型时用的分块模式一致（默认 settings.TILE_MODE）。"""
+    namespace = default_namespace(tile_mode)
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _cache_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = DetectionCache(namespace)
+    return cache
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+本地混元替身：实现腾讯云 API 3.0 的 ChatCompletions 接口（普通 JSON 与 SSE 流式两种返回），
+按配置的延迟返回固定格式的学校信息，用于离线基准测试和无密钥环境下的联调。
+腾讯云 SDK 指向它的方式：UNI_LOGO_HUNYUAN_ENDPOINT=127.0.0.1:<端口>，UNI_LOGO_HUNYUAN_PROTOCOL=http。
+"""
+
+import contextlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import settings
+
+_ANSWER = """学校名：{name}
+国家：中国
+QS排名：无
+软科排名：无
+官网链接：https://www.example.edu.cn
+
+（以下为基准测试用的占位内容）{padding}"""
+
+
+def fake_answer(prompt, length=600):
+    """根据提示词中的学校名生成固定格式的回答，总长度约为 length 个字符。"""
+    match = re.search(r"“(.+?)”", prompt)
+    name = match.group(1) if match else "未知大学"
+    text = _ANSWER.format(name=name, padding="")
+    return text + "占位" * max(0, (length - len(text)) // 2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            params = {}
+        request_id = str(uuid.uuid4())
+        action = self.headers.get("X-TC-Action", "")
+        server.record_request()
+
+        if action != "ChatCompletions":
+            body = {"Response": {"Error": {"Code": "InvalidAction", "Message": f"不支持的接口：{action}"},
+                                 "RequestId": request_id}}
+            return self._send(200, "application/json", json.dumps(body).encode("utf-8"))
+
+        messages = params.get("Messages") or [{}]
+        answer = fake_answer(messages[-1].get("Content", ""), server.answer_length)
+
+        if not params.get("Stream"):
+            time.sleep(server.latency)
+            body = {"Response": {
+                "Choices": [{"FinishReason": "stop", "Message": {"Role": "assistant", "Content": answer}}],
+                "Usage": {"PromptTokens": 0, "CompletionTokens": len(answer), "TotalTokens": len(answer)},
+                "Created": int(time.time()),
+                "Id": request_id,
+                "RequestId": request_id,
+            }}
+            return self._send(200, "application/json", json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+        # 流式：首包延迟 first_token_latency，其余延迟均摊到各个分片
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunks = max(1, server.stream_chunks)
+        size = -(-len(answer) // chunks)
+        time.sleep(server.first_token_latency)
+        pause = max(0.0, server.latency - server.first_token_latency) / chunks
+        for i in range(0, len(answer), size):
+            event = {"Choices": [{"Delta": {"Role": "assistant", "Content": answer[i:i + size]},
+                                  "FinishReason": "" if i + size < len(answer) else "stop"}],
+                     "Id": request_id}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(pause)
+        self.close_connection = True
+
+
+class FakeHunyuanServer:
+    """
+    latency：整段回答的耗时（秒）；first_token_latency：流式首包耗时；
+    stream_chunks：流式回答的分片数；answer_length：回答字符数。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.8, first_token_latency=0.2,
+                 stream_chunks=8, answer_length=600):
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.latency = latency
+        self._httpd.first_token_latency = min(first_token_latency, latency)
+        self._httpd.stream_chunks = stream_chunks
+        self._httpd.answer_length = answer_length
+        self._httpd.requests = 0
+        self._lock = threading.Lock()
+        self._httpd.record_request = self._record_request
+        self._thread = None
+
+    def _record_request(self):
+        with self._lock:
+            self._httpd.requests += 1
+
+    @property
+    def endpoint(self):
+        host, port = self._httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def requests(self):
+        return self._httpd.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-hunyuan", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@contextlib.contextmanager
+def use_fake_hunyuan(server):
+    """
+    在当前进程内把混元客户端临时指向 server，退出时恢复原配置。
+    替身不校验密钥，这里填入占位密钥，没有配置真实密钥的机器上也能请求到替身。
+    """
+    import llm_provider
+
+    names = ("LLM_PROVIDER", "HUNYUAN_ENDPOINT", "HUNYUAN_PROTOCOL", "HUNYUAN_SECRET_ID", "HUNYUAN_SECRET_KEY")
+    saved = {name: getattr(settings, name) for name in names}
+    settings.LLM_PROVIDER = "hunyuan"
+    settings.HUNYUAN_ENDPOINT, settings.HUNYUAN_PROTOCOL = server.endpoint, "http"
+    settings.HUNYUAN_SECRET_ID, settings.HUNYUAN_SECRET_KEY = "fake-hunyuan-id", "fake-hunyuan-key"
+    llm_provider.reset_provider()
+    try:
+        yield server
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+        llm_provider.reset_provider()
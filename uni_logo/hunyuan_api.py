@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+混元大模型调用的公共入口，命令行与 Web 服务共用同一份缓存。
+实际请求由 llm_provider 中的大模型服务发出；每次查询有时间预算，超出预算或上游失败时
+立即返回本地学校资料，上游请求在后台继续完成并写入缓存，下一次查询即可拿到完整回答。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+import settings
+from llm_cache import get_llm_cache
+from llm_provider import CircuitOpenError, ConfigurationError, LLMError, get_provider
+from zidian_uni import LABEL_TO_SCHOOL_NAME
+
+_PROMPT_HEAD = """
+        你是一个大学信息查询助手。请根据提供的大学名称“{school_name}”返回如下结构化信息：
+        - 学校名（中文）
+        - 所属国家
+        - QS 世界大学排名（若无请写“无”）
+        - 软科大学排名
+        - 官网链接
+
+        请严格按如下格式输出：
+        学校名：...
+        国家：...
+        QS排名：...
+        软科排名：...
+        官网链接：...
+
+        此外，还请给出这个学校的相关百科、今年来的获得奖项、杰出校友，
+        并请你查询后给出该大学近年高考浙江省投档线分数；
+"""
+
+# 提示词版本：cli 为命令行使用，web 额外要求预测发展趋势
+PROMPT_VARIANTS = {
+    "cli": _PROMPT_HEAD + """
+        最后，请配上几句你对这个大学的评价。
+        """,
+    "web": _PROMPT_HEAD + """
+        最后，请配上几句你对这个大学的评价，以及预测一下这个大学在未来十年中的发展趋势。
+        """,
+}
+
+
+def school_name_of(school_abbr: str):
+    return LABEL_TO_SCHOOL_NAME.get(school_abbr.lower(), school_abbr)
+
+
+def build_prompt(school_abbr: str, variant: str = "cli"):
+    return PROMPT_VARIANTS[variant].format(school_name=school_name_of(school_abbr))
+
+
+LLM_FALLBACKS = metrics.REGISTRY.register(metrics.Counter(
+    "uni_logo_llm_fallbacks_total", "退回本地学校资料的次数，reason 为 timeout / error / circuit_open / not_configured", ["reason"]))
+
+
+class FallbackAnswer(str):
+    """本地学校资料，调用方可据此区分降级回答（不写入缓存与知识库）；note 为退回原因的说明。"""
+
+    note = ""
+
+
+def local_profile(school_abbr: str, reason: str = ""):
+    """大模型不可用时返回的本地学校资料，格式与混元回答的开头一致。"""
+    note = f"（大模型暂时无法回答：{reason}，以下为本地资料）" if reason else "（以下为本地资料）"
+    answer = FallbackAnswer(f"学校名：{school_name_of(school_abbr)}\n\n{note}")
+    answer.note = note
+    return answer
+
+
+def _fallback(school_abbr, error=None):
+    if error is None:
+        reason, text = "timeout", "响应超时"
+    elif isinstance(error, CircuitOpenError):
+        reason, text = "circuit_open", "上游连续失败，暂停调用"
+    elif isinstance(error, ConfigurationError):
+        reason, text = "not_configured", str(error)
+    else:
+        reason, text = "error", str(error)
+    LLM_FALLBACKS.inc(reason=reason)
+    return local_profile(school_abbr, text)
+
+
+def _budget(budget, default):
+    budget = default if budget is None else budget
+    return budget if budget > 0 else None
+
+
+def cache_key(school_abbr: str, variant: str, provider=None):
+    return school_abbr.lower(), variant, (provider or get_provider()).model
+
+
+_executor = None
+_fetch_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """供调用方并发发起查询的线程池（摄像头后台查询、Web 流式转发等）。"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_WORKERS,
+                                               thread_name_prefix="hunyuan")
+    return _executor
+
+
+def _get_fetch_executor():
+    # 真正访问上游的线程池，并发数受 LLM_MAX_WORKERS 限制；与 get_executor() 分开，
+    # 避免调用方线程占满线程池后等待排在后面的上游请求
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _executor_lock:
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(max_workers=settings.LLM_MAX_WORKERS,
+                                                     thread_name_prefix="hunyuan-fetch")
+    return _fetch_executor
+
+
+_inflight = {}  # 缓存键 -> Future，同一问题同时只向上游请求一次
+_inflight_lock = threading.Lock()
+
+
+def _fetch(key, prompt, provider):
+    with metrics.stage("hunyuan"):
+        result = provider.complete(prompt)
+    get_llm_cache().set(key, result)
+    return result
+
+
+def _submit(school_abbr, variant, provider):
+    key = cache_key(school_abbr, variant, provider)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _get_fetch_executor().submit(_fetch, key, build_prompt(school_abbr, variant), provider)
+            _inflight[key] = future
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return future
+
+
+def ask_hunyuan_many(school_labels, variant: str = "cli", budget=None):
+    """
+    先按标签去重，再并发查询每个唯一标签，返回 {标签: 回答}，顺序与首次出现一致。
+    budget 为整批查询的时间预算（秒，默认 settings.LLM_BUDGET，0 表示一直等待）；
+    超时或失败的标签返回本地学校资料。
+    """
+    unique_labels = list(dict.fromkeys(school_labels))
+    if not unique_labels:
+        return {}
+
+    cache = get_llm_cache()
+    provider = get_provider()
+    results, futures = {}, {}
+    for label in unique_labels:
+        cached = cache.get(cache_key(label, variant, provider))
+        if cached is not None:
+            results[label] = cached
+        else:
+            futures[label] = _submit(label, variant, provider)
+
+    if futures:
+        wait(futures.values(), timeout=_budget(budget, settings.LLM_BUDGET))
+    for label, future in futures.items():
+        if not future.done():
+            results[label] = _fallback(label)
+        elif future.exception() is not None:
+            results[label] = _fallback(label, future.exception())
+        else:
+            results[label] = future.result()
+    return {label: results[label] for label in unique_labels}
+
+
+def ask_hunyuan(school_abbr: str, variant: str = "cli", budget=None):
+    return ask_hunyuan_many([school_abbr], variant, budget)[school_abbr]
+
+
+_DONE = object()
+
+
+def stream_hunyuan(school_abbr: str, variant: str = "cli", budget=None):
+    """
+    逐段产出混元回答；命中缓存时一次性返回全文，完整生成后写入缓存。
+    首段回答超出时间预算（默认 settings.LLM_STREAM_BUDGET）或上游失败时改为返回本地学校资料，
+    后台继续生成并写入缓存。
+    """
+    cache = get_llm_cache()
+    provider = get_provider()
+    key = cache_key(school_abbr, variant, provider)
+
+    result = cache.get(key)
+    if result is not None:
+        yield result
+        return
+
+    chunks = queue.Queue()
+    prompt = build_prompt(school_abbr, variant)
+
+    def produce():
+        parts = []
+        try:
+            with metrics.stage("hunyuan_stream"):
+                for delta in provider.stream(prompt):
+                    parts.append(delta)
+                    chunks.put(delta)
+            cache.set(key, "".join(parts))
+            chunks.put(_DONE)
+        except Exception as e:
+            chunks.put(e)
+
+    start = time.perf_counter()
+    _get_fetch_executor().submit(produce)
+    try:
+        item = chunks.get(timeout=_budget(budget, settings.LLM_STREAM_BUDGET))
+    except queue.Empty:
+        yield _fallback(school_abbr)
+        return
+    if isinstance(item, Exception):
+        yield _fallback(school_abbr, item)
+        return
+    metrics.record_stage("hunyuan_first_token", time.perf_counter() - start)
+
+    while item is not _DONE:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+        try:
+            item = chunks.get(timeout=settings.HUNYUAN_TIMEOUT)
+        except queue.Empty:
+            raise LLMError("混元流式回答超时")
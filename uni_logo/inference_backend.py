@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+推理后端：PyTorch（ultralytics）、ONNX Runtime、OpenVINO 共用同一接口。
+所有后端的 predict() 都返回 sv.Detections 列表，names 为类别 id -> 标签，调用方无需关心底层框架。
+导出模型的前后处理（letterbox、置信度过滤、按类别 NMS、坐标还原）与 ultralytics 保持一致。
+"""
+
+import ast
+import glob
+import os
+import time
+
+import settings
+
+
+def make_detections(xyxy, confidence, class_id, names):
+    """构造与 sv.Detections.from_ultralytics 相同格式的结果（带 class_name）。"""
+    import numpy as np
+    import supervision as sv
+
+    class_id = np.asarray(class_id, dtype=int)
+    return sv.Detections(
+        xyxy=np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+        confidence=np.asarray(confidence, dtype=np.float32),
+        class_id=class_id,
+        data={"class_name": np.array([names.get(int(c), str(c)) for c in class_id], dtype=str)},
+    )
+
+
+def nms(boxes, scores, iou_threshold):
+    """标准 NMS，返回保留框的下标（按置信度从高到低）。"""
+    import numpy as np
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+def box_iou(a, b):
+    """两组 xyxy 框的两两 IoU，返回 len(a) x len(b) 矩阵。"""
+    import numpy as np
+
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (br - tl).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class InferenceBackend:
+    """推理后端接口。子类需设置 names，并实现 predict(images) -> list[sv.Detections]。"""
+
+    name = "base"
+
+    def __init__(self, weights, imgsz=None, conf=None, iou=None):
+        self.weights = weights
+        self.imgsz = imgsz or settings.MODEL_IMGSZ
+        self.conf = settings.MODEL_CONF if conf is None else conf
+        self.iou = settings.MODEL_IOU if iou is None else iou
+        self.names = {}
+
+    def predict(self, images):
+        raise NotImplementedError
+
+    def detect(self, image):
+        """单张图片的便捷接口。"""
+        return self.predict([image])[0]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.weights!r}, imgsz={self.imgsz})"
+
+
+class TorchBackend(InferenceBackend):
+    """ultralytics YOLO（.pt 权重），即原来各检测命令直接调用的方式。"""
+
+    name = "torch"
+
+    def __init__(self, weights, **kwargs):
+        super().__init__(weights, **kwargs)
+        from ultralytics import YOLO
+
+        self.model = YOLO(weights)
+        self.names = dict(self.model.names)
+
+    def predict(self, images):
+        import supervision as sv
+
+        if not images:
+            return []
+        results = self.model(list(images), imgsz=self.imgsz, conf=self.conf, iou=self.iou, verbose=False)
+        return [sv.Detections.from_ultralytics(result) for result in results]
+
+
+class ExportedBackend(InferenceBackend):
+    """导出模型（ONNX / OpenVINO）的公共前后处理，子类只需实现 _run(batch) 返回原始输出。"""
+
+    # 导出模型的输入尺寸是否固定；固定 batch=1 时逐张推理
+    fixed_batch = None
+    input_size = None
+    input_dtype = "float32"
+
+    def letterbox(self, image):
+        """按 ultralytics 的 LetterBox 等比缩放并居中填充灰边，返回 (图像, 缩放比例, (左边距, 上边距))。"""
+        import cv2
+
+        height, width = self.input_size or (self.imgsz, self.imgsz)
+        h, w = image.shape[:2]
+        ratio = min(height / h, width / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        dw, dh = (width - new_w) / 2, (height - new_h) / 2
+        if (w, h) != (new_w, new_h):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        return image, ratio, (left, top)
+
+    def preprocess(self, images):
+        import numpy as np
+
+        tensors, metas = [], []
+        for image in images:
+            padded, ratio, pad = self.letterbox(image)
+            # BGR HWC uint8 -> RGB CHW float 0~1
+            tensors.append(padded[:, :, ::-1].transpose(2, 0, 1))
+            metas.append((ratio, pad, image.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(tensors), dtype=np.float32) / 255.0
+        return batch.astype(self.input_dtype, copy=False), metas
+
+    def postprocess(self, output, meta):
+        """output: (4 + 类别数, 候选框数)，前 4 行为 cx, cy, w, h。"""
+        import numpy as np
+
+        ratio, (left, top), (h, w) = meta
+        pred = np.asarray(output, dtype=np.float32).T
+        scores = pred[:, 4:]
+        class_id = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), class_id]
+        mask = confidence > self.conf
+        pred, class_id, confidence = pred[mask], class_id[mask], confidence[mask]
+
+        xyxy = np.empty((len(pred), 4), dtype=np.float32)
+        xyxy[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        xyxy[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+        if len(xyxy):
+            # 按类别做 NMS：给不同类别的框加上足够大的偏移，使其互不重叠
+            keep = nms(xyxy + class_id[:, None] * 7680.0, confidence, self.iou)[:settings.MODEL_MAX_DET]
+            xyxy, confidence, class_id = xyxy[keep], confidence[keep], class_id[keep]
+            xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - left) / ratio).clip(0, w)
+            xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - top) / ratio).clip(0, h)
+        return make_detections(xyxy, confidence, class_id, self.names)
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def predict(self, images):
+        if not images:
+            return []
+        batch, metas = self.preprocess(images)
+        if self.fixed_batch == 1 and len(batch) > 1:
+            outputs = [self._run(batch[i:i + 1])[0] for i in range(len(batch))]
+        else:
+            outputs = self._run(batch)
+        return [self.postprocess(output, meta) for output, meta in zip(outputs, metas)]
+
+    @staticmethod
+    def _static_dims(shape):
+        """把模型输入形状中的静态维度转为 int，动态维度转为 None。"""
+        dims = []
+        for dim in shape:
+            try:
+                dims.append(int(dim))
+            except (TypeError, ValueError):
+                dims.append(None)
+        return dims
+
+    def _apply_input_shape(self, shape):
+        batch, _, height, width = self._static_dims(shape)
+        self.fixed_batch = batch
+        if height and width:
+            self.input_size = (height, width)
+
+
+class OnnxBackend(ExportedBackend):
+    """ONNX Runtime 后端，权重为 `yolo export format=onnx` 导出的 .onnx 文件。"""
+
+    name = "onnx"
+
+    def __init__(self, weights, **kwargs):
+        super().__init__(weights, **kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if settings.ONNX_THREADS > 0:
+            options.intra_op_num_threads = settings.ONNX_THREADS
+        available = ort.get_available_providers()
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+        self.session = ort.InferenceSession(weights, sess_options=options, providers=providers)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = "float16" if model_input.type == "tensor(float16)" else "float32"
+        self._apply_input_shape(model_input.shape)
+
+        # ultralytics 把类别名写在模型元数据里，形如 "{0: 'pku', 1: 'thu'}"
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            self.names = ast.literal_eval(metadata["names"])
+        else:
+            classes = self.session.get_outputs()[0].shape[1] - 4
+            self.names = {i: str(i) for i in range(classes)}
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    """OpenVINO 后端，权重为 `yolo export format=openvino` 导出的目录（或其中的 .xml 文件）。"""
+
+    name = "openvino"
+
+    def __init__(self, weights, **kwargs):
+        super().__init__(weights, **kwargs)
+        import openvino as ov
+
+        xml = weights
+        if os.path.isdir(weights):
+            xml = glob.glob(os.path.join(weights, "*.xml"))[0]
+        core = ov.Core()
+        model = core.read_model(xml)
+        self._apply_input_shape([d.get_length() if d.is_static else None for d in model.input(0).partial_shape])
+        self.compiled = core.compile_model(model, settings.OPENVINO_DEVICE)
+
+        metadata_path = os.path.join(os.path.dirname(xml), "metadata.yaml")
+        if os.path.exists(metadata_path):
+            import yaml
+
+            with open(metadata_path, encoding="utf-8") as f:
+                self.names = {int(k): v for k, v in yaml.safe_load(f)["names"].items()}
+        else:
+            classes = model.output(0).partial_shape[1].get_length() - 4
+            self.names = {i: str(i) for i in range(classes)}
+
+    def _run(self, batch):
+        return self.compiled(batch)[0]
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+}
+
+
+def resolve_backend(weights, backend=None):
+    """backend 为 auto 时按权重路径推断：.onnx -> onnx，*_openvino_model / .xml -> openvino，其余 -> torch。"""
+    backend = (backend or settings.MODEL_BACKEND).lower()
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的推理后端：{backend}（可选：auto, {', '.join(BACKENDS)}）")
+        return backend
+    path = weights.rstrip("/\\").lower()
+    if path.endswith(".onnx"):
+        return OnnxBackend.name
+    if path.endswith("_openvino_model") or path.endswith(".xml"):
+        return OpenVinoBackend.name
+    return TorchBackend.name
+
+
+def load_backend(weights, backend=None, **kwargs):
+    return BACKENDS[resolve_backend(weights, backend)](weights, **kwargs)
+
+
+def export_model(weights, fmt="onnx", imgsz=None, dynamic=False, half=False):
+    """调用 ultralytics 导出模型，返回导出文件（或目录）路径。"""
+    from ultralytics import YOLO
+
+    return YOLO(weights).export(format=fmt, imgsz=imgsz or settings.MODEL_IMGSZ, dynamic=dynamic, half=half)
+
+
+def compare_backends(reference, candidate, images, iou_threshold=0.9, conf_tolerance=0.05):
+    """
+    在同一批图片上对比两个后端：每个参考检测框都要在候选结果中找到同类别、IoU 达标、置信度相近的框。
+    返回逐图结果、整体是否一致以及两者的平均耗时。
+    """
+    import numpy as np
+
+    report = {
+        "backends": {"reference": repr(reference), "candidate": repr(candidate)},
+        "images": [],
+        "match": True,
+        "latency_ms": {},
+    }
+    timings = {"reference": [], "candidate": []}
+    for index, image in enumerate(images):
+        outputs = {}
+        for role, backend in (("reference", reference), ("candidate", candidate)):
+            start = time.perf_counter()
+            outputs[role] = backend.detect(image)
+            timings[role].append((time.perf_counter() - start) * 1000)
+        ref, cand = outputs["reference"], outputs["candidate"]
+
+        matched, worst_iou, worst_conf = 0, 1.0, 0.0
+        used = set()
+        if len(ref) and len(cand):
+            ious = box_iou(ref.xyxy, cand.xyxy)
+            for i in np.argsort(-ref.confidence):
+                same_class = [j for j in range(len(cand)) if cand.class_id[j] == ref.class_id[i] and j not in used]
+                if not same_class:
+                    continue
+                j = max(same_class, key=lambda k: ious[i, k])
+                conf_diff = abs(float(ref.confidence[i]) - float(cand.confidence[j]))
+                if ious[i, j] >= iou_threshold and conf_diff <= conf_tolerance:
+                    used.add(j)
+                    matched += 1
+                    worst_iou = min(worst_iou, float(ious[i, j]))
+                    worst_conf = max(worst_conf, conf_diff)
+
+        ok = matched == len(ref) == len(cand)
+        report["match"] = report["match"] and ok
+        report["images"].append({
+            "index": index,
+            "reference": len(ref),
+            "candidate": len(cand),
+            "matched": matched,
+            "min_iou": round(worst_iou, 4),
+            "max_conf_diff": round(worst_conf, 4),
+            "ok": ok,
+        })
+
+    for role, values in timings.items():
+        # 第一张图包含首次推理开销，不计入平均耗时
+        values = values[1:] or values
+        report["latency_ms"][role] = round(sum(values) / len(values), 2) if values else 0.0
+    return report
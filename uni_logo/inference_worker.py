@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+推理工作线程：把并发到达的推理请求合并成小批次，一次前向完成后再分发结果。
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+import settings
+from model_registry import get_model
+from tiling import tiled
+
+_STOP = object()
+
+
+class BatchInferenceWorker:
+    def __init__(self, weights=None, max_batch_size=None, max_wait_ms=None):
+        self.weights = weights
+        self.max_batch_size = max_batch_size or settings.INFER_MAX_BATCH
+        self.max_wait = (settings.INFER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.images = 0
+        self.load_errors = 0
+
+    def start(self):
+        with self._lock:
+            self._ensure_thread()
+        return self
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="yolo-batch", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, image):
+        """提交一张 BGR 图像，返回 Future，结果为 sv.Detections。"""
+        future = Future()
+        # 与 _fail_pending 互斥：请求要么在清空队列之前入队并收到异常，要么由新启动的线程处理
+        with self._lock:
+            self._ensure_thread()
+            self._queue.put((image, future))
+        return future
+
+    async def infer(self, image):
+        """在事件循环中等待推理结果，不阻塞其它请求。"""
+        return await asyncio.wrap_future(self.submit(image))
+
+    async def infer_many(self, images):
+        futures = [self.submit(image) for image in images]
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in futures)))
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        # settings.TILE_MODE 默认 off；开启后网页上传的大图分块推理，检测缓存的命名空间随之区分
+        try:
+            model = tiled(get_model(self.weights))
+        except Exception as e:
+            self._fail_pending(e)
+            return
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = self._collect(first)
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                with metrics.stage("model"):
+                    results = model.predict([image for image, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.images += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _fail_pending(self, error):
+        """模型加载失败：已排队的请求立即收到该异常，线程退出；下一次 submit 会重新启动线程并重试加载。"""
+        with self._lock:
+            self._thread = None
+            self.load_errors += 1
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP and item[1].set_running_or_notify_cancel():
+                    item[1].set_exception(error)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "load_errors": self.load_errors,
+            "avg_batch_size": self.images / self.batches if self.batches else 0.0,
+            "queue_size": self._queue.qsize(),
+        }
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    """进程内共享的推理工作线程。"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = BatchInferenceWorker()
+    return _worker
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+混元回答缓存：内存 LRU + SQLite 磁盘两级缓存，键为 (学校标签, 提示词版本, 模型)。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import settings
+
+
+class LLMCache:
+    def __init__(self, path=None, ttl=None, max_size=None):
+        self.path = settings.LLM_CACHE_PATH if path is None else path
+        self.ttl = settings.LLM_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.LLM_CACHE_SIZE if max_size is None else max_size
+
+        self._memory = OrderedDict()  # key -> (写入时间, 内容)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    label TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (label, variant, model)
+                )
+                """
+            )
+            self._conn.commit()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _expired(self, created_at):
+        return time.time() - created_at > self.ttl
+
+    def get(self, key):
+        """返回缓存内容；未命中或已过期返回 None。"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT content, created_at FROM llm_cache WHERE label=? AND variant=? AND model=?",
+                    key,
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, content):
+        if not self.enabled:
+            return
+
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, content)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (label, variant, model, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (*key, content, created_at),
+                )
+                self._conn.commit()
+
+    def _remember(self, key, created_at, content):
+        self._memory[key] = (created_at, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def purge_expired(self):
+        """清理磁盘中已过期的条目，返回删除条数。"""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """进程内共享的缓存实例。"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+大模型服务接口：HunyuanProvider 调用腾讯混元，LocalProvider 是进程内的本地替身（测试与离线开发用）。
+get_provider() 返回的实例外层包了 ResilientProvider：失败按指数退避重试，上游连续失败后熔断，
+熔断期间直接报错而不再发起请求，由 hunyuan_api 立即退回本地学校资料。
+"""
+
+import json
+import random
+import threading
+import time
+
+import metrics
+import settings
+
+LLM_CALLS = metrics.REGISTRY.register(metrics.Counter(
+    "uni_logo_llm_calls_total", "大模型上游调用次数，outcome 为 ok / error / retry / rejected（熔断拒绝）",
+    ["provider", "outcome"]))
+LLM_CIRCUIT_OPEN = metrics.REGISTRY.register(metrics.Gauge(
+    "uni_logo_llm_circuit_open", "大模型熔断器是否处于打开状态", ["provider"]))
+
+
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class ConfigurationError(LLMError):
+    """缺少密钥等配置问题，重试不会成功。"""
+
+
+class LLMProvider:
+    """complete() 返回完整回答，stream() 逐段产出回答；model 同时作为回答缓存键的一部分。"""
+
+    name = ""
+
+    def __init__(self, model):
+        self.model = model
+
+    def complete(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.complete(prompt)
+
+    def is_retryable(self, error):
+        return True
+
+    def __repr__(self):
+        return f"{type(self).__name__}(model={self.model!r})"
+
+
+class HunyuanProvider(LLMProvider):
+    name = "hunyuan"
+
+    # 鉴权、参数类错误重试也不会成功
+    _FATAL_CODES = ("AuthFailure", "InvalidParameter", "UnauthorizedOperation", "MissingParameter")
+
+    def __init__(self, model=None):
+        super().__init__(model or settings.HUNYUAN_MODEL)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_credential():
+        from tencentcloud.common import credential
+
+        if settings.HUNYUAN_SECRET_ID and settings.HUNYUAN_SECRET_KEY:
+            return credential.Credential(settings.HUNYUAN_SECRET_ID, settings.HUNYUAN_SECRET_KEY)
+        try:
+            cred = credential.ProfileCredential().get_credential()
+        except Exception:
+            cred = None
+        if cred is not None:
+            return cred
+        raise ConfigurationError(
+            "未配置腾讯云密钥：请设置 TENCENTCLOUD_SECRET_ID / TENCENTCLOUD_SECRET_KEY 环境变量或 ~/.tencentcloud/credentials；"
+            "离线使用可设置 UNI_LOGO_LLM_PROVIDER=local")
+
+    def client(self):
+        """只创建一次客户端，开启 keep-alive 复用 HTTP 连接。"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # 腾讯云 SDK 较重，只在真正需要调用混元时导入
+                    from tencentcloud.common.profile.client_profile import ClientProfile
+                    from tencentcloud.common.profile.http_profile import HttpProfile
+                    from tencentcloud.hunyuan.v20230901 import hunyuan_client
+
+                    http_profile = HttpProfile(
+                        protocol=settings.HUNYUAN_PROTOCOL,
+                        endpoint=settings.HUNYUAN_ENDPOINT,
+                        reqTimeout=settings.HUNYUAN_TIMEOUT,
+                        keepAlive=True,
+                    )
+                    client_profile = ClientProfile(httpProfile=http_profile)
+                    self._client = hunyuan_client.HunyuanClient(
+                        self._load_credential(), settings.HUNYUAN_REGION, client_profile)
+        return self._client
+
+    def _build_request(self, prompt, stream=False):
+        from tencentcloud.hunyuan.v20230901 import models
+
+        req = models.ChatCompletionsRequest()
+        params = {
+            "Messages": [{"Role": "user", "Content": prompt}],
+            "Model": self.model,
+            "Temperature": settings.HUNYUAN_TEMPERATURE,
+            "Stream": stream
+        }
+        req.from_json_string(json.dumps(params))
+        return req
+
+    def complete(self, prompt):
+        resp = self.client().ChatCompletions(self._build_request(prompt))
+        return resp.Choices[0].Message.Content
+
+    def stream(self, prompt):
+        # 流式调用时 SDK 返回 SSE 事件迭代器，每个事件的 data 为一段增量回答
+        resp = self.client().ChatCompletions(self._build_request(prompt, stream=True))
+        for event in resp:
+            data = event.get("data")
+            if not data:
+                continue
+            choices = json.loads(data).get("Choices") or []
+            if not choices:
+                continue
+            delta = choices[0].get("Delta", {}).get("Content")
+            if delta:
+                yield delta
+
+    def is_retryable(self, error):
+        if isinstance(error, ConfigurationError):
+            return False
+        code = getattr(error, "code", None) or ""
+        return not code.startswith(self._FATAL_CODES)
+
+
+class LocalProvider(LLMProvider):
+    """
+    本地替身：按 fake_hunyuan 的格式生成回答，不访问网络。
+    latency：整段回答耗时；failures：前几次调用直接失败，用于测试重试与熔断。
+    """
+
+    name = "local"
+
+    def __init__(self, model="local-stand-in", latency=None, first_token_latency=None, failures=0, chunks=8):
+        super().__init__(model)
+        self.latency = settings.LOCAL_LLM_LATENCY if latency is None else latency
+        self.first_token_latency = min(self.latency, self.latency / 4 if first_token_latency is None
+                                       else first_token_latency)
+        self.failures = failures
+        self.chunks = max(1, chunks)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise LLMError("本地替身：模拟上游失败")
+
+    def complete(self, prompt):
+        from fake_hunyuan import fake_answer
+
+        self._start()
+        time.sleep(self.latency)
+        return fake_answer(prompt)
+
+    def stream(self, prompt):
+        from fake_hunyuan import fake_answer
+
+        self._start()
+        answer = fake_answer(prompt)
+        size = -(-len(answer) // self.chunks)
+        time.sleep(self.first_token_latency)
+        pause = (self.latency - self.first_token_latency) / self.chunks
+        for i in range(0, len(answer), size):
+            yield answer[i:i + size]
+            time.sleep(pause)
+
+
+class CircuitBreaker:
+    """
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内拒绝所有调用；
+    之后进入半开状态，只放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = settings.LLM_BREAKER_FAILURES if failure_threshold is None else failure_threshold
+        self.reset_timeout = settings.LLM_BREAKER_RESET if reset_timeout is None else reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class ResilientProvider(LLMProvider):
+    """为任意 provider 加上重试（指数退避 + 抖动）与熔断。"""
+
+    def __init__(self, provider, retries=None, backoff=None, breaker=None):
+        super().__init__(provider.model)
+        self.provider = provider
+        self.name = provider.name
+        self.retries = settings.LLM_RETRIES if retries is None else retries
+        self.backoff = settings.LLM_RETRY_BACKOFF if backoff is None else backoff
+        self.breaker = breaker or CircuitBreaker()
+
+    def _acquire(self):
+        if not self.breaker.allow():
+            LLM_CALLS.inc(provider=self.name, outcome="rejected")
+            raise CircuitOpenError(f"{self.name} 连续失败，已暂停调用 {self.breaker.reset_timeout:g} 秒")
+
+    def _failed(self, error, attempt):
+        """记录一次失败；返回 True 表示还可以重试。"""
+        self.breaker.record_failure()
+        LLM_CIRCUIT_OPEN.set(int(self.breaker.state == "open"), provider=self.name)
+        if attempt >= self.retries or not self.provider.is_retryable(error):
+            LLM_CALLS.inc(provider=self.name, outcome="error")
+            return False
+        LLM_CALLS.inc(provider=self.name, outcome="retry")
+        time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        return True
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        LLM_CIRCUIT_OPEN.set(0, provider=self.name)
+        LLM_CALLS.inc(provider=self.name, outcome="ok")
+
+    def complete(self, prompt):
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = self.provider.complete(prompt)
+            except Exception as e:
+                if not self._failed(e, attempt):
+                    raise
+                attempt += 1
+                continue
+            self._succeeded()
+            return result
+
+    def stream(self, prompt):
+        # 已经产出内容后再失败不能重试，否则客户端会收到重复的片段
+        attempt = 0
+        while True:
+            self._acquire()
+            started = False
+            try:
+                for delta in self.provider.stream(prompt):
+                    started = True
+                    yield delta
+            except Exception as e:
+                if not self._failed(e, self.retries if started else attempt):
+                    raise
+                attempt += 1
+                continue
+            self._succeeded()
+            return
+
+    def __repr__(self):
+        return f"ResilientProvider({self.provider!r}, retries={self.retries})"
+
+
+PROVIDERS = {
+    "hunyuan": HunyuanProvider,
+    "local": LocalProvider,
+}
+
+
+def create_provider(name=None):
+    name = (name or settings.LLM_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"未知的大模型服务：{name}（可选：{', '.join(PROVIDERS)}）")
+    return ResilientProvider(PROVIDERS[name]())
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """进程内共享的大模型服务，命令行、Web 服务与图形界面共用同一个熔断器。"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """替换进程内的大模型服务（例如测试时换成 LocalProvider），返回原来的实例。"""
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
+
+
+def reset_provider():
+    """丢弃当前实例（例如更换密钥或地址后），下次调用时按 settings 重新创建。"""
+    set_provider(None)
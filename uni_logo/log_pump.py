@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+图形界面日志：工作线程只把输出写进线程安全的 LogQueue，由 Tk 主循环定时批量取出并一次性写入日志框。
+LogQueue 对输出限速（超出部分只统计条数，界面自身的状态行不受限速），待显示的行数有上限；
+日志框只保留最近 GUI_LOG_MAX_LINES 行。
+"""
+
+import io
+import threading
+import time
+from collections import deque
+
+import settings
+
+
+class LogQueue:
+    def __init__(self, max_pending=None, rate=None):
+        self.max_pending = settings.GUI_LOG_MAX_PENDING if max_pending is None else max_pending
+        self.rate = settings.GUI_LOG_RATE if rate is None else rate
+
+        self._lines = deque()
+        self._lock = threading.Lock()
+        self._tokens = float(self.rate)
+        self._refilled_at = time.monotonic()
+        self._noted_at = 0.0
+        self.suppressed = 0  # 尚未提示的被省略行数
+        self.total_suppressed = 0
+
+    def put_line(self, line, important=False):
+        """
+        加入一整行（不含换行符），可从任意线程调用。
+        important 的行（界面的开始 / 完成 / 错误提示、任务的最后一行输出）不受限速，一定会显示。
+        """
+        with self._lock:
+            if self.rate > 0 and not important:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    self._suppress(1)
+                    return
+                self._tokens -= 1
+            if len(self._lines) >= self.max_pending:
+                self._lines.popleft()
+                self._suppress(1)
+            self._lines.append(line)
+
+    def _suppress(self, count):
+        self.suppressed += count
+        self.total_suppressed += count
+
+    def drain(self, max_lines=None):
+        """取出至多 max_lines 行；有被省略的输出时每秒最多追加一行提示。"""
+        with self._lock:
+            count = len(self._lines) if max_lines is None else min(max_lines, len(self._lines))
+            lines = [self._lines.popleft() for _ in range(count)]
+            now = time.monotonic()
+            if self.suppressed and now - self._noted_at >= 1:
+                lines.append(f"……（输出过快，已省略 {self.suppressed} 行）")
+                self.suppressed = 0
+                self._noted_at = now
+            return lines
+
+
+class QueueWriter(io.TextIOBase):
+    """替换 sys.stdout / sys.stderr：按行写入 LogQueue，回车（\\r）覆盖的进度条只保留最后的内容。"""
+
+    encoding = "utf-8"
+
+    def __init__(self, log_queue):
+        super().__init__()
+        self.log_queue = log_queue
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        try:
+            if isinstance(s, bytes):
+                s = s.decode("utf-8", errors="replace")
+            elif not isinstance(s, str):
+                s = str(s)
+        except Exception as e:
+            s = f"[日志解码失败]: {e}\n"
+
+        with self._lock:
+            *lines, self._partial = (self._partial + s).split("\n")
+        for line in lines:
+            self.log_queue.put_line(line.rsplit("\r", 1)[-1])
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def flush_partial(self):
+        """把尚未换行的内容作为一行输出，任务结束时调用。"""
+        with self._lock:
+            partial, self._partial = self._partial.rsplit("\r", 1)[-1], ""
+        if partial:
+            self.log_queue.put_line(partial, important=True)
+
+
+class TkLogPump:
+    """在 Tk 主循环中每隔 interval_ms 毫秒取出一批日志写入 Text 控件，只能在主线程创建。"""
+
+    def __init__(self, widget, log_queue, interval_ms=None, max_lines=None, batch_lines=None):
+        self.widget = widget
+        self.log_queue = log_queue
+        self.interval_ms = settings.GUI_LOG_INTERVAL_MS if interval_ms is None else interval_ms
+        self.max_lines = settings.GUI_LOG_MAX_LINES if max_lines is None else max_lines
+        self.batch_lines = settings.GUI_LOG_BATCH_LINES if batch_lines is None else batch_lines
+        self._job = None
+
+    def start(self):
+        if self._job is None:
+            self._job = self.widget.after(self.interval_ms, self._tick)
+        return self
+
+    def stop(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def _tick(self):
+        try:
+            self.pump()
+        finally:
+            self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def pump(self):
+        lines = self.log_queue.drain(self.batch_lines)
+        if not lines:
+            return
+        widget = self.widget
+        # 用户向上翻看历史时不强制滚动到底部
+        at_bottom = widget.yview()[1] >= 0.999
+        widget.insert("end", "\n".join(lines) + "\n")
+        if self.max_lines > 0:
+            excess = int(widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+            if excess > 0:
+                widget.delete("1.0", f"{excess + 1}.0")
+        if at_bottom:
+            widget.see("end")
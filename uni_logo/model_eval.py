@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+模型验证：读取 YOLO 格式数据集（data.yaml + images/labels），通过推理后端计算每个类别的 AP，
+同时统计推理耗时、内存占用和模型文件大小，用于对比 FP32 与量化模型。
+对比内存时用 evaluate_isolated() 让每个模型在单独的新进程中评估，互不影响。
+AP 的计算方式（10 个 IoU 阈值、101 点插值）与 ultralytics val 一致。
+"""
+
+import glob
+import os
+import random
+import sys
+import time
+
+from batch_images import IMAGE_EXTENSIONS
+
+
+def load_data_config(data_yaml):
+    import yaml
+
+    with open(data_yaml, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    root = config.get("path") or ""
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), root)
+    config["path"] = os.path.normpath(root)
+    return config
+
+
+def dataset_images(data_yaml, split="val"):
+    """返回数据集某个划分（train / val / test）下的全部图片路径。"""
+    config = load_data_config(data_yaml)
+    entries = config.get(split)
+    if not entries:
+        raise ValueError(f"{data_yaml} 中没有 {split} 划分")
+    if isinstance(entries, str):
+        entries = [entries]
+
+    paths = []
+    for entry in entries:
+        entry = entry if os.path.isabs(entry) else os.path.join(config["path"], entry)
+        if os.path.isdir(entry):
+            paths.extend(p for p in glob.glob(os.path.join(entry, "**", "*"), recursive=True)
+                         if p.lower().endswith(IMAGE_EXTENSIONS))
+        elif entry.endswith(".txt"):
+            with open(entry, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        paths.append(line if os.path.isabs(line) else os.path.join(config["path"], line))
+        else:
+            paths.extend(glob.glob(entry, recursive=True))
+    return sorted(dict.fromkeys(os.path.normpath(p) for p in paths))
+
+
+def sample_images(paths, count, seed=0):
+    """固定随机种子抽样，保证每次量化使用同一批校准图片。"""
+    if count <= 0 or count >= len(paths):
+        return list(paths)
+    return sorted(random.Random(seed).sample(list(paths), count))
+
+
+def label_path(image_path):
+    """images/xxx.jpg -> labels/xxx.txt（YOLO 数据集约定）。"""
+    sep = os.sep
+    parts = image_path.rsplit(f"{sep}images{sep}", 1)
+    if len(parts) == 2:
+        image_path = f"{parts[0]}{sep}labels{sep}{parts[1]}"
+    return os.path.splitext(image_path)[0] + ".txt"
+
+
+def load_labels(image_path, width, height):
+    """读取标注，返回 (类别 id 数组, xyxy 像素坐标数组)；没有标注文件视为无目标。"""
+    import numpy as np
+
+    rows = []
+    path = label_path(image_path)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            rows = [line.split() for line in f if line.strip()]
+    if not rows:
+        return np.zeros(0, dtype=int), np.zeros((0, 4), dtype=np.float32)
+    data = np.array([[float(v) for v in row[:5]] for row in rows], dtype=np.float32)
+    cx, cy, w, h = data[:, 1] * width, data[:, 2] * height, data[:, 3] * width, data[:, 4] * height
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return data[:, 0].astype(int), xyxy
+
+
+IOU_THRESHOLDS = (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+
+def match_predictions(pred_classes, true_classes, iou):
+    """iou: 标注数 x 预测数。返回 预测数 x 10 的布尔矩阵，表示每个预测在各 IoU 阈值下是否为 TP。"""
+    import numpy as np
+
+    correct = np.zeros((len(pred_classes), len(IOU_THRESHOLDS)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for k, threshold in enumerate(IOU_THRESHOLDS):
+        matches = np.array(np.nonzero(iou >= threshold)).T
+        if matches.shape[0]:
+            if matches.shape[0] > 1:
+                # 按 IoU 从高到低，每个预测、每个标注只匹配一次
+                matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+            correct[matches[:, 1], k] = True
+    return correct
+
+
+def compute_ap(recall, precision):
+    import numpy as np
+
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    trapezoid = getattr(np, "trapezoid", None) or np.trapz
+    return float(trapezoid(np.interp(x, mrec, mpre), x))
+
+
+def ap_per_class(tp, confidence, pred_classes, true_classes):
+    """返回 {类别 id: {"ap50", "ap50_95", "instances"}}，只统计在标注中出现过的类别。"""
+    import numpy as np
+
+    order = np.argsort(-confidence)
+    tp, pred_classes = tp[order], pred_classes[order]
+    result = {}
+    for c in np.unique(true_classes):
+        selected = pred_classes == c
+        instances = int((true_classes == c).sum())
+        ap = np.zeros(len(IOU_THRESHOLDS))
+        if selected.any():
+            tpc = tp[selected].cumsum(0)
+            fpc = (1 - tp[selected]).cumsum(0)
+            recall = tpc / (instances + 1e-16)
+            precision = tpc / (tpc + fpc)
+            ap = np.array([compute_ap(recall[:, k], precision[:, k]) for k in range(len(IOU_THRESHOLDS))])
+        result[int(c)] = {"ap50": float(ap[0]), "ap50_95": float(ap.mean()), "instances": instances}
+    return result
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回 None。"""
+    try:
+        import resource
+    except ImportError:  # Windows 没有 resource 模块
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1e6
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的单位为 KB，macOS 为字节
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def model_size_mb(weights):
+    if os.path.isdir(weights):
+        return sum(os.path.getsize(p) for p in glob.glob(os.path.join(weights, "*"))) / 1e6
+    return os.path.getsize(weights) / 1e6 if os.path.exists(weights) else None
+
+
+def evaluate(weights, image_paths, backend=None, conf=0.001, latency_images=50):
+    """
+    加载 weights 并在 image_paths 上计算每个类别的 AP、平均耗时和峰值内存增量。
+    验证时使用很低的置信度阈值（与 ultralytics val 相同），耗时则按正常阈值单独测量。
+    峰值内存只在新进程中才有意义，对比多个模型时请用 evaluate_isolated()。
+    """
+    import cv2
+    import numpy as np
+    from inference_backend import box_iou, load_backend
+
+    peak_before = _peak_rss_mb()
+    model = load_backend(weights, backend)
+    normal_conf = model.conf
+    model.conf = conf
+
+    tp, confidence, pred_classes, true_classes = [], [], [], []
+    images = []
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        classes, boxes = load_labels(path, width, height)
+        detections = model.detect(image)
+        iou = box_iou(boxes, detections.xyxy) if len(boxes) and len(detections) \
+            else np.zeros((len(boxes), len(detections)))
+        tp.append(match_predictions(detections.class_id, classes, iou))
+        confidence.append(detections.confidence)
+        pred_classes.append(detections.class_id)
+        true_classes.append(classes)
+        if len(images) < latency_images:
+            images.append(image)
+
+    model.conf = normal_conf
+    latencies = []
+    for i, image in enumerate(images):
+        start = time.perf_counter()
+        model.detect(image)
+        if i > 0:  # 第一张包含首次推理的初始化开销
+            latencies.append((time.perf_counter() - start) * 1000)
+    peak_after = _peak_rss_mb()
+
+    per_class = {}
+    if tp:
+        per_class = ap_per_class(np.concatenate(tp), np.concatenate(confidence),
+                                 np.concatenate(pred_classes), np.concatenate(true_classes))
+    latencies.sort()
+    size = model_size_mb(weights)
+    return {
+        "weights": weights,
+        "backend": model.name,
+        "names": model.names,
+        "images": len(tp),
+        "per_class": per_class,
+        "map50": float(np.mean([v["ap50"] for v in per_class.values()])) if per_class else 0.0,
+        "map50_95": float(np.mean([v["ap50_95"] for v in per_class.values()])) if per_class else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "p95": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+        },
+        # 加载模型并完成验证后，进程峰值内存比加载前增加的部分
+        "memory_mb": round(peak_after - peak_before, 1) if peak_before is not None else None,
+        "peak_rss_mb": round(peak_after, 1) if peak_after is not None else None,
+        "model_size_mb": round(size, 2) if size is not None else None,
+    }
+
+
+def evaluate_isolated(weights, image_paths, **kwargs):
+    """在新启动（spawn）的子进程中运行 evaluate()，内存数据不受当前进程已加载的模型与缓存影响。"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(evaluate, weights, image_paths, **kwargs).result()
+
+
+def compare_reports(reference, candidate, school_names=None):
+    """按类别对比两份 evaluate() 结果，返回逐类别的 AP 与差值。"""
+    school_names = school_names or {}
+    rows = []
+    for class_id, ref in sorted(reference["per_class"].items()):
+        cand = candidate["per_class"].get(class_id, {"ap50": 0.0, "ap50_95": 0.0})
+        label = reference["names"].get(class_id, str(class_id))
+        rows.append({
+            "class_id": class_id,
+            "label": label,
+            "school_name": school_names.get(label, ""),
+            "instances": ref["instances"],
+            "ap50": [round(ref["ap50"], 4), round(cand["ap50"], 4)],
+            "ap50_95": [round(ref["ap50_95"], 4), round(cand["ap50_95"], 4)],
+            "ap50_drop": round(ref["ap50"] - cand["ap50"], 4),
+        })
+    return rows
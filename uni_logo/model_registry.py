@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+YOLO 模型注册表：同一权重文件在进程内只加载一次，首次使用时才加载，并做预热推理。
+返回的是 inference_backend 中的推理后端（PyTorch / ONNX Runtime / OpenVINO），接口一致。
+"""
+
+import contextlib
+import threading
+import time
+
+import settings
+from inference_backend import load_backend, resolve_backend
+
+
+def active_weights():
+    """当前运行精度对应的权重：UNI_LOGO_MODEL_PRECISION=int8 时使用量化模型。"""
+    if settings.MODEL_PRECISION == "int8":
+        return settings.MODEL_INT8_WEIGHTS
+    return settings.MODEL_WEIGHTS
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def get(self, weights=None, backend=None, warmup_runs=None):
+        weights = weights or active_weights()
+        key = (weights, resolve_backend(weights, backend))
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key, settings.MODEL_WARMUP_RUNS if warmup_runs is None else warmup_runs)
+                self._models[key] = model
+        return model
+
+    def _load(self, key, warmup_runs):
+        import numpy as np
+
+        weights, backend = key
+        start = time.perf_counter()
+        model = load_backend(weights, backend)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if warmup_runs > 0:
+            dummy = np.zeros((settings.MODEL_IMGSZ, settings.MODEL_IMGSZ, 3), dtype=np.uint8)
+            for _ in range(warmup_runs):
+                model.detect(dummy)
+        warmup_seconds = time.perf_counter() - start
+
+        self._timings[weights] = {
+            "backend": backend,
+            "load_seconds": load_seconds,
+            "warmup_seconds": warmup_seconds,
+            "warmup_runs": warmup_runs,
+        }
+        print(f"模型已加载：{weights}（{backend}，加载 {load_seconds:.2f}s，预热 {warmup_runs} 次 {warmup_seconds:.2f}s）")
+        return model
+
+    @contextlib.contextmanager
+    def override(self, model, weights=None, backend=None):
+        """在 with 块内用 model 代替 weights 对应的模型，例如基准测试注入带固定检测结果的模型。"""
+        weights = weights or active_weights()
+        key = (weights, resolve_backend(weights, backend))
+        with self._lock:
+            previous = self._models.get(key)
+            self._models[key] = model
+        try:
+            yield model
+        finally:
+            with self._lock:
+                if previous is None:
+                    self._models.pop(key, None)
+                else:
+                    self._models[key] = previous
+
+    def is_loaded(self, weights=None, backend=None):
+        weights = weights or active_weights()
+        return (weights, resolve_backend(weights, backend)) in self._models
+
+    def timings(self):
+        return dict(self._timings)
+
+
+registry = ModelRegistry()
+
+
+def get_model(weights=None, backend=None):
+    return registry.get(weights, backend)
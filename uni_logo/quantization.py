@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+INT8 量化：从训练集抽取校准图片，生成 ONNX Runtime 静态 / 动态量化模型，或借助 ultralytics 导出 OpenVINO INT8 模型。
+量化模型与其它导出模型一样通过 inference_backend 加载，设置 UNI_LOGO_MODEL_PRECISION=int8 即可在运行时切换。
+"""
+
+import os
+
+import settings
+
+QUANT_METHODS = ("static", "dynamic", "openvino")
+
+
+class CalibrationReader:
+    """onnxruntime.quantization 的校准数据读取器：逐张读取图片，按导出模型的前处理生成输入。"""
+
+    def __init__(self, backend, image_paths):
+        self.backend = backend
+        self.image_paths = list(image_paths)
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        import cv2
+
+        for path in self._iter:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            batch, _ = self.backend.preprocess([image])
+            return {self.backend.input_name: batch}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def default_output(weights, method):
+    stem = os.path.splitext(weights.rstrip("/\\"))[0]
+    return f"{stem}_int8_openvino_model" if method == "openvino" else f"{stem}_int8.onnx"
+
+
+def quantize_model(weights, data_yaml, method="static", output=None, calib_images=200, imgsz=None, seed=0,
+                   progress=print):
+    """
+    量化 weights（.pt 会先导出为 FP32 ONNX），返回量化模型路径。
+    static：用训练集图片校准激活值范围（QDQ，按通道量化权重），精度最好；
+    dynamic：只量化权重，不需要校准，但卷积层收益有限；
+    openvino：交给 ultralytics + NNCF 做训练后量化，输出 OpenVINO INT8 模型。
+    """
+    from inference_backend import OnnxBackend, export_model
+    from model_eval import dataset_images, sample_images
+
+    if method not in QUANT_METHODS:
+        raise ValueError(f"未知的量化方式：{method}（可选：{', '.join(QUANT_METHODS)}）")
+    output = output or default_output(weights, method)
+    imgsz = imgsz or settings.MODEL_IMGSZ
+
+    if method == "openvino":
+        from ultralytics import YOLO
+
+        images = dataset_images(data_yaml, "train")
+        fraction = min(1.0, calib_images / len(images)) if images else 1.0
+        progress(f"OpenVINO INT8 量化：校准图片约 {int(len(images) * fraction)} 张")
+        path = YOLO(weights).export(format="openvino", int8=True, data=data_yaml, fraction=fraction, imgsz=imgsz)
+        if os.path.abspath(path) != os.path.abspath(output):
+            if os.path.exists(output):
+                import shutil
+                shutil.rmtree(output)
+            os.replace(path, output)
+        return output
+
+    fp32 = weights
+    if not weights.lower().endswith(".onnx"):
+        # 静态量化要求固定输入尺寸，导出时不使用 dynamic
+        progress(f"导出 FP32 ONNX 模型：{weights}")
+        fp32 = str(export_model(weights, fmt="onnx", imgsz=imgsz))
+
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if method == "dynamic":
+        progress("动态量化（仅权重）...")
+        quantize_dynamic(fp32, output, weight_type=QuantType.QInt8)
+        return output
+
+    calibration = sample_images(dataset_images(data_yaml, "train"), calib_images, seed)
+    if not calibration:
+        raise ValueError("训练集中没有可用于校准的图片")
+    progress(f"静态量化：使用 {len(calibration)} 张训练图片校准...")
+
+    source = fp32
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        # 量化前做常量折叠与形状推断，量化结果更稳定
+        source = os.path.splitext(fp32)[0] + "_prep.onnx"
+        quant_pre_process(fp32, source, skip_symbolic_shape=True)
+    except Exception as e:
+        progress(f"跳过量化预处理：{e}")
+        source = fp32
+
+    reader = CalibrationReader(OnnxBackend(fp32, imgsz=imgsz), calibration)
+    try:
+        quantize_static(source, output, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    finally:
+        if source != fp32 and os.path.exists(source):
+            os.remove(source)
+    return output
+
+
+def quantization_report(reference, candidate, data_yaml, split="val", limit=0, progress=print):
+    """在验证集上对比 FP32 与 INT8 模型：每个学校的 AP、整体 mAP、推理耗时、内存与模型大小。"""
+    from model_eval import compare_reports, dataset_images, evaluate_isolated, sample_images
+    from zidian_uni import LABEL_TO_SCHOOL_NAME
+
+    images = sample_images(dataset_images(data_yaml, split), limit)
+    progress(f"验证集 {split}：{len(images)} 张图片")
+    progress(f"评估 FP32 模型：{reference}")
+    # 两个模型各自在新进程中评估，内存数据才可比
+    fp32 = evaluate_isolated(reference, images)
+    progress(f"评估 INT8 模型：{candidate}")
+    int8 = evaluate_isolated(candidate, images)
+
+    summary = {}
+    for key in ("map50", "map50_95"):
+        summary[key] = [round(fp32[key], 4), round(int8[key], 4)]
+    for key in ("latency_ms", "memory_mb", "peak_rss_mb", "model_size_mb", "backend", "weights"):
+        summary[key] = [fp32[key], int8[key]]
+    mean_fp32, mean_int8 = fp32["latency_ms"]["mean"], int8["latency_ms"]["mean"]
+    summary["speedup"] = round(mean_fp32 / mean_int8, 2) if mean_fp32 and mean_int8 else None
+
+    return {
+        "split": split,
+        "images": len(images),
+        "summary": summary,
+        "per_class": compare_reports(fp32, int8, LABEL_TO_SCHOOL_NAME),
+    }
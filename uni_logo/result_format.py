@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+检测结果的 JSON 表示，Web 接口与批量命令共用。
+"""
+
+from zidian_uni import LABEL_TO_SCHOOL_NAME
+
+
+def detections_to_json(detections, names):
+    items = []
+    for i in range(len(detections)):
+        class_id = int(detections.class_id[i])
+        school_label = names[class_id]
+        items.append({
+            "box": [round(float(v), 2) for v in detections.xyxy[i]],
+            "class_id": class_id,
+            "label": school_label,
+            "confidence": round(float(detections.confidence[i]), 4),
+            "school_name": LABEL_TO_SCHOOL_NAME.get(school_label.lower(), school_label),
+        })
+    return items
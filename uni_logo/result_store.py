@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+标注结果图片的内存存储：以内容 SHA-256 为键，按条数和总字节数做 LRU 淘汰。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import settings
+
+
+class ResultStore:
+    def __init__(self, max_items=None, max_bytes=None):
+        self.max_items = max_items or settings.RESULT_STORE_SIZE
+        self.max_bytes = max_bytes or settings.RESULT_STORE_BYTES
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes):
+        """保存图片字节，返回内容摘要；相同内容只存一份。"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                return digest
+            self._items[digest] = data
+            self._bytes += len(data)
+            while self._items and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+        return digest
+
+    def get(self, digest):
+        with self._lock:
+            data = self._items.get(digest)
+            if data is not None:
+                self._items.move_to_end(digest)
+            return data
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {"items": len(self._items), "bytes": self._bytes}
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+画面变化门控：在缩小的灰度图上与上次检测时的画面做差，画面基本不变时跳过 YOLO 推理。
+检查过的帧数按结果计入 uni_logo_scene_gate_frames_total，与 stats() 中的 checked / skipped 一致。
+"""
+
+import metrics
+import settings
+
+SCENE_GATE_FRAMES = metrics.REGISTRY.register(metrics.Counter(
+    "uni_logo_scene_gate_frames_total", "画面变化门控检查的帧数，result 为 inferred（检测）/ skipped（跳过）",
+    ["result"]))
+
+
+class SceneChangeGate:
+    def __init__(self, threshold=None, max_interval=None, size=(64, 36)):
+        self.threshold = settings.SCENE_CHANGE_THRESHOLD if threshold is None else threshold
+        self.max_interval = settings.SCENE_MAX_INTERVAL if max_interval is None else max_interval
+        self.size = size
+
+        self._reference = None  # 上次检测时的缩略灰度图
+        self._reference_index = None
+        self.last_score = 0.0
+
+        self.checked = 0
+        self.passed = 0
+
+    def _thumbnail(self, frame):
+        import cv2
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+
+    def should_infer(self, frame, frame_index):
+        """画面变化超过阈值、距上次检测超过 max_interval 帧或尚无参考画面时返回 True。"""
+        import cv2
+
+        self.checked += 1
+        thumbnail = self._thumbnail(frame)
+
+        if self._reference is None or frame_index - self._reference_index >= self.max_interval:
+            changed = True
+            self.last_score = 1.0
+        else:
+            self.last_score = float(cv2.absdiff(thumbnail, self._reference).mean()) / 255.0
+            changed = self.last_score > self.threshold
+
+        if changed:
+            self._reference = thumbnail
+            self._reference_index = frame_index
+            self.passed += 1
+        SCENE_GATE_FRAMES.inc(result="inferred" if changed else "skipped")
+        return changed
+
+    def reset(self):
+        self._reference = None
+        self._reference_index = None
+
+    def stats(self):
+        skipped = self.checked - self.passed
+        return {
+            "checked": self.checked,
+            "inferred": self.passed,
+            "skipped": skipped,
+            "skip_rate": skipped / self.checked if self.checked else 0.0,
+        }
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+学校知识库：把混元按固定格式返回的回答解析为结构化记录（学校名 / 国家 / QS 排名 / 软科排名 / 官网链接 + 其余介绍），
+按 zidian_uni.LABEL_TO_SCHOOL_NAME 中的标签保存在本地 JSON 文件中。
+prefetch 命令提前为所有已知类别生成记录，Web 服务在后台按 SCHOOL_KB_MAX_AGE_DAYS 定期刷新过期记录；
+检测请求直接读取知识库，热路径上不调用大模型，只有知识库中没有的标签才退回带时间预算的混元查询。
+"""
+
+import html
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+
+import metrics
+import settings
+from zidian_uni import LABEL_TO_SCHOOL_NAME
+
+# 知识库统一使用 web 版提示词的回答（内容包含 cli 版的全部要求）
+KB_VARIANT = "web"
+
+KB_LOOKUPS = metrics.REGISTRY.register(metrics.Counter(
+    "uni_logo_school_kb_lookups_total", "学校知识库查询次数，result 为 hit / miss", ["result"]))
+KB_RECORDS = metrics.REGISTRY.register(metrics.Gauge(
+    "uni_logo_school_kb_records", "学校知识库中的记录数"))
+
+
+@dataclass
+class SchoolRecord:
+    label: str
+    name: str
+    country: str = ""
+    qs_rank: str = ""
+    arwu_rank: str = ""  # 软科排名
+    website: str = ""
+    details: str = ""  # 固定字段之外的介绍、奖项、校友、分数线与评价
+    model: str = ""
+    fetched_at: float = 0.0
+    source: str = "llm"  # llm：大模型回答；fallback：大模型不可用时的本地资料
+
+    def text(self):
+        """按提示词要求的格式还原为纯文本，供命令行与图形界面显示。"""
+        lines = [
+            f"学校名：{self.name}",
+            f"国家：{self.country or '未知'}",
+            f"QS排名：{self.qs_rank or '无'}",
+            f"软科排名：{self.arwu_rank or '无'}",
+            f"官网链接：{self.website or '无'}",
+        ]
+        if self.details:
+            lines += ["", self.details]
+        return "\n".join(lines)
+
+    __str__ = text
+
+    def to_json(self):
+        return {
+            "label": self.label,
+            "name": self.name,
+            "country": self.country,
+            "qs_rank": self.qs_rank,
+            "arwu_rank": self.arwu_rank,
+            "website": self.website,
+            "details": self.details,
+            "source": self.source,
+            "fetched_at": self.fetched_at,
+        }
+
+    def html(self):
+        esc = html.escape
+        website = self.website
+        link = f"<a href='{esc(website)}' target='_blank' rel='noopener'>{esc(website)}</a>" \
+            if website.startswith(("http://", "https://")) else esc(website or "无")
+        rows = [
+            ("学校名", esc(self.name)),
+            ("国家", esc(self.country or "未知")),
+            ("QS 排名", esc(self.qs_rank or "无")),
+            ("软科排名", esc(self.arwu_rank or "无")),
+            ("官网", link),
+        ]
+        table = "".join(f"<tr><th>{k}</th><td>{v}</td></tr>" for k, v in rows)
+        details = f"<pre>{esc(self.details)}</pre>" if self.details else ""
+        return f"<table class='school-info'>{table}</table>{details}"
+
+
+# 回答中的字段名 -> SchoolRecord 属性；模型偶尔会用提示词里的长名称
+_FIELDS = {
+    "学校名": "name",
+    "学校名（中文）": "name",
+    "国家": "country",
+    "所属国家": "country",
+    "QS排名": "qs_rank",
+    "QS世界大学排名": "qs_rank",
+    "软科排名": "arwu_rank",
+    "软科大学排名": "arwu_rank",
+    "官网链接": "website",
+    "官网": "website",
+}
+_FIELD_LINE = re.compile(r"^[\s\-*#>]*(?:\*\*)?\s*([^:：*]{1,12}?)\s*(?:\*\*)?\s*[:：]\s*(?:\*\*)?\s*(.*?)\s*(?:\*\*)?\s*$")
+_EMPTY_VALUES = ("", "无", "暂无", "未知", "...", "—", "-")
+
+
+def parse_reply(label, text, model=""):
+    """把混元回答解析为 SchoolRecord；固定字段各取第一次出现的值，其余行原样保留在 details 中。"""
+    values = {}
+    details = []
+    for line in text.strip().splitlines():
+        match = _FIELD_LINE.match(line)
+        key = match.group(1).replace(" ", "") if match else None
+        attr = _FIELDS.get(key)
+        if attr is not None and attr not in values:
+            value = match.group(2).strip()
+            values[attr] = "" if value in _EMPTY_VALUES else value
+            continue
+        details.append(line.rstrip())
+    website = re.search(r"https?://[^\s)）\]】>\"']+", values.get("website", ""))
+    if website:
+        values["website"] = website.group(0)
+    return SchoolRecord(
+        label=label.lower(),
+        name=values.get("name") or LABEL_TO_SCHOOL_NAME.get(label.lower(), label),
+        details="\n".join(details).strip(),
+        model=model,
+        fetched_at=time.time(),
+        **{k: v for k, v in values.items() if k != "name"},
+    )
+
+
+def fallback_record(label, text=""):
+    """大模型不可用时的记录：学校名来自 LABEL_TO_SCHOOL_NAME，不写入知识库。"""
+    return SchoolRecord(label=label.lower(), name=LABEL_TO_SCHOOL_NAME.get(label.lower(), label),
+                        details=text, source="fallback")
+
+
+class KnowledgeBase:
+    def __init__(self, path=None):
+        self.path = settings.SCHOOL_KB_PATH if path is None else path
+        self._records = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        names = {field.name for field in fields(SchoolRecord)}
+        with self._lock:
+            self._records = {
+                label: SchoolRecord(**{k: v for k, v in record.items() if k in names})
+                for label, record in data.get("schools", {}).items()
+            }
+            count = len(self._records)
+        KB_RECORDS.set(count)
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"version": 1, "schools": {label: asdict(r) for label, r in sorted(self._records.items())}}
+        # 先写临时文件再替换，服务读取时不会看到写了一半的文件
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp, self.path)
+
+    def get(self, label):
+        with self._lock:
+            return self._records.get(label.lower())
+
+    def put(self, record, save=True):
+        with self._lock:
+            self._records[record.label] = record
+            count = len(self._records)
+        KB_RECORDS.set(count)
+        if save:
+            self.save()
+
+    def records(self):
+        with self._lock:
+            return dict(self._records)
+
+    def stale_labels(self, labels=None, max_age=None):
+        """返回缺少记录或记录早于 max_age 秒的标签（默认 settings.SCHOOL_KB_MAX_AGE_DAYS）。"""
+        labels = LABEL_TO_SCHOOL_NAME if labels is None else labels
+        max_age = settings.SCHOOL_KB_MAX_AGE_DAYS * 86400 if max_age is None else max_age
+        now = time.time()
+        stale = []
+        for label in labels:
+            record = self.get(label)
+            if record is None or (max_age > 0 and now - record.fetched_at > max_age):
+                stale.append(label.lower())
+        return stale
+
+
+_kb = None
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """进程内共享的学校知识库。"""
+    global _kb
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = KnowledgeBase()
+    return _kb
+
+
+def fetch_record(label):
+    """直接向大模型查询（不经过回答缓存，不设时间预算）并解析为记录。"""
+    import hunyuan_api
+    from llm_provider import get_provider
+
+    provider = get_provider()
+    with metrics.stage("hunyuan"):
+        text = provider.complete(hunyuan_api.build_prompt(label, KB_VARIANT))
+    return parse_reply(label, text, provider.model)
+
+
+def prefetch(labels=None, force=False, progress=print):
+    """
+    为 labels（默认全部已知类别）中缺少或过期的标签生成记录；force 时全部重新生成。
+    返回 {"updated": [...], "failed": {标签: 错误}, "skipped": 数量}。
+    """
+    import hunyuan_api
+
+    kb = get_knowledge_base()
+    labels = [label.lower() for label in (LABEL_TO_SCHOOL_NAME if labels is None else labels)]
+    todo = labels if force else kb.stale_labels(labels)
+    stats = {"updated": [], "failed": {}, "skipped": len(labels) - len(todo)}
+    if not todo:
+        return stats
+
+    progress(f"生成学校资料：{len(todo)} 所（跳过 {stats['skipped']} 所未过期的记录）")
+    futures = {label: hunyuan_api.get_executor().submit(fetch_record, label) for label in todo}
+    for label, future in futures.items():
+        try:
+            record = future.result()
+        except Exception as e:
+            stats["failed"][label] = str(e)
+            progress(f"  ⚠️ {label}：{e}")
+            continue
+        kb.put(record, save=False)
+        stats["updated"].append(label)
+        progress(f"  ✅ {label}：{record.name}")
+    kb.save()
+    return stats
+
+
+def lookup_many(school_labels, variant=KB_VARIANT, budget=None):
+    """
+    返回 {标签: SchoolRecord}，顺序与首次出现一致。知识库命中时不调用大模型；
+    未收录的标签走带时间预算的混元查询，拿到的完整回答在 variant 为 KB_VARIANT 时同时写入知识库
+    （其它提示词的回答格式不同，只返回不保存）。
+    """
+    import hunyuan_api
+
+    kb = get_knowledge_base()
+    unique_labels = list(dict.fromkeys(school_labels))
+    results, missing = {}, []
+    for label in unique_labels:
+        record = kb.get(label)
+        if record is not None:
+            results[label] = record
+        else:
+            missing.append(label)
+    KB_LOOKUPS.inc(len(results), result="hit")
+
+    if missing:
+        KB_LOOKUPS.inc(len(missing), result="miss")
+        model = hunyuan_api.get_provider().model
+        for label, answer in hunyuan_api.ask_hunyuan_many(missing, variant, budget).items():
+            if isinstance(answer, hunyuan_api.FallbackAnswer):
+                results[label] = fallback_record(label, answer.note)
+            else:
+                results[label] = parse_reply(label, answer, model)
+                if variant == KB_VARIANT:
+                    kb.put(results[label])
+    return {label: results[label] for label in unique_labels}
+
+
+def lookup(school_label, variant=KB_VARIANT, budget=None):
+    return lookup_many([school_label], variant, budget)[school_label]
+
+
+def stream_lookup(school_label, variant=KB_VARIANT, budget=None):
+    """
+    流式版本：先逐段产出回答文本，最后产出对应的 SchoolRecord。
+    知识库命中时一次性产出全文；未收录的标签流式查询混元，variant 为 KB_VARIANT 时完整回答写入知识库。
+    """
+    import hunyuan_api
+
+    kb = get_knowledge_base()
+    record = kb.get(school_label)
+    if record is not None:
+        KB_LOOKUPS.inc(result="hit")
+        yield record.text()
+        yield record
+        return
+
+    KB_LOOKUPS.inc(result="miss")
+    model = hunyuan_api.get_provider().model
+    parts = []
+    for delta in hunyuan_api.stream_hunyuan(school_label, variant, budget):
+        if isinstance(delta, hunyuan_api.FallbackAnswer):
+            yield delta
+            yield fallback_record(school_label, delta.note)
+            return
+        parts.append(delta)
+        yield delta
+    record = parse_reply(school_label, "".join(parts), model)
+    if variant == KB_VARIANT:
+        kb.put(record)
+    yield record
+
+
+class RefreshScheduler:
+    """后台线程：启动时补齐缺失的记录，之后每隔 interval 秒刷新过期记录，不占用请求线程。"""
+
+    def __init__(self, interval=None, progress=print):
+        self.interval = settings.SCHOOL_KB_REFRESH_HOURS * 3600 if interval is None else interval
+        self.progress = progress
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="school-kb-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                stats = prefetch(progress=lambda message: None)
+                if stats["updated"] or stats["failed"]:
+                    self.progress(f"学校知识库已刷新：更新 {len(stats['updated'])} 所，失败 {len(stats['failed'])} 所")
+            except Exception as e:
+                self.progress(f"⚠️ 学校知识库刷新失败：{e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+项目运行参数，统一从环境变量读取，未设置时使用默认值。
+"""
+
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# ---------------- 混元大模型 ----------------
+# 密钥优先读取环境变量，其次读取 ~/.tencentcloud/credentials
+HUNYUAN_SECRET_ID = os.environ.get("TENCENTCLOUD_SECRET_ID", "")
+HUNYUAN_SECRET_KEY = os.environ.get("TENCENTCLOUD_SECRET_KEY", "")
+HUNYUAN_REGION = os.environ.get("UNI_LOGO_HUNYUAN_REGION", "ap-guangzhou")
+HUNYUAN_ENDPOINT = os.environ.get("UNI_LOGO_HUNYUAN_ENDPOINT", "hunyuan.tencentcloudapi.com")
+# 请求协议，本地替身服务可设为 http
+HUNYUAN_PROTOCOL = os.environ.get("UNI_LOGO_HUNYUAN_PROTOCOL", "https")
+# 单次请求超时（秒）
+HUNYUAN_TIMEOUT = _env_int("UNI_LOGO_HUNYUAN_TIMEOUT", 60)
+HUNYUAN_MODEL = os.environ.get("UNI_LOGO_HUNYUAN_MODEL", "hunyuan-pro")
+HUNYUAN_TEMPERATURE = _env_float("UNI_LOGO_HUNYUAN_TEMPERATURE", 0.7)
+# 并发查询混元的最大线程数（混元默认账号并发上限为 5 路）
+LLM_MAX_WORKERS = _env_int("UNI_LOGO_LLM_MAX_WORKERS", 5)
+
+# ---------------- 大模型服务 ----------------
+# hunyuan：腾讯混元；local：本地替身，不访问网络，用于测试与离线开发
+LLM_PROVIDER = os.environ.get("UNI_LOGO_LLM_PROVIDER", "hunyuan").lower()
+# 单次查询的时间预算（秒），超出后立即返回本地学校资料，回答在后台生成完毕后写入缓存；0 表示一直等待
+LLM_BUDGET = _env_float("UNI_LOGO_LLM_BUDGET", 20)
+# 流式查询等待首段回答的时间预算（秒）
+LLM_STREAM_BUDGET = _env_float("UNI_LOGO_LLM_STREAM_BUDGET", 5)
+# 失败重试次数与首次重试前的等待秒数（之后每次翻倍）
+LLM_RETRIES = _env_int("UNI_LOGO_LLM_RETRIES", 2)
+LLM_RETRY_BACKOFF = _env_float("UNI_LOGO_LLM_RETRY_BACKOFF", 0.5)
+# 连续失败多少次后熔断，以及熔断持续的秒数；失败次数设为 0 关闭熔断
+LLM_BREAKER_FAILURES = _env_int("UNI_LOGO_LLM_BREAKER_FAILURES", 5)
+LLM_BREAKER_RESET = _env_float("UNI_LOGO_LLM_BREAKER_RESET", 30)
+# 本地替身生成一条回答的耗时（秒）
+LOCAL_LLM_LATENCY = _env_float("UNI_LOGO_LOCAL_LLM_LATENCY", 0.2)
+
+# ---------------- 混元结果缓存 ----------------
+# 缓存有效期（秒），默认 7 天；设为 0 表示关闭缓存
+LLM_CACHE_TTL = _env_int("UNI_LOGO_LLM_CACHE_TTL", 7 * 24 * 3600)
+# 内存 LRU 容量（条）
+LLM_CACHE_SIZE = _env_int("UNI_LOGO_LLM_CACHE_SIZE", 256)
+# 磁盘缓存（SQLite）路径，设为空字符串则只使用内存缓存
+LLM_CACHE_PATH = os.environ.get("UNI_LOGO_LLM_CACHE_PATH", "./cache/llm_cache.sqlite3")
+
+# ---------------- 学校知识库 ----------------
+# 结构化学校资料（JSON），由 prefetch 命令生成；设为空字符串则只保存在内存中
+SCHOOL_KB_PATH = os.environ.get("UNI_LOGO_SCHOOL_KB_PATH", "./data/school_kb.json")
+# 记录超过多少天视为过期，由 prefetch 或 Web 服务的后台刷新重新生成；0 表示永不过期
+SCHOOL_KB_MAX_AGE_DAYS = _env_float("UNI_LOGO_SCHOOL_KB_MAX_AGE_DAYS", 30)
+# Web 服务后台检查缺失 / 过期记录的间隔（小时），启动时先检查一次；0 表示关闭后台刷新
+SCHOOL_KB_REFRESH_HOURS = _env_float("UNI_LOGO_SCHOOL_KB_REFRESH_HOURS", 24)
+
+# ---------------- YOLO 模型 ----------------
+MODEL_WEIGHTS = os.environ.get("UNI_LOGO_MODEL_WEIGHTS", "./runs/train/school_logo_yolov124/weights/best.pt")
+# 推理输入尺寸，与训练时的 imgsz 保持一致
+MODEL_IMGSZ = _env_int("UNI_LOGO_MODEL_IMGSZ", 640)
+# 模型加载后的预热推理次数，设为 0 关闭预热
+MODEL_WARMUP_RUNS = _env_int("UNI_LOGO_MODEL_WARMUP_RUNS", 1)
+# 运行精度：fp32 使用 MODEL_WEIGHTS，int8 使用 quantize 命令生成的 MODEL_INT8_WEIGHTS
+MODEL_PRECISION = os.environ.get("UNI_LOGO_MODEL_PRECISION", "fp32").lower()
+MODEL_INT8_WEIGHTS = os.environ.get("UNI_LOGO_MODEL_INT8_WEIGHTS", os.path.splitext(MODEL_WEIGHTS)[0] + "_int8.onnx")
+# 推理后端：auto（按权重扩展名选择）、torch、onnx、openvino
+MODEL_BACKEND = os.environ.get("UNI_LOGO_MODEL_BACKEND", "auto")
+# 置信度阈值、NMS IoU 阈值、单图最多检测框数（与 ultralytics 默认值一致）
+MODEL_CONF = _env_float("UNI_LOGO_MODEL_CONF", 0.25)
+MODEL_IOU = _env_float("UNI_LOGO_MODEL_IOU", 0.7)
+MODEL_MAX_DET = _env_int("UNI_LOGO_MODEL_MAX_DET", 300)
+# ONNX Runtime 单次推理使用的线程数，0 表示由 onnxruntime 自动决定
+ONNX_THREADS = _env_int("UNI_LOGO_ONNX_THREADS", 0)
+# OpenVINO 推理设备，如 CPU、GPU、AUTO
+OPENVINO_DEVICE = os.environ.get("UNI_LOGO_OPENVINO_DEVICE", "CPU")
+
+# ---------------- 分块推理 ----------------
+# 批量检测、网页图片与 Web 服务的默认分块模式（命令行用 --tile 单独开启）。
+# auto：图片最长边达到 TILE_AUTO_RATIO * imgsz 时才分块；on：始终分块；off：关闭
+TILE_MODE = os.environ.get("UNI_LOGO_TILE_MODE", "off").lower()
+TILE_AUTO_RATIO = _env_float("UNI_LOGO_TILE_AUTO_RATIO", 2.0)
+# 相邻切块的重叠比例
+TILE_OVERLAP = _env_float("UNI_LOGO_TILE_OVERLAP", 0.2)
+# 合并切块结果时，同类别两个框的交集占较小框面积超过该比例即合并
+TILE_MERGE_THRESHOLD = _env_float("UNI_LOGO_TILE_MERGE_THRESHOLD", 0.6)
+# 单张图片最多切多少块，超出时先把图片缩小到切块数不超过该值
+TILE_MAX_TILES = _env_int("UNI_LOGO_TILE_MAX_TILES", 12)
+# 整图与切块分批送入模型，每批最多这么多张
+TILE_BATCH = _env_int("UNI_LOGO_TILE_BATCH", 8)
+
+# ---------------- Web 推理批处理 ----------------
+# 单个批次最多合并的图片数量
+INFER_MAX_BATCH = _env_int("UNI_LOGO_INFER_MAX_BATCH", 8)
+# 凑批时最多等待的毫秒数
+INFER_MAX_WAIT_MS = _env_float("UNI_LOGO_INFER_MAX_WAIT_MS", 10)
+
+# ---------------- Web 监控指标 ----------------
+# 是否在响应中附加 Server-Timing 头（各阶段耗时，可在浏览器开发者工具中查看）
+SERVER_TIMING = os.environ.get("UNI_LOGO_SERVER_TIMING", "0") not in ("0", "false", "False", "")
+
+# ---------------- Web 结果图片 ----------------
+# 内存中保留的标注结果图片数量与总字节数上限，超出后按最近最少使用淘汰
+RESULT_STORE_SIZE = _env_int("UNI_LOGO_RESULT_STORE_SIZE", 256)
+RESULT_STORE_BYTES = _env_int("UNI_LOGO_RESULT_STORE_BYTES", 64 * 1024 * 1024)
+# 结果图片的 JPEG 质量
+RESULT_JPEG_QUALITY = _env_int("UNI_LOGO_RESULT_JPEG_QUALITY", 90)
+
+# ---------------- 网页图片下载 ----------------
+# 并发下载线程数（同时也是连接池大小）
+URL_DOWNLOAD_WORKERS = _env_int("UNI_LOGO_URL_DOWNLOAD_WORKERS", 16)
+# 单张图片的大小上限（字节）与下载总耗时上限（秒）
+URL_MAX_IMAGE_BYTES = _env_int("UNI_LOGO_URL_MAX_IMAGE_BYTES", 10 * 1024 * 1024)
+URL_DOWNLOAD_TIMEOUT = _env_float("UNI_LOGO_URL_DOWNLOAD_TIMEOUT", 10)
+
+# ---------------- 图片检测结果缓存 ----------------
+# 内存 LRU 容量（条）；设为 0 关闭检测缓存
+DET_CACHE_SIZE = _env_int("UNI_LOGO_DET_CACHE_SIZE", 2048)
+# 磁盘缓存（SQLite）路径，设为空字符串则只使用内存缓存
+DET_CACHE_PATH = os.environ.get("UNI_LOGO_DET_CACHE_PATH", "./cache/detection_cache.sqlite3")
+# 磁盘缓存最多保留的条目数，超出后删除最早写入的；单张标注图片超过该字节数时不写入缓存
+DET_CACHE_MAX_ROWS = _env_int("UNI_LOGO_DET_CACHE_MAX_ROWS", 50000)
+DET_CACHE_MAX_ANNOTATED_BYTES = _env_int("UNI_LOGO_DET_CACHE_MAX_ANNOTATED_BYTES", 512 * 1024)
+# 是否启用感知哈希（dHash）近似重复查找（默认关闭），以及作为候选的最大汉明距离。
+# 不同校徽的 8×8 dHash 常常只差一两位，因此候选还要求尺寸完全一致、32×32 缩略图逐像素差异（0~1）都不超过 DET_CACHE_PHASH_MAX_DIFF
+DET_CACHE_PHASH = os.environ.get("UNI_LOGO_DET_CACHE_PHASH", "0") not in ("0", "false", "False", "")
+DET_CACHE_PHASH_DISTANCE = _env_int("UNI_LOGO_DET_CACHE_PHASH_DISTANCE", 4)
+DET_CACHE_PHASH_MAX_DIFF = _env_float("UNI_LOGO_DET_CACHE_PHASH_MAX_DIFF", 0.1)
+# 感知哈希索引最多保留的条目数（启动时从磁盘载入最近的条目），更早的图片只能精确命中
+DET_CACHE_PHASH_MAX_ENTRIES = _env_int("UNI_LOGO_DET_CACHE_PHASH_MAX_ENTRIES", 100000)
+
+# ---------------- 画面变化检测 ----------------
+# 与上次检测时的画面相比，缩小后灰度图的平均差异（0~1）超过该值才重新检测
+SCENE_CHANGE_THRESHOLD = _env_float("UNI_LOGO_SCENE_CHANGE_THRESHOLD", 0.02)
+# 即使画面不变，最多隔多少帧也要检测一次
+SCENE_MAX_INTERVAL = _env_int("UNI_LOGO_SCENE_MAX_INTERVAL", 150)
+
+# ---------------- 摄像头展台模式 ----------------
+# 同一校徽两次查询混元的最短间隔（秒）
+CAMERA_LABEL_COOLDOWN = _env_float("UNI_LOGO_CAMERA_LABEL_COOLDOWN", 60)
+# 画面叠加中文信息使用的字体文件，留空时自动查找常见中文字体
+OVERLAY_FONT = os.environ.get("UNI_LOGO_OVERLAY_FONT", "")
+
+# ---------------- 图形界面日志 ----------------
+# 日志框保留的最大行数，超出后删除最早的行
+GUI_LOG_MAX_LINES = _env_int("UNI_LOGO_GUI_LOG_MAX_LINES", 5000)
+# 主循环取出日志的间隔（毫秒）与每次最多写入的行数
+GUI_LOG_INTERVAL_MS = _env_int("UNI_LOGO_GUI_LOG_INTERVAL_MS", 100)
+GUI_LOG_BATCH_LINES = _env_int("UNI_LOGO_GUI_LOG_BATCH_LINES", 500)
+# 每秒最多接收的日志行数，超出部分只统计条数；0 表示不限速
+GUI_LOG_RATE = _env_int("UNI_LOGO_GUI_LOG_RATE", 200)
+# 等待显示的日志行数上限，超出后丢弃最早的行
+GUI_LOG_MAX_PENDING = _env_int("UNI_LOGO_GUI_LOG_MAX_PENDING", 10000)
+
+# ---------------- 批量图片检测 ----------------
+# 批量推理的批大小，0 表示根据机器自动选择
+BATCH_SIZE = _env_int("UNI_LOGO_BATCH_SIZE", 0)
+# 解码进程数，0 表示 CPU 核数减一
+BATCH_DECODE_WORKERS = _env_int("UNI_LOGO_BATCH_DECODE_WORKERS", 0)
+
+# ---------------- 批量视频检测 ----------------
+# 同时处理的视频数（工作进程数），0 表示根据 CPU 核数自动选择
+VIDEO_BATCH_WORKERS = _env_int("UNI_LOGO_VIDEO_BATCH_WORKERS", 0)
+# 每个工作进程内 torch / OpenCV 使用的线程数，0 表示 CPU 核数平均分给各进程
+VIDEO_WORKER_THREADS = _env_int("UNI_LOGO_VIDEO_WORKER_THREADS", 0)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时分析：在独立子进程中用 `python -X importtime` 导入目标模块，统计总耗时与最慢的依赖。
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+# 各入口与子命令实际需要导入的模块
+STARTUP_TARGETS = {
+    "cli": ["yolov12_Hunyuan"],
+    "gui": ["交互界面测试"],
+    "detect-camera": ["yolov12_Hunyuan", "cv2", "supervision", "ultralytics"],
+    "detect-image": ["yolov12_Hunyuan", "cv2", "supervision", "ultralytics"],
+    "detect-batch": ["yolov12_Hunyuan", "batch_images", "cv2", "supervision", "ultralytics"],
+    "detect-video": ["yolov12_Hunyuan", "cv2", "supervision", "ultralytics"],
+    "detect-video-batch": ["yolov12_Hunyuan", "batch_video", "cv2", "supervision", "ultralytics"],
+    "detect-url-images": ["yolov12_Hunyuan", "cv2", "supervision", "ultralytics", "requests", "bs4", "PIL.Image"],
+    "run-web": ["yolov12_Hunyuan", "web_service"],
+    # 导出模型推理只需要 onnxruntime，不需要 torch / ultralytics
+    "onnx-backend": ["yolov12_Hunyuan", "cv2", "supervision", "onnxruntime"],
+}
+
+
+def _parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 [(模块名, 自身耗时us, 累计耗时us)]。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头行
+        # 模块名前的缩进表示嵌套层级，保留下来用于区分顶层依赖
+        rows.append((parts[2].rstrip()[1:], self_us, cumulative_us))
+    return rows
+
+
+def profile_imports(modules, top=10, cwd=None):
+    """
+    在全新的解释器中依次导入 modules，返回墙钟耗时和累计耗时最多的顶层依赖。
+    """
+    code = "\n".join(f"import {m}" for m in modules)
+    env = dict(os.environ, PYTHONIOENCODING="utf-8")
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd or os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    wall_seconds = time.perf_counter() - start
+
+    rows = _parse_importtime(proc.stderr)
+    # 顶层导入（无缩进）用于汇总总耗时，一级依赖（缩进两格）用于定位最慢的包
+    top_level = [r for r in rows if not r[0].startswith(" ")]
+    direct = [r for r in rows if len(r[0]) - len(r[0].lstrip()) <= 2]
+    direct.sort(key=lambda r: r[2], reverse=True)
+
+    error = None
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"
+
+    return {
+        "modules": list(modules),
+        "ok": proc.returncode == 0,
+        "error": error,
+        "wall_seconds": wall_seconds,
+        "import_seconds": sum(r[2] for r in top_level) / 1e6,
+        "slowest": [
+            {"module": name.strip(), "self_ms": self_us / 1000, "cumulative_ms": cum_us / 1000}
+            for name, self_us, cum_us in direct[:top]
+        ],
+    }
+
+
+def startup_report(targets=None, top=10):
+    targets = targets or list(STARTUP_TARGETS)
+    return {target: profile_imports(STARTUP_TARGETS[target], top=top) for target in targets}
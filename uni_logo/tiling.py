@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+分块（切片）推理：把大图切成与模型 imgsz 等大、相互重叠的小块，连同整图一起分批推理，
+再把各块的检测框平移回原图坐标并合并，用于网页大图、广角画面中很小的校徽。
+auto 模式只在图片明显大于 imgsz 时才分块，普通图片不增加任何开销；
+切块数超过 TILE_MAX_TILES 的超大图片先缩小再切，单张图片的推理量有上限。
+"""
+
+import settings
+from inference_backend import InferenceBackend, make_detections
+
+TILE_MODES = ("auto", "on", "off")
+
+
+def tile_offsets(width, height, size, overlap):
+    """返回覆盖整张图的切块 [(x, y, w, h)]，相邻块重叠 overlap 比例，最后一块贴齐图像边缘。"""
+    step = max(1, int(size * (1 - overlap)))
+
+    def starts(length):
+        if length <= size:
+            return [0]
+        positions = list(range(0, length - size, step))
+        positions.append(length - size)
+        return positions
+
+    return [(x, y, min(size, width), min(size, height)) for y in starts(height) for x in starts(width)]
+
+
+def tile_scale(width, height, size, overlap, max_tiles):
+    """切块数超过 max_tiles 时返回图片需要缩小到的比例（< 1），否则返回 1。"""
+    scale = 1.0
+    while max_tiles > 0 and len(tile_offsets(int(width * scale), int(height * scale), size, overlap)) > max_tiles:
+        scale *= 0.9
+    return scale
+
+
+def merge_detections(detections, threshold, names):
+    """
+    同类别贪心合并：按置信度从高到低保留框，去掉与已保留框“交集 / 较小框面积”超过 threshold 的同类别框。
+    用交集占较小框的比例而不是 IoU，是因为切块边缘常产生只包含半个校徽的小框，它与完整框的 IoU 很低。
+    保留的框不做扩大，坐标与置信度都来自原始检测。
+    """
+    import numpy as np
+
+    if len(detections) == 0:
+        return detections
+    xyxy = detections.xyxy.astype(np.float32)
+    confidence = detections.confidence
+    class_id = detections.class_id
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+
+    order = np.argsort(-confidence, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        overlap = w * h / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        order = rest[(class_id[rest] != class_id[i]) | (overlap < threshold)]
+    keep = np.array(keep, dtype=int)
+    return make_detections(xyxy[keep], confidence[keep], class_id[keep], names)
+
+
+class SlicedBackend(InferenceBackend):
+    """
+    包装任意推理后端，对大图做分块推理。接口与其它后端一致，调用方不需要改动。
+    mode：auto（图片最长边 >= TILE_AUTO_RATIO * imgsz 时分块）、on（始终分块）、off（不分块）。
+    """
+
+    name = "sliced"
+
+    def __init__(self, base, mode=None, overlap=None, auto_ratio=None, merge_threshold=None, max_tiles=None,
+                 batch=None):
+        super().__init__(base.weights, imgsz=base.imgsz, conf=base.conf, iou=base.iou)
+        self.base = base
+        self.names = base.names
+        self.mode = (mode or settings.TILE_MODE).lower()
+        if self.mode not in TILE_MODES:
+            raise ValueError(f"未知的分块模式：{self.mode}（可选：{', '.join(TILE_MODES)}）")
+        self.overlap = settings.TILE_OVERLAP if overlap is None else overlap
+        self.auto_ratio = settings.TILE_AUTO_RATIO if auto_ratio is None else auto_ratio
+        self.merge_threshold = settings.TILE_MERGE_THRESHOLD if merge_threshold is None else merge_threshold
+        self.max_tiles = settings.TILE_MAX_TILES if max_tiles is None else max_tiles
+        self.batch = max(1, settings.TILE_BATCH if batch is None else batch)
+
+        self.images = 0
+        self.tiled_images = 0
+        self.downscaled_images = 0
+        self.tiles = 0
+
+    def should_tile(self, image):
+        if self.mode == "off":
+            return False
+        height, width = image.shape[:2]
+        if self.mode == "on":
+            return max(height, width) > self.base.imgsz
+        return max(height, width) >= self.auto_ratio * self.base.imgsz
+
+    def predict(self, images):
+        import cv2
+        import numpy as np
+        import supervision as sv
+
+        # 所有图片的整图与切块排成一列，按 batch 分批前向
+        crops, owners = [], []
+        for index, image in enumerate(images):
+            crops.append(image)
+            owners.append((index, 0, 0, 1.0))
+            if self.should_tile(image):
+                height, width = image.shape[:2]
+                scale = tile_scale(width, height, self.base.imgsz, self.overlap, self.max_tiles)
+                if scale < 1:
+                    width, height = int(width * scale), int(height * scale)
+                    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                    self.downscaled_images += 1
+                offsets = tile_offsets(width, height, self.base.imgsz, self.overlap)
+                for x, y, w, h in offsets:
+                    crops.append(image[y:y + h, x:x + w])
+                    owners.append((index, x, y, scale))
+                self.tiled_images += 1
+                self.tiles += len(offsets)
+        self.images += len(images)
+
+        outputs = []
+        for start in range(0, len(crops), self.batch):
+            outputs.extend(self.base.predict(crops[start:start + self.batch]))
+
+        parts = [[] for _ in images]
+        for (index, x, y, scale), detections in zip(owners, outputs):
+            if len(detections) and (x or y or scale != 1):
+                detections.xyxy = (detections.xyxy + np.array([x, y, x, y], dtype=np.float32)) / scale
+            parts[index].append(detections)
+
+        results = []
+        for part in parts:
+            if len(part) == 1:
+                results.append(part[0])
+            else:
+                results.append(merge_detections(sv.Detections.merge(part), self.merge_threshold, self.names))
+        return results
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "images": self.images,
+            "tiled_images": self.tiled_images,
+            "downscaled_images": self.downscaled_images,
+            "tiles": self.tiles,
+        }
+
+    def __repr__(self):
+        return f"SlicedBackend({self.base!r}, mode={self.mode!r})"
+
+
+def tiled(model, mode=None):
+    """按 mode（默认 settings.TILE_MODE）包装模型；off 时原样返回。"""
+    mode = (mode or settings.TILE_MODE).lower()
+    if mode == "off" or isinstance(model, SlicedBackend):
+        return model
+    return SlicedBackend(model, mode=mode)
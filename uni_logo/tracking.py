@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+校徽多目标跟踪：基于 supervision 的 ByteTrack，为每个校徽实例分配稳定的 track id。
+检测帧之间按匀速模型外推检测框，降低检测频率的同时保持画面上的框平滑。
+"""
+
+import csv
+import json
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class TrackRecord:
+    track_id: int
+    label: str
+    first_seen: float
+    last_seen: float
+    first_frame: int
+    last_frame: int
+    hits: int = 1
+    max_confidence: float = 0.0
+
+
+class LogoTracker:
+    def __init__(self, names, detect_interval=1, fps=30.0, lost_seconds=2.0):
+        """
+        names: 类别 id -> 标签；detect_interval: 相邻两次检测间隔的帧数；
+        fps: 视频（或摄像头）帧率；lost_seconds: 目标消失多久后结束该轨迹。
+        """
+        import supervision as sv
+
+        self.names = names
+        # ByteTrack 只在检测帧上更新，因此按“检测帧率”换算丢失缓冲
+        detect_fps = max(1.0, fps / max(1, detect_interval))
+        self._tracker = sv.ByteTrack(
+            lost_track_buffer=max(1, int(lost_seconds * detect_fps)),
+            frame_rate=int(round(detect_fps)),
+        )
+        self.records = {}
+        self._last = None  # 最近一次跟踪结果
+        self._last_frame = 0
+        self._velocity = {}  # track id -> 每帧位移 (dx1, dy1, dx2, dy2)
+        self._boxes = {}  # track id -> (帧号, 检测框)
+
+    def update(self, detections, frame_index, timestamp):
+        """用新的检测结果更新轨迹，返回带 tracker_id 的检测结果。"""
+        import numpy as np
+
+        tracked = self._tracker.update_with_detections(detections)
+        for i, track_id in enumerate(tracked.tracker_id):
+            track_id = int(track_id)
+            box = tracked.xyxy[i].astype(np.float32)
+            label = self.names[int(tracked.class_id[i])]
+            confidence = float(tracked.confidence[i]) if tracked.confidence is not None else 0.0
+
+            record = self.records.get(track_id)
+            if record is None:
+                self.records[track_id] = TrackRecord(track_id, label, timestamp, timestamp,
+                                                     frame_index, frame_index, 1, confidence)
+            else:
+                record.last_seen = timestamp
+                record.last_frame = frame_index
+                record.hits += 1
+                record.max_confidence = max(record.max_confidence, confidence)
+
+            previous = self._boxes.get(track_id)
+            if previous is not None and frame_index > previous[0]:
+                self._velocity[track_id] = (box - previous[1]) / (frame_index - previous[0])
+            self._boxes[track_id] = (frame_index, box)
+
+        self._last = tracked
+        self._last_frame = frame_index
+        return tracked
+
+    def predict(self, frame_index):
+        """返回外推到 frame_index 的检测框；尚无跟踪结果时返回 None。"""
+        if self._last is None or len(self._last) == 0 or frame_index == self._last_frame:
+            return self._last
+
+        import numpy as np
+
+        predicted = self._last[np.ones(len(self._last), dtype=bool)]  # 复制一份，避免修改原结果
+        steps = frame_index - self._last_frame
+        for i, track_id in enumerate(predicted.tracker_id):
+            velocity = self._velocity.get(int(track_id))
+            if velocity is not None:
+                predicted.xyxy[i] = predicted.xyxy[i] + velocity * steps
+        return predicted
+
+    def labels(self, detections):
+        """标注文字：#track id 标签。"""
+        if detections.tracker_id is None:
+            return [self.names[int(c)] for c in detections.class_id]
+        return [f"#{int(t)} {self.names[int(c)]}" for t, c in zip(detections.tracker_id, detections.class_id)]
+
+    def instance_counts(self):
+        """每个学校出现过的不同实例（轨迹）数量。"""
+        counts = {}
+        for record in self.records.values():
+            counts[record.label] = counts.get(record.label, 0) + 1
+        return counts
+
+    def export(self, path):
+        """按扩展名导出为 .csv 或 .json。"""
+        rows = [asdict(r) for r in sorted(self.records.values(), key=lambda r: r.track_id)]
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=list(TrackRecord.__dataclass_fields__))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+网页图片流水线：并发下载 -> 解码 -> 批量推理，三个阶段通过有界队列衔接，网络与推理互相重叠。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urljoin
+
+import settings
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+
+_DONE = object()
+
+
+@dataclass
+class ImageResult:
+    index: int
+    url: str
+    image: Any = None
+    detections: Any = None
+    error: Optional[str] = None
+    sha256: Optional[str] = None
+    fingerprint: Any = None  # detection_cache.Fingerprint，近似查找用
+    cached: Optional[str] = None  # "exact" / "phash"，表示结果来自检测缓存
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    errors: int = 0
+    bytes: int = 0
+    busy_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, seconds, nbytes=0, error=False):
+        with self._lock:
+            self.items += 1
+            self.bytes += nbytes
+            self.busy_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def to_dict(self, wall_seconds):
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / wall_seconds, 2) if wall_seconds else 0.0,
+        }
+
+
+def make_session(pool_size=None):
+    """带连接池的 requests 会话，同一站点的多张图片复用 TCP/TLS 连接。"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = pool_size or settings.URL_DOWNLOAD_WORKERS
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def extract_image_urls(page_url, html):
+    """提取网页中所有 <img> 的绝对地址，按首次出现顺序去重。"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    img_urls = []
+    for img in soup.find_all("img"):
+        src = img.get("src")
+        if not src or src.startswith("data:"):
+            continue
+        # 补全相对路径为绝对路径
+        img_urls.append(urljoin(page_url, src))
+    return list(dict.fromkeys(img_urls))
+
+
+def download(session, url, max_bytes=None, timeout=None):
+    """流式下载，超过大小上限或总耗时上限即中止。"""
+    max_bytes = max_bytes or settings.URL_MAX_IMAGE_BYTES
+    timeout = timeout or settings.URL_DOWNLOAD_TIMEOUT
+    deadline = time.monotonic() + timeout
+
+    with session.get(url, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"图片过大（{int(length)} 字节）")
+
+        chunks = []
+        size = 0
+        for chunk in resp.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"图片超过 {max_bytes} 字节上限")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"下载超过 {timeout} 秒")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def decode(data):
+    """优先用 OpenCV 解码，GIF 等格式退回 PIL。返回 BGR 图像。"""
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is not None:
+        return image
+
+    from io import BytesIO
+    from PIL import Image
+
+    pil_image = Image.open(BytesIO(data)).convert("RGB")
+    return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+
+
+class UrlImagePipeline:
+    def __init__(self, model, concurrency=None, batch_size=None, max_bytes=None, timeout=None, cache=None):
+        self.model = model
+        self.cache = cache
+        self.concurrency = concurrency or settings.URL_DOWNLOAD_WORKERS
+        self.batch_size = batch_size or settings.INFER_MAX_BATCH
+        self.max_bytes = max_bytes or settings.URL_MAX_IMAGE_BYTES
+        self.timeout = timeout or settings.URL_DOWNLOAD_TIMEOUT
+
+        self.download_stats = StageStats()
+        self.decode_stats = StageStats()
+        self.infer_stats = StageStats()
+        self.wall_seconds = 0.0
+
+    def run(self, img_urls):
+        """
+        依次产出 ImageResult（按完成顺序，index 为原始序号）。
+        下载与解码在后台线程进行，推理在调用线程中按批执行。
+        调用方提前结束迭代（break 或关闭生成器）时，后台线程会放弃剩余图片并退出。
+        """
+        start = time.perf_counter()
+        session = make_session(self.concurrency)
+        # 有界队列：推理跟不上时让下载与解码自然减速，避免图片堆积在内存中
+        decode_queue = queue.Queue(maxsize=self.concurrency * 2)
+        infer_queue = queue.Queue(maxsize=self.batch_size * 2)
+        stop = threading.Event()
+
+        def put(q, item):
+            """队列已满时等待，直到放入成功或流水线被停止；返回是否放入。"""
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def from_cache(item, entry, kind):
+            item.detections = entry.to_detections(
+                *(() if item.image is None else (item.image.shape[1], item.image.shape[0])))
+            item.cached = kind
+            return item
+
+        def download_one(index, url):
+            if stop.is_set():
+                return
+            t = time.perf_counter()
+            try:
+                data = download(session, url, self.max_bytes, self.timeout)
+                self.download_stats.add(time.perf_counter() - t, len(data))
+            except Exception as e:
+                self.download_stats.add(time.perf_counter() - t, error=True)
+                put(decode_queue, ImageResult(index, url, error=f"图片加载失败：{e}"))
+                return
+
+            item = ImageResult(index, url, image=data)
+            if self.cache is not None:
+                # 精确命中时连解码都可以跳过
+                item.sha256, entry = self.cache.lookup(data)
+                if entry is not None:
+                    item.image = None
+                    item = from_cache(item, entry, "exact")
+            put(decode_queue, item)
+
+        def download_all():
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="download") as pool:
+                for index, url in enumerate(img_urls):
+                    pool.submit(download_one, index, url)
+            put(decode_queue, _DONE)
+
+        def decode_all():
+            while not stop.is_set():
+                try:
+                    item = decode_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    put(infer_queue, _DONE)
+                    return
+                if item.error is None and item.detections is None:
+                    t = time.perf_counter()
+                    try:
+                        item.image = decode(item.image)
+                        self.decode_stats.add(time.perf_counter() - t)
+                    except Exception as e:
+                        item.image = None
+                        item.error = f"图片解码失败：{e}"
+                        self.decode_stats.add(time.perf_counter() - t, error=True)
+
+                    if item.image is not None and self.cache is not None:
+                        item.fingerprint, entry = self.cache.lookup_similar(item.image)
+                        if entry is not None:
+                            from_cache(item, entry, "phash")
+                            # 以本图摘要另存一份，下次即可精确命中
+                            self.cache.store(item.sha256, item.detections, item.image.shape[1],
+                                             item.image.shape[0], item.fingerprint)
+                put(infer_queue, item)
+
+        threads = [
+            threading.Thread(target=download_all, name="url-download", daemon=True),
+            threading.Thread(target=decode_all, name="url-decode", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            finished = False
+            while not finished:
+                batch = []
+                item = infer_queue.get()
+                while True:
+                    if item is _DONE:
+                        finished = True
+                        break
+                    if item.error is not None or item.detections is not None:
+                        yield item
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = infer_queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if batch:
+                    t = time.perf_counter()
+                    results = self.model.predict([b.image for b in batch])
+                    elapsed = time.perf_counter() - t
+                    for b, result in zip(batch, results):
+                        b.detections = result
+                        self.infer_stats.add(elapsed / len(batch))
+                        if self.cache is not None and b.sha256 is not None:
+                            self.cache.store(b.sha256, b.detections, b.image.shape[1], b.image.shape[0], b.fingerprint)
+                        yield b
+        finally:
+            stop.set()
+            self.wall_seconds = time.perf_counter() - start
+            session.close()
+
+    def stats(self):
+        return {
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cache": None if self.cache is None else self.cache.stats(),
+            "download": self.download_stats.to_dict(self.wall_seconds),
+            "decode": self.decode_stats.to_dict(self.wall_seconds),
+            "infer": self.infer_stats.to_dict(self.wall_seconds),
+        }
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+视频检测流水线：解码、推理、渲染分别在不同线程中进行，阶段之间用有界队列衔接。
+无窗口（headless）模式下，不需要推理的帧只 grab() 不解码，用于批量处理长视频。
+"""
+
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class VideoEngine:
+    def __init__(self, source, model=None, stride=10, display=True, display_width=1200,
+                 queue_size=8, window_name="Logo Detection", track=True, scene_gate=None):
+        self.source = source
+        self.model = model
+        self.stride = max(1, stride)
+        self.display = display
+        self.display_width = display_width
+        self.queue_size = queue_size
+        self.window_name = window_name
+        self.track = track
+        self.tracker = None
+        # 可选的 SceneChangeGate：画面基本不变时跳过计划中的检测
+        self.scene_gate = scene_gate
+
+        self._stop = threading.Event()
+        self._error = None
+
+        self.frames_read = 0
+        self.frames_inferred = 0
+        self.video_fps = 0.0
+        self.elapsed = 0.0
+        # 学校标签 -> 首次出现的时间（秒）
+        self.first_seen = {}
+
+    def stop(self):
+        self._stop.set()
+
+    def _fail(self, error):
+        # 记录第一个错误并通知所有阶段退出，run() 随后抛出该错误
+        if self._error is None:
+            self._error = error
+        self.stop()
+
+    def _put(self, q, item):
+        # 带超时的 put，保证收到停止信号后生产者能及时退出
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        # 带超时的 get，收到停止信号后返回 _STOP
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _should_infer(self, frame_index):
+        return frame_index % self.stride == 0
+
+    def _decode(self, cap, out_queue):
+        frame_index = 0
+        try:
+            while not self._stop.is_set():
+                needs_infer = self._should_infer(frame_index)
+                if needs_infer or self.display:
+                    success, frame = cap.read()
+                else:
+                    # 不推理也不显示的帧只移动读指针，省去解码开销
+                    success, frame = cap.grab(), None
+                if not success:
+                    break
+                self.frames_read += 1
+                if frame is not None and not self._put(out_queue, (frame_index, frame, needs_infer)):
+                    break
+                frame_index += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out_queue, _STOP)
+
+    def _infer(self, in_queue, out_queue):
+        names = self.model.names
+        last_detections = None
+        try:
+            while not self._stop.is_set():
+                item = self._get(in_queue)
+                if item is _STOP:
+                    break
+                frame_index, frame, needs_infer = item
+                if needs_infer and self.scene_gate is not None:
+                    needs_infer = self.scene_gate.should_infer(frame, frame_index)
+                if needs_infer:
+                    last_detections = self.model.detect(frame)
+                    self.frames_inferred += 1
+                    timestamp = frame_index / self.video_fps if self.video_fps else 0.0
+                    if self.tracker is not None:
+                        last_detections = self.tracker.update(last_detections, frame_index, timestamp)
+                    for class_id in last_detections.class_id:
+                        self.first_seen.setdefault(names[int(class_id)], timestamp)
+                    detections = last_detections
+                elif self.tracker is not None:
+                    # 两次检测之间按轨迹外推检测框
+                    detections = self.tracker.predict(frame_index)
+                else:
+                    detections = last_detections
+
+                if self.display:
+                    labels = None
+                    if detections is not None:
+                        labels = self.tracker.labels(detections) if self.tracker is not None \
+                            else [names[int(c)] for c in detections.class_id]
+                    if not self._put(out_queue, (frame_index, frame, detections, labels)):
+                        break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out_queue, _STOP)
+
+    def _render(self, in_queue):
+        import cv2
+        import supervision as sv
+
+        # 标注器只创建一次，所有帧复用
+        box_annotator = sv.BoxAnnotator()
+        label_annotator = sv.LabelAnnotator()
+
+        try:
+            while True:
+                item = self._get(in_queue)
+                if item is _STOP:
+                    break
+                _, frame, detections, labels = item
+                # 始终使用最近一次的检测框（或跟踪外推的检测框）来标注
+                if detections is not None:
+                    frame = box_annotator.annotate(scene=frame, detections=detections)
+                    frame = label_annotator.annotate(scene=frame, detections=detections, labels=labels)
+
+                # 缩放窗口大小（宽度缩放为 display_width）
+                height = int(frame.shape[0] * self.display_width / frame.shape[1])
+                cv2.imshow(self.window_name, cv2.resize(frame, (self.display_width, height)))
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    self.stop()
+                    break
+        except Exception as e:
+            self._fail(e)
+
+    def run(self):
+        """
+        处理整个视频并返回统计信息。显示窗口在调用线程中渲染（OpenCV 要求窗口操作在主线程）。
+        """
+        import cv2
+
+        if self.model is None:
+            from model_registry import get_model
+            self.model = get_model()
+
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频：{self.source}")
+        self.video_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if self.track:
+            from tracking import LogoTracker
+            self.tracker = LogoTracker(self.model.names, detect_interval=self.stride,
+                                       fps=self.video_fps or 30.0)
+
+        decoded = queue.Queue(maxsize=self.queue_size)
+        inferred = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(target=self._decode, args=(cap, decoded), name="video-decode", daemon=True),
+            threading.Thread(target=self._infer, args=(decoded, inferred), name="video-infer", daemon=True),
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            if self.display:
+                self._render(inferred)
+            else:
+                # 任一阶段出错都会调用 stop()，其余阶段随之退出，这里不会一直等待
+                for thread in threads:
+                    thread.join()
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=5)
+            cap.release()
+            if self.display:
+                cv2.destroyAllWindows()
+            self.elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+        return self.summary()
+
+    def summary(self):
+        return {
+            "source": str(self.source),
+            "frames_read": self.frames_read,
+            "frames_inferred": self.frames_inferred,
+            "video_fps": round(self.video_fps, 2),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "processing_fps": round(self.frames_read / self.elapsed, 2) if self.elapsed else 0.0,
+            "realtime_factor": round(self.frames_read / self.video_fps / self.elapsed, 2)
+            if self.elapsed and self.video_fps else 0.0,
+            "schools": dict(sorted(self.first_seen.items(), key=lambda kv: kv[1])),
+            # 跟踪开启时，按轨迹统计每个学校出现过的不同校徽实例数
+            "instances": self.tracker.instance_counts() if self.tracker is not None else {},
+            "scene_gate": self.scene_gate.stats() if self.scene_gate is not None else None,
+        }
@@ -1,84 +1,252 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
-import shutil
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Match
+import asyncio
+import html
+import threading
+import time
 import cv2
+import numpy as np
 import typer
 import json
 import uvicorn
 import supervision as sv
-from ultralytics import YOLO
-from zidian_uni import LABEL_TO_SCHOOL_NAME
-from tencentcloud.common import credential
-from tencentcloud.hunyuan.v20230901 import hunyuan_client, models
+from model_registry import get_model, registry
+from inference_worker import get_worker
+from result_store import ResultStore
+from detection_cache import get_detection_cache
+from llm_cache import get_llm_cache
+import metrics
+import result_format
+from dataclasses import dataclass
+from typing import Optional
+import settings
+import hunyuan_api
+import school_kb
 
 app = typer.Typer()
 
-web_app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # 服务启动时加载并预热模型，避免第一个请求等待
+    await run_in_threadpool(get_model)
+    get_worker().start()
+    # 后台补齐 / 刷新学校知识库，请求只读取知识库，不等待大模型
+    refresher = school_kb.RefreshScheduler(progress=typer.echo).start()
+    yield
+    refresher.stop()
+    get_worker().stop()
 
-web_app.mount("/static", StaticFiles(directory="."), name="static")
 
-# yolo_model = YOLO("./runs/detect/school_logo_yolov125/weights/best.pt")
-yolo_model = YOLO("./runs/train/school_logo_yolov124/weights/best.pt")
+web_app = FastAPI(lifespan=lifespan)
 
-def ask_hunyuan(school_abbr: str):
-    school_name = LABEL_TO_SCHOOL_NAME.get(school_abbr.lower(), school_abbr)
+REQUESTS = metrics.REGISTRY.register(metrics.Counter(
+    "uni_logo_http_requests_total", "HTTP 请求数", ["method", "route", "status"]))
+REQUEST_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "uni_logo_http_request_seconds", "HTTP 请求耗时（秒，流式接口只统计到响应头发出）", ["method", "route"]))
+IN_FLIGHT = metrics.REGISTRY.register(metrics.Gauge(
+    "uni_logo_http_requests_in_flight", "正在处理的 HTTP 请求数"))
 
-    prompt_text = f"""
-        你是一个大学信息查询助手。请根据提供的大学名称“{school_name}”返回如下结构化信息：
-        - 学校名（中文）
-        - 所属国家
-        - QS 世界大学排名（若无请写“无”）
-        - 软科大学排名
-        - 官网链接
 
-        请严格按如下格式输出：
-        学校名：...
-        国家：...
-        QS排名：...
-        软科排名：...
-        官网链接：...
+def route_label(scope):
+    # 用路由模板而不是实际路径作为标签，避免 /result/{digest}.jpg 产生无限多的时间序列
+    for route in web_app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "other"
 
-        此外，还请给出这个学校的相关百科、今年来的获得奖项、杰出校友，
-        并请你查询后给出该大学近年高考浙江省投档线分数；
 
-        最后，请配上几句你对这个大学的评价，以及预测一下这个大学在未来十年中的发展趋势。
-        """
-    cred = credential.Credential("sdkid", "sdkmima")
-    client = hunyuan_client.HunyuanClient(cred, "ap-guangzhou")
+class MetricsMiddleware:
+    """统计请求数、耗时与并发数；开启 settings.SERVER_TIMING 时附加 Server-Timing 响应头。"""
 
-    req = models.ChatCompletionsRequest()
-    params = {
-        "Messages": [{"Role": "user", "Content": prompt_text}],
-        "Model": "hunyuan-pro",
-        "Temperature": 0.7
-    }
-    req.from_json_string(json.dumps(params))
+    def __init__(self, app):
+        self.app = app
 
-    resp = client.ChatCompletions(req)
-    return resp.Choices[0].Message.Content
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-def detect_logos(image_path):
-    image = cv2.imread(image_path)
-    results = yolo_model(image)[0]
-    detections = sv.Detections.from_ultralytics(results)
-
-    output_texts = []
-    annotator = sv.BoxAnnotator()
-    annotated_image = annotator.annotate(scene=image, detections=detections)
-    label_annotator = sv.LabelAnnotator()
-    annotated_image = label_annotator.annotate(scene=annotated_image, detections=detections)
-
-    for i in range(len(detections)):
-        class_id = int(detections.class_id[i])
-        school_label = yolo_model.model.names[class_id]
+        method, route = scope["method"], route_label(scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+                if settings.SERVER_TIMING:
+                    header = metrics.server_timing(timings, elapsed).encode("latin-1")
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header)]
+            await send(message)
+
+        IN_FLIGHT.inc()
         try:
-            result = ask_hunyuan(school_label)
-            output_texts.append(f"\U0001F393 校徽：{school_label}\n\n{result}")
-        except Exception as e:
-            output_texts.append(f"⚠️ 识别失败：{str(e)}")
+            with metrics.collect_timings() as timings:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            REQUESTS.inc(method=method, route=route, status=status)
+
+
+web_app.add_middleware(MetricsMiddleware)
+
+
+def service_metrics():
+    """抓取时从检测缓存、混元缓存、推理线程和模型注册表读取现有统计。"""
+    collected = []
+
+    def gauge(name, documentation, values, labelnames=()):
+        metric = metrics.Gauge(name, documentation, labelnames)
+        for labels, value in values:
+            metric.set(value, **labels)
+        collected.append(metric)
+
+    def counter(name, documentation, values, labelnames=()):
+        metric = metrics.Counter(name, documentation, labelnames)
+        for labels, value in values:
+            metric.inc(value, **labels)
+        collected.append(metric)
+
+    det = get_detection_cache().stats()
+    counter("uni_logo_detection_cache_lookups_total", "检测缓存查询次数，result 为 exact / phash / miss",
+            [({"result": "exact"}, det["exact_hits"]), ({"result": "phash"}, det["phash_hits"]),
+             ({"result": "miss"}, det["misses"])], ["result"])
+    gauge("uni_logo_detection_cache_hit_ratio", "检测缓存命中率", [({}, det["hit_rate"])])
+    gauge("uni_logo_detection_cache_entries", "检测缓存内存条目数", [({}, det["memory_entries"])])
+
+    llm = get_llm_cache().stats()
+    counter("uni_logo_llm_cache_lookups_total", "混元缓存查询次数，result 为 memory / disk / miss",
+            [({"result": "memory"}, llm["hits"] - llm["disk_hits"]), ({"result": "disk"}, llm["disk_hits"]),
+             ({"result": "miss"}, llm["misses"])], ["result"])
+    gauge("uni_logo_llm_cache_hit_ratio", "混元缓存命中率", [({}, llm["hit_rate"])])
+
+    worker = get_worker().stats()
+    counter("uni_logo_infer_batches_total", "批处理推理线程执行的批次数", [({}, worker["batches"])])
+    counter("uni_logo_infer_images_total", "批处理推理线程处理的图片数", [({}, worker["images"])])
+    gauge("uni_logo_infer_queue_size", "等待推理的图片数", [({}, worker["queue_size"])])
+    counter("uni_logo_infer_load_errors_total", "推理线程加载模型失败的次数", [({}, worker["load_errors"])])
+
+    loaded = registry.timings()
+    info = {"precision": settings.MODEL_PRECISION, "imgsz": settings.MODEL_IMGSZ, "tile_mode": settings.TILE_MODE}
+    gauge("uni_logo_model_info", "已加载的模型与推理后端", [
+        ({"weights": weights, "backend": t["backend"], **info}, 1) for weights, t in loaded.items()
+    ], ["weights", "backend", "precision", "imgsz", "tile_mode"])
+    gauge("uni_logo_model_load_seconds", "模型加载与预热耗时（秒）", [
+        ({"weights": weights, "phase": phase}, t[f"{phase}_seconds"])
+        for weights, t in loaded.items() for phase in ("load", "warmup")
+    ], ["weights", "phase"])
+    return collected
+
+
+metrics.REGISTRY.add_collector(service_metrics)
+
+# 标注结果只保存在内存中，按内容摘要访问，不再读写共享的临时文件
+result_store = ResultStore()
+
+
+box_annotator = sv.BoxAnnotator()
+label_annotator = sv.LabelAnnotator()
+
+def annotate_logos(image, detections):
+    annotated_image = box_annotator.annotate(scene=image, detections=detections)
+    return label_annotator.annotate(scene=annotated_image, detections=detections)
 
-    return annotated_image, output_texts
+def describe_logos(detections):
+    """返回 {标签: SchoolRecord}；同一张图中重复出现的校徽只查询一次，优先读取学校知识库。"""
+    yolo_model = get_model()
+    school_labels = [yolo_model.names[int(class_id)] for class_id in detections.class_id]
+    return school_kb.lookup_many(school_labels, variant="web")
+
+def decode_image(data: bytes):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def encode_image(image):
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, settings.RESULT_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("结果图片编码失败")
+    return buffer.tobytes()
+
+def detections_to_json(detections):
+    return result_format.detections_to_json(detections, get_model().names)
+
+@dataclass
+class UploadResult:
+    detections: sv.Detections
+    width: int
+    height: int
+    digest: Optional[str] = None  # 标注结果图片在 result_store 中的摘要
+    cached: Optional[str] = None  # "exact" / "phash"，表示检测结果来自缓存
+
+async def detect_uploads(datas, annotate=True):
+    """
+    检测一组上传图片的字节，返回与输入一一对应的 UploadResult，无法解码的图片为 None。
+    先按内容摘要查检测缓存（命中且已有标注图时连解码和标注都跳过），
+    再按感知哈希查近似重复，剩余图片合并交给批处理推理线程。
+    """
+    cache = get_detection_cache()
+    outcomes = [None] * len(datas)
+    pending = []
+
+    for i, data in enumerate(datas):
+        with metrics.stage("cache_lookup"):
+            sha256, entry = await run_in_threadpool(cache.lookup, data)
+        if entry is not None and (entry.annotated is not None or not annotate):
+            digest = result_store.put(entry.annotated) if annotate else None
+            outcomes[i] = UploadResult(entry.to_detections(), entry.width, entry.height, digest, "exact")
+            continue
+
+        with metrics.stage("decode"):
+            image = await run_in_threadpool(decode_image, data)
+        if image is None:
+            continue
+        cached, fingerprint = ("exact", None) if entry is not None else (None, None)
+        if entry is None:
+            with metrics.stage("cache_lookup"):
+                fingerprint, entry = await run_in_threadpool(cache.lookup_similar, image)
+            cached = "phash" if entry is not None else None
+        pending.append((i, sha256, image, fingerprint, entry, cached))
+
+    to_infer = [p for p in pending if p[4] is None]
+    inferred = []
+    if to_infer:
+        # 包含在推理线程中排队凑批的时间；纯前向耗时见 stage="model"
+        with metrics.stage("infer"):
+            inferred = await get_worker().infer_many([p[2] for p in to_infer])
+    inferred_by_index = {p[0]: d for p, d in zip(to_infer, inferred)}
+
+    for i, sha256, image, fingerprint, entry, cached in pending:
+        height, width = image.shape[:2]
+        detections = inferred_by_index[i] if entry is None else entry.to_detections(width, height)
+
+        annotated = None
+        digest = None
+        if annotate:
+            with metrics.stage("annotate"):
+                annotated = await run_in_threadpool(lambda: encode_image(annotate_logos(image, detections)))
+            digest = result_store.put(annotated)
+
+        with metrics.stage("cache_store"):
+            if cached == "exact":
+                if annotated is not None:
+                    await run_in_threadpool(cache.attach_annotated, sha256, annotated)
+            else:
+                await run_in_threadpool(cache.store, sha256, detections, width, height, fingerprint, annotated)
+        outcomes[i] = UploadResult(detections, width, height, digest, cached)
+
+    return outcomes
+
+def detect_logos(image_path):
+    # 同步版本，供脚本直接调用；Web 接口走批处理推理线程
+    image = cv2.imread(image_path)
+    detections = get_worker().submit(image).result()
+    annotated_image = annotate_logos(image, detections)
+    records = describe_logos(detections)
+    return annotated_image, [f"\U0001F393 校徽：{label}\n\n{record.text()}" for label, record in records.items()]
 
 @web_app.get("/", response_class=HTMLResponse)
 def home():
@@ -124,6 +292,19 @@ def home():
             input[type="submit"]:hover {
                 background-color: #005fa3;
             }
+            #stream-result img {
+                margin-top: 20px;
+                max-width: 100%;
+                border-radius: 10px;
+            }
+            .desc-box {
+                border-left: 4px solid #3498db;
+                padding: 15px;
+                margin: 20px 0;
+                text-align: left;
+                white-space: pre-wrap;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+            }
             footer {
                 text-align: center;
                 font-size: 13px;
@@ -138,12 +319,65 @@ def home():
             <p>上传一张图像，我们将识别其中的大学校徽并进行展示</p>
         </header>
         <div class="container">
-            <form action="/upload" method="post" enctype="multipart/form-data">
+            <form id="upload-form" action="/upload" method="post" enctype="multipart/form-data">
                 <label for="file">选择图像文件（支持 JPG/PNG）:</label>
                 <input type="file" name="file" accept="image/*" required>
+                <label><input type="checkbox" id="stream" checked> 流式显示（先显示识别框，介绍边生成边显示）</label>
+                <br><br>
                 <input type="submit" value="开始识别">
             </form>
+            <div id="stream-result"></div>
         </div>
+        <script>
+            // 流式模式：POST 到 /api/stream，逐条解析 SSE 事件并渲染
+            document.getElementById("upload-form").addEventListener("submit", async (e) => {
+                if (!document.getElementById("stream").checked) return;
+                e.preventDefault();
+                const result = document.getElementById("stream-result");
+                result.innerHTML = "<p>识别中...</p>";
+                const boxes = {};
+                const resp = await fetch("/api/stream", {method: "POST", body: new FormData(e.target)});
+                const reader = resp.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = "";
+                const handle = (event, data) => {
+                    if (event === "detections") {
+                        result.innerHTML = `<img src="${data.result_url}" alt="识别结果图像">`;
+                        if (data.detections.length === 0) result.innerHTML += "<p>未检测到大学校徽</p>";
+                        for (const det of data.detections) {
+                            if (boxes[det.label]) continue;
+                            const box = document.createElement("div");
+                            box.className = "desc-box";
+                            box.textContent = `🎓 校徽：${det.label}（${det.school_name}）\\n\\n`;
+                            result.appendChild(box);
+                            boxes[det.label] = box;
+                        }
+                    } else if (event === "llm_delta") {
+                        boxes[data.label].textContent += data.delta;
+                    } else if (event === "llm_error") {
+                        boxes[data.label].textContent += `\\n⚠️ 识别失败：${data.message}`;
+                    } else if (event === "error") {
+                        result.innerHTML = `<p>⚠️ ${data.message}</p>`;
+                    }
+                };
+                while (true) {
+                    const {value, done} = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, {stream: true});
+                    let idx;
+                    while ((idx = buffer.indexOf("\\n\\n")) >= 0) {
+                        const chunk = buffer.slice(0, idx);
+                        buffer = buffer.slice(idx + 2);
+                        let event = "message", data = "";
+                        for (const line of chunk.split("\\n")) {
+                            if (line.startsWith("event: ")) event = line.slice(7);
+                            else if (line.startsWith("data: ")) data += line.slice(6);
+                        }
+                        if (data) handle(event, JSON.parse(data));
+                    }
+                }
+            });
+        </script>
         <footer>
             &copy; 2025 Zening Li & 中国最强大学识别项目
         </footer>
@@ -153,16 +387,21 @@ def home():
 
 @web_app.post("/upload", response_class=HTMLResponse)
 async def upload(file: UploadFile = File(...)):
-    upload_path = "uploaded_image.jpg"
-    with open(upload_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 解码、标注、编码与混元查询都放到线程池，YOLO 推理交给批处理线程，事件循环不被阻塞
+    with metrics.stage("read"):
+        data = await file.read()
+    outcome = (await detect_uploads([data]))[0]
+    if outcome is None:
+        return HTMLResponse("<h3>⚠️ 无法解析上传的图片，请选择 JPG/PNG 文件</h3><a href='/'>🔙 返回上传页面</a>",
+                            status_code=400)
 
-    annotated, descriptions = detect_logos(upload_path)
-    annotated_path = "web_output.jpg"
-    cv2.imwrite(annotated_path, annotated)
+    digest = outcome.digest
+    with metrics.stage("llm"):
+        descriptions = await run_in_threadpool(describe_logos, outcome.detections)
 
     desc_html = "".join([
-        f"<div class='desc-box'><pre>{d}</pre></div>" for d in descriptions
+        f"<div class='desc-box'><h4>\U0001F393 校徽：{html.escape(label)}</h4>{record.html()}</div>"
+        for label, record in descriptions.items()
     ])
 
     return f"""
@@ -199,6 +438,24 @@ async def upload(file: UploadFile = File(...)):
                 border-radius: 5px;
                 white-space: pre-wrap;
             }}
+            .school-info {{
+                border-collapse: collapse;
+                margin-bottom: 10px;
+                white-space: normal;
+            }}
+            .school-info th {{
+                text-align: left;
+                padding: 4px 16px 4px 0;
+                color: #555;
+                white-space: nowrap;
+            }}
+            .school-info a, .school-info a:hover {{
+                display: inline;
+                margin: 0;
+                padding: 0;
+                background: none;
+                color: #2980b9;
+            }}
             a {{
                 display: inline-block;
                 margin-top: 30px;
@@ -216,13 +473,145 @@ async def upload(file: UploadFile = File(...)):
     </head>
     <body>
         <h3>🎓 识别结果如下：</h3>
-        <img src='/static/{annotated_path}' alt="识别结果图像">
+        <img src='/result/{digest}.jpg' alt="识别结果图像">
         {desc_html}
         <br><a href="/">🔙 返回上传页面</a>
     </body>
     </html>
     """
 
+@web_app.post("/api/detect")
+async def api_detect(
+    files: list[UploadFile] = File(...),
+    with_llm: bool = Query(False, description="是否附带混元介绍"),
+    annotate: bool = Query(False, description="是否返回标注结果图片链接"),
+):
+    """
+    批量检测接口：一次上传多张图片，合并为批次推理，按图片返回结构化 JSON。
+    """
+    with metrics.stage("read"):
+        datas = [await f.read() for f in files]
+    outcomes = await detect_uploads(datas, annotate=annotate)
+
+    answers = {}
+    if with_llm:
+        # 整个批次内的校徽统一去重后并发查询
+        names = get_model().names
+        labels = [names[int(c)] for o in outcomes if o is not None for c in o.detections.class_id]
+        with metrics.stage("llm"):
+            answers = await run_in_threadpool(school_kb.lookup_many, labels, "web")
+
+    results = []
+    for upload_file, outcome in zip(files, outcomes):
+        item = {"filename": upload_file.filename}
+        if outcome is None:
+            item["error"] = "无法解析图片"
+            results.append(item)
+            continue
+
+        item["width"] = outcome.width
+        item["height"] = outcome.height
+        item["cached"] = outcome.cached
+        item["detections"] = detections_to_json(outcome.detections)
+
+        if with_llm:
+            item["descriptions"] = {}
+            for det in item["detections"]:
+                record = answers.get(det["label"])
+                if record is not None:
+                    item["descriptions"][det["label"]] = {"text": record.text(), "record": record.to_json()}
+
+        if annotate:
+            item["result_url"] = f"/result/{outcome.digest}.jpg"
+
+        results.append(item)
+
+    return {"count": len(results), "results": results}
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@web_app.post("/api/stream")
+async def api_stream(request: Request, file: UploadFile = File(...)):
+    """
+    流式识别接口（Server-Sent Events）：先推送标注图片与检测结果，
+    再按校徽逐段推送学校介绍（知识库已收录的学校一次推送全文），llm_done 附带结构化记录。
+    事件类型：detections、llm_delta、llm_done、llm_error、done。
+    客户端断开后不再转发，后台的流式查询也随之停止。
+    """
+    with metrics.stage("read"):
+        data = await file.read()
+    outcome = (await detect_uploads([data]))[0]
+    if outcome is None:
+        return Response(content=sse_event("error", {"message": "无法解析图片"}),
+                        media_type="text/event-stream", status_code=400)
+
+    digest = outcome.digest
+    items = detections_to_json(outcome.detections)
+
+    async def event_stream():
+        yield sse_event("detections", {"result_url": f"/result/{digest}.jpg", "detections": items})
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        labels = list(dict.fromkeys(item["label"] for item in items))
+        cancelled = threading.Event()
+
+        def pump(school_label):
+            # 在混元线程池中消费流式回答，通过事件循环转发给客户端；客户端断开后尽快退出，释放线程
+            def put(event, payload):
+                loop.call_soon_threadsafe(queue.put_nowait, (event, payload))
+            if cancelled.is_set():
+                return
+            try:
+                record = None
+                for item in school_kb.stream_lookup(school_label, variant="web"):
+                    if cancelled.is_set():
+                        return
+                    if isinstance(item, school_kb.SchoolRecord):
+                        record = item
+                    else:
+                        put("llm_delta", {"label": school_label, "delta": item})
+                put("llm_done", {"label": school_label, "record": record.to_json() if record else None})
+            except Exception as e:
+                put("llm_error", {"label": school_label, "message": str(e)})
+
+        for school_label in labels:
+            loop.run_in_executor(hunyuan_api.get_executor(), pump, school_label)
+
+        try:
+            remaining = len(labels)
+            while remaining:
+                try:
+                    # 等待期间每秒检查一次连接，长时间没有新内容时也能发现客户端已断开
+                    event, payload = await asyncio.wait_for(queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    continue
+                if event in ("llm_done", "llm_error"):
+                    remaining -= 1
+                yield sse_event(event, payload)
+
+            yield sse_event("done", {})
+        finally:
+            cancelled.set()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@web_app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@web_app.get("/result/{digest}.jpg")
+def result_image(digest: str):
+    data = result_store.get(digest)
+    if data is None:
+        return Response(status_code=404)
+    return Response(content=data, media_type="image/jpeg",
+                    headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 @app.command()
 def run_web():
     typer.echo("启动 Web UI...")
@@ -1,19 +1,15 @@
 # -*- coding: utf-8 -*-
 
-import cv2
-import json
-import numpy as np
+# 这里只导入轻量模块；cv2、supervision、ultralytics、requests、FastAPI 等
+# 重依赖在各子命令内部按需导入，保证 --help 与图形界面启动足够快
 import typer
-import supervision as sv
-from PIL import Image
-from io import BytesIO
-import requests
-from bs4 import BeautifulSoup
+from typing import Annotated, Optional
 from zidian_uni import LABEL_TO_SCHOOL_NAME
-import web_service
-from ultralytics import YOLO
-from tencentcloud.common import credential
-from tencentcloud.hunyuan.v20230901 import hunyuan_client, models
+from model_registry import get_model
+import settings
+import metrics
+import school_kb
+import os
 import sys
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -28,62 +24,52 @@ def safe_print(s):
     except Exception:
         print(s)
 
-# 初始化 YOLO 模型
-# yolo_model = YOLO("./runs/detect/school_logo_yolov125/weights/best.pt")
-yolo_model = YOLO("./runs/train/school_logo_yolov124/weights/best.pt")
-
-def ask_hunyuan(school_abbr: str):
-    school_name = LABEL_TO_SCHOOL_NAME.get(school_abbr.lower(), school_abbr)
-
-    prompt_text = f"""
-        你是一个大学信息查询助手。请根据提供的大学名称“{school_name}”返回如下结构化信息：
-        - 学校名（中文）
-        - 所属国家
-        - QS 世界大学排名（若无请写“无”）
-        - 软科大学排名
-        - 官网链接
-        
-        请严格按如下格式输出：
-        学校名：...
-        国家：...
-        QS排名：...
-        软科排名：...
-        官网链接：...
-        
-        此外，还请给出这个学校的相关百科、今年来的获得奖项、杰出校友，
-        并请你查询后给出该大学近年高考浙江省投档线分数；
-        
-        最后，请配上几句你对这个大学的评价。
-        """
-
-    cred = credential.Credential("sdkid", "sdkmima")
-    client = hunyuan_client.HunyuanClient(cred, "ap-guangzhou")
-
-    req = models.ChatCompletionsRequest()
-    params = {
-        "Messages": [{"Role": "user", "Content": prompt_text}],
-        "Model": "hunyuan-pro",
-        "Temperature": 0.7
-    }
-    req.from_json_string(json.dumps(params))
-
-    resp = client.ChatCompletions(req)
-    return resp.Choices[0].Message.Content
+# YOLO 模型由 model_registry 在首次使用时加载，权重路径见 settings.MODEL_WEIGHTS
+# （旧权重：./runs/detect/school_logo_yolov125/weights/best.pt）
+
+def echo_answers(answers):
+    # answers 为 school_kb.lookup_many 的返回值：{标签: SchoolRecord}，大模型不可用时为本地资料生成的记录
+    for record in answers.values():
+        typer.echo("识别结果：")
+        typer.echo(str(record))
 
 
 @app.command()
-def detect_camera():
+def detect_camera(
+    detect_every: Annotated[int, typer.Option(help="每隔多少帧运行一次检测，其余帧由跟踪器外推检测框")] = 3,
+    tracks_out: Annotated[Optional[str], typer.Option(help="退出时导出轨迹（.json 或 .csv）")] = None,
+    scene_gate: Annotated[bool, typer.Option(help="画面基本不变时跳过检测")] = True,
+    scene_threshold: Annotated[Optional[float], typer.Option(help="画面变化阈值（0~1），默认取 settings.SCENE_CHANGE_THRESHOLD")] = None,
+    continuous: Annotated[bool, typer.Option("--continuous", help="展台模式：持续识别，不在第一次识别后退出")] = False,
+    cooldown: Annotated[Optional[float], typer.Option(help="同一校徽两次查询混元的最短间隔（秒），默认取 settings.CAMERA_LABEL_COOLDOWN")] = None,
+    tile: Annotated[bool, typer.Option("--tile", help="在摄像头原始分辨率上分块检测，远处的小校徽也能识别（更慢）")] = False,
+):
+    import time
+    import cv2
+    import supervision as sv
+    from background_lookup import BackgroundLookup, draw_info_panel, summary_lines
+    from scene_gate import SceneChangeGate
+    from tiling import tiled
+    from tracking import LogoTracker
+
     typer.echo("启动摄像头，检测大学校徽...")
+    yolo_model = tiled(get_model(), "on") if tile else get_model()
     cap = cv2.VideoCapture(0)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
     target_width, target_height = 840, 440
-    frame_rate = 10
+    detect_every = max(1, detect_every)
 
     bounding_box_annotator = sv.BoxAnnotator()
     label_annotator = sv.LabelAnnotator()
+    tracker = LogoTracker(yolo_model.names, detect_interval=detect_every,
+                          fps=cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    gate = SceneChangeGate(threshold=scene_threshold) if scene_gate else None
+    # 混元查询在后台线程池中进行，采集与检测循环不等待
+    lookup = BackgroundLookup(cooldown=cooldown)
     frame_count = 0
     detected = False
+    start = time.monotonic()
 
     while True:
         ret, frame = cap.read()
@@ -92,188 +78,575 @@ def detect_camera():
             break
 
         resized_frame = cv2.resize(frame, (target_width, target_height))
-        results = yolo_model(resized_frame)[0]
-        detections = sv.Detections.from_ultralytics(results)
+        ran_detector = frame_count % detect_every == 0
+        if ran_detector and gate is not None:
+            ran_detector = gate.should_infer(resized_frame, frame_count)
+        if ran_detector:
+            if tile:
+                # 原始帧分块检测后，把检测框缩放到显示尺寸
+                detections = yolo_model.detect(frame)
+                scale_x, scale_y = target_width / frame.shape[1], target_height / frame.shape[0]
+                detections.xyxy = detections.xyxy * [scale_x, scale_y, scale_x, scale_y]
+            else:
+                detections = yolo_model.detect(resized_frame)
+            detections = tracker.update(detections, frame_count, time.monotonic() - start)
+        else:
+            detections = tracker.predict(frame_count)
+
+        if detections is not None:
+            annotated_frame = bounding_box_annotator.annotate(scene=resized_frame, detections=detections)
+            annotated_frame = label_annotator.annotate(scene=annotated_frame, detections=detections,
+                                                       labels=tracker.labels(detections))
+        else:
+            annotated_frame = resized_frame
+
+        if ran_detector and len(detections) > 0:
+            for class_id in dict.fromkeys(int(c) for c in detections.class_id):
+                school_label = yolo_model.names[class_id]
+                if lookup.request(school_label):
+                    typer.echo(f"检测到校徽：{school_label}，准备识别...")
+
+        for school_label, result in lookup.poll():
+            if isinstance(result, Exception):
+                typer.echo(f"识别失败：{result}")
+            else:
+                echo_answers({school_label: result})
+            detected = True
 
-        annotated_frame = bounding_box_annotator.annotate(scene=resized_frame, detections=detections)
-        annotated_frame = label_annotator.annotate(scene=annotated_frame, detections=detections)
+        # 画面上叠加当前可见校徽的识别结果
+        if detections is not None and len(detections) > 0:
+            visible = dict.fromkeys(yolo_model.names[int(c)] for c in detections.class_id)
+            lines = []
+            for school_label in visible:
+                if school_label in lookup.results:
+                    lines += summary_lines(school_label, lookup.results[school_label])
+            annotated_frame = draw_info_panel(annotated_frame, lines)
         cv2.imshow("摄像头校徽识别", annotated_frame)
 
-        if frame_count % frame_rate == 0 and len(detections) > 0 and not detected:
-            for i in range(len(detections)):
-                class_id = int(detections.class_id[i])
-                school_label = yolo_model.model.names[class_id]
-                typer.echo(f"检测到校徽：{school_label}，准备识别...")
-
-                try:
-                    result = ask_hunyuan(school_label)
-                    typer.echo("识别结果：")
-                    typer.echo(result)
-                except Exception as e:
-                    typer.echo(f"识别失败：{str(e)}")
-
-            detected = True
-
         frame_count += 1
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             typer.echo("用户请求退出摄像头识别。")
             break
 
-        if detected:
+        if detected and not continuous and not lookup.busy:
             typer.echo("识别完成，关闭摄像头。")
             break
 
     cap.release()
     cv2.destroyAllWindows()
 
+    if gate is not None:
+        stats = gate.stats()
+        typer.echo(f"画面变化门控：计划检测 {stats['checked']} 次，跳过 {stats['skipped']} 次（{stats['skip_rate']:.0%}）")
+
+    if tracks_out:
+        tracker.export(tracks_out)
+        typer.echo(f"轨迹已导出：{tracks_out}")
+
+
+def echo_timings(timings):
+    typer.echo("各阶段耗时：" + "，".join(f"{name} {ms:.1f}ms" for name, ms in metrics.summarize(timings).items()))
 
 @app.command()
-def detect_image(path: str):
+def detect_image(
+    path: str,
+    timing: Annotated[bool, typer.Option(help="打印读图、推理、标注、混元查询各阶段耗时")] = False,
+    tile: Annotated[bool, typer.Option(help="大图分块检测小校徽（按 settings.TILE_AUTO_RATIO 自动判断）")] = True,
+):
+    import glob
+    import cv2
+    import supervision as sv
+    from tiling import tiled
+
+    # 目录或通配符交给批量检测
+    if os.path.isdir(path) or glob.has_magic(path):
+        return detect_batch([path], timing=timing)
+
     typer.echo(f"识别图像文件: {path}")
-    image = cv2.imread(path)
-    results = yolo_model(image)[0]
-    detections = sv.Detections.from_ultralytics(results)
+    yolo_model = tiled(get_model(), "auto") if tile else get_model()
+    with metrics.collect_timings() as timings:
+        with metrics.stage("decode"):
+            image = cv2.imread(path)
+        with metrics.stage("infer"):
+            detections = yolo_model.detect(image)
 
-    annotated_image = sv.BoxAnnotator().annotate(scene=image, detections=detections)
-    annotated_image = sv.LabelAnnotator().annotate(scene=annotated_image, detections=detections)
+        with metrics.stage("annotate"):
+            annotated_image = sv.BoxAnnotator().annotate(scene=image, detections=detections)
+            annotated_image = sv.LabelAnnotator().annotate(scene=annotated_image, detections=detections)
 
     cv2.imshow("图像识别结果", annotated_image)
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
+    school_labels = []
     for i in range(len(detections)):
         x1, y1, x2, y2 = map(int, detections.xyxy[i])
         cropped = image[y1:y2, x1:x2]
         temp_path = f"image_logo_{i}.jpg"
         cv2.imwrite(temp_path, cropped)
         class_id = int(detections.class_id[i])
-        school_label = yolo_model.model.names[class_id]
-        try:
-            result = ask_hunyuan(school_label)
-            typer.echo("识别结果：")
-            typer.echo(result)
-        except Exception as e:
-            typer.echo(f"识别失败：{str(e)}")
+        school_labels.append(yolo_model.names[class_id])
+
+    with metrics.collect_timings() as llm_timings, metrics.stage("llm"):
+        answers = school_kb.lookup_many(school_labels, variant="cli")
+    echo_answers(answers)
+    if timing:
+        echo_timings(timings + llm_timings)
+
+@app.command()
+def detect_batch(
+    sources: Annotated[list[str], typer.Argument(help="图片目录、通配符（如 \"imgs/**/*.jpg\"）、图片文件或 @文件列表")],
+    output: Annotated[str, typer.Option(help="结果 JSONL 文件")] = "results.jsonl",
+    annotate_dir: Annotated[Optional[str], typer.Option(help="保存标注图片的目录（仅保存检测到校徽的图片）")] = None,
+    batch_size: Annotated[Optional[int], typer.Option(help="推理批大小，默认根据机器自动选择")] = None,
+    workers: Annotated[Optional[int], typer.Option(help="解码进程数，默认 CPU 核数减一")] = None,
+    resume: Annotated[bool, typer.Option(help="跳过输出文件中已成功处理的图片（失败的重新处理），继续上次中断的任务")] = True,
+    recursive: Annotated[bool, typer.Option(help="递归遍历子目录")] = True,
+    timing: Annotated[bool, typer.Option(help="结束时打印缓存查询、推理、标注、写出各阶段累计耗时")] = False,
+    tile: Annotated[bool, typer.Option("--tile", help="大图分块检测小校徽（更慢），默认按 settings.TILE_MODE")] = False,
+):
+    """
+    无窗口批量检测图片，结果逐行写入 JSONL，可中断续跑。
+    """
+    from batch_images import run_batch
+    from tiling import tiled
+    from detection_cache import get_detection_cache
+
+    tile_mode = "auto" if tile else settings.TILE_MODE
+    with metrics.collect_timings() as timings:
+        stats = run_batch(sources, output, tiled(get_model(), tile_mode), annotate_dir=annotate_dir,
+                          batch_size=batch_size, workers=workers, resume=resume, recursive=recursive,
+                          cache=get_detection_cache(tile_mode), progress=typer.echo)
+    typer.echo(f"完成：处理 {stats['images']} 张（缓存命中 {stats['cached']}，失败 {stats['errors']}，"
+               f"跳过 {stats['skipped']}），检测到 {stats['detections']} 个校徽，"
+               f"耗时 {stats['elapsed_seconds']}s，{stats['images_per_second']} 张/s")
+    typer.echo(f"结果已写入：{output}")
+    if timing:
+        echo_timings(timings)
+    return stats
 
 @app.command()
-def detect_video(video_path: str):
+def detect_video(
+    video_path: str,
+    stride: Annotated[int, typer.Option(help="每隔多少帧做一次检测")] = 10,
+    headless: Annotated[bool, typer.Option("--headless", help="不显示窗口，跳过的帧只 grab 不解码，适合批量处理")] = False,
+    display_width: Annotated[int, typer.Option(help="显示窗口宽度")] = 1200,
+    track: Annotated[bool, typer.Option(help="使用 ByteTrack 跟踪校徽，检测帧之间外推检测框")] = True,
+    tracks_out: Annotated[Optional[str], typer.Option(help="导出每条轨迹的首次/最后出现时间（.json 或 .csv）")] = None,
+    scene_gate: Annotated[bool, typer.Option(help="画面基本不变时跳过检测")] = True,
+    scene_threshold: Annotated[Optional[float], typer.Option(help="画面变化阈值（0~1），默认取 settings.SCENE_CHANGE_THRESHOLD")] = None,
+    tile: Annotated[bool, typer.Option("--tile", help="高分辨率视频分块检测小校徽（按 settings.TILE_AUTO_RATIO 自动判断，更慢）")] = False,
+):
+    import glob
+    from scene_gate import SceneChangeGate
+    from tiling import tiled
+    from video_pipeline import VideoEngine
+
+    # 目录或通配符交给多进程批量处理
+    if os.path.isdir(video_path) or glob.has_magic(video_path):
+        return detect_video_batch([video_path], stride=stride, track=track, scene_gate=scene_gate,
+                                  scene_threshold=scene_threshold, tile=tile)
+
     typer.echo(f"打开视频并实时检测：{video_path}")
-    cap = cv2.VideoCapture(video_path)
-    frame_rate = 10  # 每10帧检测一次
-    frame_count = 0
-    seen_schools = set()
-    last_detections = None  # 保存上一轮的检测结果
+    yolo_model = tiled(get_model(), "auto") if tile else get_model()
+    engine = VideoEngine(video_path, model=yolo_model, stride=stride, display=not headless,
+                         display_width=display_width, track=track,
+                         scene_gate=SceneChangeGate(threshold=scene_threshold) if scene_gate else None)
+    summary = engine.run()
 
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
+    typer.echo("\n识别到的学校Logo有：")
+    for school, first_seen in summary["schools"].items():
+        instances = summary["instances"].get(school)
+        suffix = f"，共 {instances} 个实例" if instances else ""
+        typer.echo(f"- {school}（首次出现于 {first_seen:.1f}s{suffix}）")
+
+    if tracks_out and engine.tracker is not None:
+        engine.tracker.export(tracks_out)
+        typer.echo(f"轨迹已导出：{tracks_out}")
+
+    typer.echo(f"\n共读取 {summary['frames_read']} 帧，检测 {summary['frames_inferred']} 帧，"
+               f"耗时 {summary['elapsed_seconds']}s，处理速度 {summary['processing_fps']} 帧/s"
+               f"（{summary['realtime_factor']} 倍实时）")
+    if summary["scene_gate"]:
+        typer.echo(f"画面变化门控跳过了 {summary['scene_gate']['skipped']} 次检测"
+                   f"（{summary['scene_gate']['skip_rate']:.0%}）")
+    return summary
 
-        display_frame = frame.copy()
+@app.command()
+def detect_video_batch(
+    sources: Annotated[list[str], typer.Argument(help="视频目录、通配符（如 \"videos/**/*.mp4\"）、视频文件或 @文件列表")],
+    workers: Annotated[Optional[int], typer.Option(help="同时处理的视频数，默认根据 CPU 核数自动选择")] = None,
+    threads: Annotated[Optional[int], typer.Option(help="每个工作进程的 torch 线程数，默认 CPU 核数平均分配")] = None,
+    stride: Annotated[int, typer.Option(help="每隔多少帧做一次检测")] = 10,
+    track: Annotated[bool, typer.Option(help="使用 ByteTrack 统计每个学校的校徽实例数")] = True,
+    scene_gate: Annotated[bool, typer.Option(help="画面基本不变时跳过检测")] = True,
+    scene_threshold: Annotated[Optional[float], typer.Option(help="画面变化阈值（0~1），默认取 settings.SCENE_CHANGE_THRESHOLD")] = None,
+    tracks_dir: Annotated[Optional[str], typer.Option(help="每个视频的轨迹导出目录（每个视频一个 .json，文件名为 视频名-路径摘要.json）")] = None,
+    tile: Annotated[bool, typer.Option("--tile", help="高分辨率视频分块检测小校徽（更慢）")] = False,
+    report: Annotated[Optional[str], typer.Option(help="把每个视频的统计和汇总报告保存为 JSON 文件")] = None,
+    recursive: Annotated[bool, typer.Option(help="递归遍历子目录")] = True,
+):
+    """
+    多进程批量处理视频（无窗口），输出每个视频的学校统计和整体吞吐量。
+    """
+    from batch_video import run_batch_videos
+
+    result = run_batch_videos(sources, workers=workers, threads=threads, stride=stride, track=track,
+                              scene_gate=scene_gate, scene_threshold=scene_threshold,
+                              tracks_dir=tracks_dir, recursive=recursive, tile=tile, progress=typer.echo)
+
+    for summary in result["videos"]:
+        if "error" in summary:
+            continue
+        typer.echo(f"\n{summary['source']}（{summary['frames_read']} 帧，检测 {summary['frames_inferred']} 帧）")
+        for school, first_seen in summary["schools"].items():
+            instances = summary["instances"].get(school)
+            suffix = f"，共 {instances} 个实例" if instances else ""
+            typer.echo(f"- {school}（首次出现于 {first_seen:.1f}s{suffix}）")
+
+    total = result["aggregate"]
+    typer.echo(f"\n共 {total['videos']} 个视频（失败 {total['failed']}），{total['frames_read']} 帧，"
+               f"视频时长 {total['video_seconds']}s，耗时 {total['wall_seconds']}s")
+    typer.echo(f"整体处理速度 {total['processing_fps']} 帧/s（{total['realtime_factor']} 倍实时，"
+               f"并行度 {total['parallelism']}，{total['workers']} 进程 × {total['threads_per_worker']} 线程）")
+    if report:
+        import json
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        typer.echo(f"报告已保存：{report}")
+    return result
 
-        if frame_count % frame_rate == 0:
-            results = yolo_model(frame)[0]
-            last_detections = sv.Detections.from_ultralytics(results)
+@app.command()
+def detect_url_images(
+    url: str,
+    concurrency: Annotated[Optional[int], typer.Option(help="并发下载数，默认取 settings.URL_DOWNLOAD_WORKERS")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option(help="单张图片大小上限（字节）")] = None,
+    timeout: Annotated[Optional[float], typer.Option(help="单张图片下载耗时上限（秒）")] = None,
+    tile: Annotated[bool, typer.Option("--tile", help="大图分块检测小校徽（更慢），默认按 settings.TILE_MODE")] = False,
+):
+    """
+    从网页中提取所有图片进行大学Logo识别和混元信息查询。
+    """
+    import requests
+    from detection_cache import get_detection_cache
+    from url_pipeline import HEADERS, UrlImagePipeline, extract_image_urls
+    from tiling import tiled
 
-            for i in range(len(last_detections)):
-                class_id = int(last_detections.class_id[i])
-                school_label = yolo_model.model.names[class_id]
-                seen_schools.add(school_label)
+    typer.echo(f"开始提取网页图片：{url}")
 
-        # 始终使用最近一次的检测框来标注
-        if last_detections is not None:
-            bbox_annotator = sv.BoxAnnotator()
-            label_annotator = sv.LabelAnnotator()
-            display_frame = bbox_annotator.annotate(scene=display_frame, detections=last_detections)
-            display_frame = label_annotator.annotate(scene=display_frame, detections=last_detections)
+    try:
+        response = requests.get(url, headers=HEADERS, timeout=10)
+        img_urls = extract_image_urls(url, response.content)
+    except Exception as e:
+        typer.echo(f"网页加载失败：{str(e)}")
+        return
+
+    typer.echo(f"共提取到 {len(img_urls)} 张图片，开始识别...")
+    tile_mode = "auto" if tile else settings.TILE_MODE
+    yolo_model = tiled(get_model(), tile_mode)
+    pipeline = UrlImagePipeline(yolo_model, concurrency=concurrency, max_bytes=max_bytes, timeout=timeout,
+                                cache=get_detection_cache(tile_mode))
+
+    # 下载、解码、推理流水线并行进行，结果按完成顺序输出
+    school_labels = []
+    for done, item in enumerate(pipeline.run(img_urls), start=1):
+        typer.echo(f"\n[{done}/{len(img_urls)}] 处理图片：{item.url}")
+        if item.error is not None:
+            typer.echo(item.error)
+            continue
+
+        if item.cached:
+            typer.echo("（命中检测缓存）")
+        if len(item.detections) == 0:
+            typer.echo("未检测到大学Logo")
+            continue
+
+        for class_id in item.detections.class_id:
+            school_label = yolo_model.names[int(class_id)]
+            typer.echo(f"检测到大学：{school_label}")
+            school_labels.append(school_label)
+
+    # 整个网页中出现的学校统一去重后并发查询混元
+    if school_labels:
+        typer.echo("\n查询学校资料...")
+        echo_answers(school_kb.lookup_many(school_labels, variant="cli"))
+
+    stats = pipeline.stats()
+    typer.echo(f"\n流水线耗时 {stats['wall_seconds']}s："
+               f"下载 {stats['download']['items_per_second']} 张/s（{stats['download']['bytes'] / 1e6:.1f} MB），"
+               f"解码 {stats['decode']['items_per_second']} 张/s，"
+               f"推理 {stats['infer']['items_per_second']} 张/s，"
+               f"缓存命中率 {stats['cache']['hit_rate']:.0%}")
 
-        # 缩放窗口大小（宽度缩放为800）
-        display_frame = cv2.resize(display_frame, (1200, int(display_frame.shape[0] * 1200 / display_frame.shape[1])))
+@app.command()
+def export(
+    weights: Annotated[Optional[str], typer.Option(help="PyTorch 权重，默认取 settings.MODEL_WEIGHTS")] = None,
+    format: Annotated[str, typer.Option(help="导出格式：onnx 或 openvino")] = "onnx",
+    imgsz: Annotated[Optional[int], typer.Option(help="导出的输入尺寸，默认取 settings.MODEL_IMGSZ")] = None,
+    dynamic: Annotated[bool, typer.Option(help="导出动态 batch / 尺寸，便于批量推理")] = False,
+    half: Annotated[bool, typer.Option(help="导出 FP16 模型（仅 GPU 推理有收益）")] = False,
+    check: Annotated[Optional[str], typer.Option(help="导出后在该目录（或通配符）的图片上与 PyTorch 结果对比")] = None,
+):
+    """
+    导出 ONNX / OpenVINO 模型，供 CPU 主机通过 onnxruntime / OpenVINO 推理。
+    """
+    from inference_backend import export_model
 
-        cv2.imshow("Logo Detection", display_frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    weights = weights or settings.MODEL_WEIGHTS
+    typer.echo(f"导出模型：{weights} -> {format}")
+    path = export_model(weights, fmt=format, imgsz=imgsz, dynamic=dynamic, half=half)
+    typer.echo(f"已导出：{path}")
+    typer.echo(f"使用方式：设置环境变量 UNI_LOGO_MODEL_WEIGHTS={path}，所有检测命令与网页服务会自动切换后端")
+    if check:
+        return check_backend(check, candidate=str(path), reference=weights)
+    return path
 
-        frame_count += 1
+@app.command()
+def check_backend(
+    images: Annotated[str, typer.Argument(help="用于对比的图片目录、通配符或 @文件列表")],
+    candidate: Annotated[str, typer.Option(help="待验证的导出模型（.onnx 或 *_openvino_model 目录）")],
+    reference: Annotated[Optional[str], typer.Option(help="参考的 PyTorch 权重，默认取 settings.MODEL_WEIGHTS")] = None,
+    limit: Annotated[int, typer.Option(help="最多对比的图片数")] = 50,
+    iou: Annotated[float, typer.Option(help="同一目标两个检测框的最低 IoU")] = 0.9,
+    conf_tolerance: Annotated[float, typer.Option(help="同一目标置信度允许的最大差值")] = 0.05,
+):
+    """
+    对比导出模型与 PyTorch 模型在同一批图片上的检测结果和推理耗时。
+    """
+    import cv2
+    from batch_images import expand_sources
+    from inference_backend import compare_backends, load_backend
+
+    paths = expand_sources([images])[:limit]
+    frames = [image for image in (cv2.imread(p) for p in paths) if image is not None]
+    if not frames:
+        typer.echo("没有可用于对比的图片")
+        raise typer.Exit(1)
+
+    reference_backend = load_backend(reference or settings.MODEL_WEIGHTS, "torch")
+    candidate_backend = load_backend(candidate)
+    report = compare_backends(reference_backend, candidate_backend, frames, iou_threshold=iou,
+                              conf_tolerance=conf_tolerance)
+
+    for row in report["images"]:
+        if not row["ok"]:
+            typer.echo(f"不一致：{paths[row['index']]}（参考 {row['reference']} 个，"
+                       f"待验证 {row['candidate']} 个，匹配 {row['matched']} 个）")
+    matched = sum(row["ok"] for row in report["images"])
+    typer.echo(f"{matched}/{len(report['images'])} 张图片结果一致；平均耗时："
+               f"{reference_backend.name} {report['latency_ms']['reference']}ms，"
+               f"{candidate_backend.name} {report['latency_ms']['candidate']}ms")
+    if not report["match"]:
+        raise typer.Exit(1)
+    return report
+
+def echo_quant_report(report, max_drop):
+    summary = report["summary"]
+    typer.echo(f"\n验证集 {report['split']}（{report['images']} 张）  FP32 -> INT8")
+    for row in report["per_class"]:
+        typer.echo(f"- {row['label']}（{row['school_name'] or '未知'}，{row['instances']} 个目标）："
+                   f"AP50 {row['ap50'][0]:.3f} -> {row['ap50'][1]:.3f}，"
+                   f"AP50-95 {row['ap50_95'][0]:.3f} -> {row['ap50_95'][1]:.3f}")
+    typer.echo(f"mAP50 {summary['map50'][0]:.3f} -> {summary['map50'][1]:.3f}，"
+               f"mAP50-95 {summary['map50_95'][0]:.3f} -> {summary['map50_95'][1]:.3f}")
+    memory = [f"{v}MB" if v is not None else "未知" for v in summary["memory_mb"]]
+    typer.echo(f"平均耗时 {summary['latency_ms'][0]['mean']}ms -> {summary['latency_ms'][1]['mean']}ms"
+               f"（{summary['speedup']} 倍），峰值内存增量 {memory[0]} -> {memory[1]}，"
+               f"模型大小 {summary['model_size_mb'][0]}MB -> {summary['model_size_mb'][1]}MB")
+
+    worst = [row for row in report["per_class"] if row["ap50_drop"] > max_drop]
+    for row in worst:
+        typer.echo(f"⚠️ {row['label']} 的 AP50 下降 {row['ap50_drop']:.3f}，超过允许的 {max_drop}")
+    return not worst
 
-    cap.release()
-    cv2.destroyAllWindows()
+@app.command()
+def quantize(
+    data: Annotated[str, typer.Option(help="训练时使用的 data.yaml，校准图片取自 train，验证取自 val")] = "data.yaml",
+    weights: Annotated[Optional[str], typer.Option(help="FP32 权重（.pt 或 .onnx），默认取 settings.MODEL_WEIGHTS")] = None,
+    method: Annotated[str, typer.Option(help="量化方式：static（校准）、dynamic（仅权重）、openvino（NNCF）")] = "static",
+    output: Annotated[Optional[str], typer.Option(help="量化模型输出路径，默认在权重旁生成 *_int8.onnx")] = None,
+    calib_images: Annotated[int, typer.Option(help="校准图片数量")] = 200,
+    val_limit: Annotated[int, typer.Option(help="验证图片数量上限，0 表示全部")] = 0,
+    report: Annotated[Optional[str], typer.Option(help="把对比报告保存为 JSON 文件")] = "quant_report.json",
+    max_drop: Annotated[float, typer.Option(help="任一学校 AP50 允许下降的最大值，超过则返回非零退出码")] = 0.02,
+    validate: Annotated[bool, typer.Option(help="量化后在验证集上与 FP32 模型对比")] = True,
+):
+    """
+    生成 INT8 量化模型，并按学校输出与 FP32 模型的精度、耗时、内存对比报告。
+    """
+    from quantization import quantize_model
+
+    weights = weights or settings.MODEL_WEIGHTS
+    path = quantize_model(weights, data, method=method, output=output, calib_images=calib_images,
+                          progress=typer.echo)
+    typer.echo(f"量化模型已生成：{path}")
+    if os.path.abspath(path) != os.path.abspath(settings.MODEL_INT8_WEIGHTS):
+        typer.echo(f"运行时切换：设置 UNI_LOGO_MODEL_INT8_WEIGHTS={path} 与 UNI_LOGO_MODEL_PRECISION=int8")
+    else:
+        typer.echo("运行时切换：设置 UNI_LOGO_MODEL_PRECISION=int8")
+    if validate:
+        return quant_report(path, data=data, reference=weights, split="val", limit=val_limit,
+                            output=report, max_drop=max_drop)
+    return path
 
-    typer.echo("\n识别到的学校Logo有：")
-    for school in seen_schools:
-        typer.echo(f"- {school}")
+@app.command()
+def quant_report(
+    candidate: Annotated[str, typer.Argument(help="量化模型（.onnx 或 OpenVINO 目录）")],
+    data: Annotated[str, typer.Option(help="data.yaml")] = "data.yaml",
+    reference: Annotated[Optional[str], typer.Option(help="FP32 参考权重，默认取 settings.MODEL_WEIGHTS")] = None,
+    split: Annotated[str, typer.Option(help="使用的数据集划分")] = "val",
+    limit: Annotated[int, typer.Option(help="验证图片数量上限，0 表示全部")] = 0,
+    output: Annotated[Optional[str], typer.Option(help="把对比报告保存为 JSON 文件")] = "quant_report.json",
+    max_drop: Annotated[float, typer.Option(help="任一学校 AP50 允许下降的最大值，超过则返回非零退出码")] = 0.02,
+):
+    """
+    对比量化模型与 FP32 模型：每个学校的 AP50 / AP50-95、推理耗时、内存与模型大小。
+    """
+    import json
+    from quantization import quantization_report
+
+    result = quantization_report(reference or settings.MODEL_WEIGHTS, candidate, data, split=split,
+                                 limit=limit, progress=typer.echo)
+    ok = echo_quant_report(result, max_drop)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        typer.echo(f"报告已保存：{output}")
+    if not ok:
+        raise typer.Exit(1)
+    return result
 
 @app.command()
-def detect_url_images(url: str):
+def prefetch(
+    labels: Annotated[Optional[list[str]], typer.Argument(help="要生成的学校标签，默认全部已知类别")] = None,
+    force: Annotated[bool, typer.Option(help="忽略有效期，全部重新生成")] = False,
+    show: Annotated[bool, typer.Option(help="只列出知识库中的记录与过期情况，不调用大模型")] = False,
+):
     """
-    从网页中提取所有图片进行大学Logo识别和混元信息查询。
+    提前为已知类别生成结构化学校资料，写入学校知识库（settings.SCHOOL_KB_PATH），检测时不再等待大模型。
     """
-    typer.echo(f"开始提取网页图片：{url}")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-    }
+    import time
+
+    kb = school_kb.get_knowledge_base()
+    if show:
+        stale = set(kb.stale_labels())
+        for label in labels or LABEL_TO_SCHOOL_NAME:
+            record = kb.get(label)
+            if record is None:
+                status = "缺失"
+            else:
+                date = time.strftime("%Y-%m-%d", time.localtime(record.fetched_at))
+                status = f"{'过期' if label.lower() in stale else '有效'}（{date}，QS {record.qs_rank or '无'}，软科 {record.arwu_rank or '无'}）"
+            typer.echo(f"{label:<18} {LABEL_TO_SCHOOL_NAME.get(label.lower(), label)}：{status}")
+        return
+
+    stats = school_kb.prefetch(labels, force=force, progress=typer.echo)
+    typer.echo(f"完成：更新 {len(stats['updated'])} 所，失败 {len(stats['failed'])} 所，"
+               f"跳过 {stats['skipped']} 所未过期的记录")
+    typer.echo(f"知识库：{kb.path or '（仅内存）'}")
+    if stats["failed"]:
+        raise typer.Exit(1)
+
+@app.command()
+def benchmark(
+    suite: Annotated[Optional[list[str]], typer.Option(help="要运行的基准测试，可重复指定：load、latency、batch、video、web、llm、pipeline，默认全部")] = None,
+    weights: Annotated[Optional[str], typer.Option(help="测试的模型权重，默认取当前配置")] = None,
+    images: Annotated[Optional[str], typer.Option(help="测试图片目录或通配符，默认使用随机生成的图片")] = None,
+    video: Annotated[Optional[str], typer.Option(help="测试视频，默认用测试图片合成")] = None,
+    imgsz: Annotated[Optional[list[int]], typer.Option(help="单图耗时测试的输入尺寸，可重复指定")] = None,
+    batch_size: Annotated[Optional[list[int]], typer.Option(help="批量吞吐测试的批大小，可重复指定")] = None,
+    runs: Annotated[int, typer.Option(help="单图耗时测试的重复次数")] = 20,
+    requests: Annotated[int, typer.Option(help="Web 压测的请求数")] = 64,
+    concurrency: Annotated[int, typer.Option(help="Web 压测与混元测试的并发数")] = 8,
+    llm_latency: Annotated[float, typer.Option(help="本地混元替身每次回答的耗时（秒）")] = 0.8,
+    output: Annotated[str, typer.Option(help="结果 JSON 文件")] = "benchmark.json",
+    baseline: Annotated[Optional[str], typer.Option(help="历史结果 JSON，用于对比发现性能回退")] = None,
+    max_regression: Annotated[float, typer.Option(help="相对历史结果允许变差的比例")] = 0.1,
+):
+    """
+    离线基准测试（混元使用本地替身），结果写入 JSON，可与历史结果对比。
+    """
+    import json
+    from benchmark import compare, flatten, run_benchmarks
+
+    report = run_benchmarks(suite, weights=weights, images=images, video=video,
+                            imgsz_list=imgsz or (320, 480, 640, 960), batch_sizes=batch_size or (1, 4, 8, 16),
+                            runs=runs, requests_count=requests, concurrency=concurrency,
+                            llm_latency=llm_latency, progress=typer.echo)
+    for metric, value in flatten(report["results"]).items():
+        typer.echo(f"{metric}: {value}")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), max_regression)
+        for item in report["regressions"]:
+            change = f"（{item['change']:+.1%}）" if item["change"] is not None else ""
+            typer.echo(f"⚠️ 性能回退：{item['metric']} {item['baseline']} -> {item['current']}{change}")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    typer.echo(f"结果已保存：{output}")
+    if report.get("regressions"):
+        raise typer.Exit(1)
+    return report
+
+@app.command()
+def fake_hunyuan(
+    port: Annotated[int, typer.Option(help="监听端口")] = 8765,
+    latency: Annotated[float, typer.Option(help="每次回答的耗时（秒）")] = 0.8,
+):
+    """
+    启动本地混元替身，供离线联调：另开终端设置 UNI_LOGO_HUNYUAN_ENDPOINT=127.0.0.1:<端口> 与 UNI_LOGO_HUNYUAN_PROTOCOL=http。
+    替身不校验密钥，但没有配置密钥时客户端不会发出请求，需同时把 TENCENTCLOUD_SECRET_ID / TENCENTCLOUD_SECRET_KEY 设为任意值。
+    """
+    from fake_hunyuan import FakeHunyuanServer
 
+    server = FakeHunyuanServer(port=port, latency=latency)
+    typer.echo(f"本地混元替身已启动：{server.endpoint}（Ctrl+C 退出）")
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, "lxml")
-        img_tags = soup.find_all("img")
-        img_urls = []
-
-        for img in img_tags:
-            src = img.get("src")
-            if not src:
-                continue
-            # 补全相对路径为绝对路径
-            if src.startswith("//"):
-                src = "https:" + src
-            elif src.startswith("/"):
-                base_url = "/".join(url.split("/")[:3])
-                src = base_url + src
-            elif not src.startswith("http"):
-                base_url = "/".join(url.split("/")[:3])
-                src = base_url + "/" + src
-            img_urls.append(src)
-
-        typer.echo(f"共提取到 {len(img_urls)} 张图片，开始识别...")
-
-        for idx, img_url in enumerate(img_urls):
-            typer.echo(f"\n[{idx+1}/{len(img_urls)}] 处理图片：{img_url}")
-            try:
-                img_resp = requests.get(img_url, headers=headers, timeout=10)
-                image = Image.open(BytesIO(img_resp.content)).convert("RGB")
-                image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-                results = yolo_model(image_cv)[0]
-                detections = sv.Detections.from_ultralytics(results)
-
-                if len(detections) == 0:
-                    typer.echo("未检测到大学Logo")
-                    continue
-
-                for i in range(len(detections)):
-                    x1, y1, x2, y2 = map(int, detections.xyxy[i])
-                    cropped = image_cv[y1:y2, x1:x2]
-                    class_id = int(detections.class_id[i])
-                    school_label = yolo_model.model.names[class_id]
-                    typer.echo(f"检测到大学：{school_label}")
-
-                    try:
-                        result = ask_hunyuan(school_label)
-                        typer.echo("识别结果：")
-                        typer.echo(result)
-                        # print(type(result))  <class 'str'>
-                    except Exception as e:
-                        typer.echo(f"混元识别失败：{str(e)}")
-
-            except Exception as e:
-                typer.echo(f"图片加载失败：{str(e)}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
 
-    except Exception as e:
-        typer.echo(f"网页加载失败：{str(e)}")
+@app.command()
+def startup_report(
+    target: Annotated[Optional[list[str]], typer.Option("--target", "-t", help="要分析的入口，如 cli、gui、detect-image，默认全部")] = None,
+    top: Annotated[int, typer.Option(help="每个入口显示最慢的依赖数量")] = 10,
+    output: Annotated[Optional[str], typer.Option(help="将报告另存为 JSON 文件")] = None,
+    budget: Annotated[float, typer.Option(help="cli/gui 启动耗时上限（秒），超出时返回非零退出码")] = 1.0,
+):
+    """
+    统计各入口的导入耗时，用于发现启动变慢的回归。
+    """
+    import json
+    from startup_profile import startup_report as build_report
+
+    report = build_report(target or None, top=top)
+    over_budget = []
+    for name, result in report.items():
+        if not result["ok"]:
+            typer.echo(f"\n[{name}] 导入失败：{result['error']}")
+            continue
+        typer.echo(f"\n[{name}] 进程耗时 {result['wall_seconds']:.2f}s，导入耗时 {result['import_seconds']:.2f}s")
+        for row in result["slowest"]:
+            typer.echo(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+        if name in ("cli", "gui") and result["import_seconds"] > budget:
+            over_budget.append(name)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        typer.echo(f"\n报告已保存：{output}")
+
+    if over_budget:
+        typer.echo(f"\n启动耗时超出 {budget}s：{', '.join(over_budget)}")
+        raise typer.Exit(code=1)
 
 @app.command()
 def run_web():
+    import web_service
+
     web_service.run_web()
 
 if __name__ == "__main__":
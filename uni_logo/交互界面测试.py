@@ -1,37 +1,11 @@
-import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, StringVar
 from tkinter import ttk
 import threading
 import yolov12_Hunyuan
 import sys
-import io
 from ttkthemes import ThemedTk
 import webbrowser
-
-class StdoutRedirector(io.TextIOBase):
-    def __init__(self, text_widget):
-        super().__init__()
-        self.text_widget = text_widget
-
-    def write(self, s):
-        try:
-            if isinstance(s, bytes):
-                s = s.decode('utf-8')
-            elif not isinstance(s, str):
-                s = str(s)
-        except Exception as e:
-            s = f"[日志解码失败]: {e}\n"
-        try:
-            s = s.replace('\r', '')
-            self.text_widget.insert(tk.END, s)
-            self.text_widget.see(tk.END)
-            self.text_widget.update()
-        except Exception as e:
-            self.text_widget.insert(tk.END, f"[输出失败]: {e}\n")
-            self.text_widget.see(tk.END)
-
-    def flush(self):
-        pass
+from log_pump import LogQueue, QueueWriter, TkLogPump
 
 class App:
     def __init__(self, root):
@@ -110,13 +84,16 @@ class App:
         self.root.rowconfigure(7, weight=1)
 
     def redirect_logs(self):
-        sys.stdout = StdoutRedirector(self.log_box)
-        sys.stderr = StdoutRedirector(self.log_box)
+        # 工作线程不能直接操作 Tk 控件：输出先进入队列，由主循环定时批量写入日志框
+        self.log_queue = LogQueue()
+        self.stdout = sys.stdout = QueueWriter(self.log_queue)
+        self.stderr = sys.stderr = QueueWriter(self.log_queue)
+        self.log_pump = TkLogPump(self.log_box, self.log_queue).start()
 
     def log(self, message):
-        self.log_box.insert(tk.END, message + "\n")
-        self.log_box.see(tk.END)
-        self.root.update()
+        # 可在任意线程调用；界面自己的状态行不受输出限速，不会被省略
+        for line in str(message).split("\n"):
+            self.log_queue.put_line(line, important=True)
 
     def run_detect_camera(self):
         threading.Thread(target=lambda: self._run_and_log("摄像头检测", yolov12_Hunyuan.detect_camera)).start()
@@ -169,6 +146,9 @@ class App:
             self.log(f"[完成] {name}。")
         except Exception as e:
             self.log(f"[错误] {name}失败: {e}")
+        finally:
+            self.stdout.flush_partial()
+            self.stderr.flush_partial()
 
 
 if __name__ == "__main__":